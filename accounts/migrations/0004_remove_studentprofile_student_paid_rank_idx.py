@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 09:49
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_studentprofile_student_paid_rank_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='studentprofile',
+            name='student_paid_rank_idx',
+        ),
+    ]
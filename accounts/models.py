@@ -21,15 +21,17 @@ class User(AbstractUser):
 class StudentProfile(models.Model):
     """Extended profile for students"""
     
-    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='student_profile')
-    roll_number = models.CharField(max_length=20, unique=True)
-    rank = models.IntegerField(unique=True)
-    category = models.CharField(max_length=20, choices=[
+    CATEGORY_CHOICES = [
         ('GENERAL', 'General'),
         ('OBC', 'OBC'),
         ('SC', 'SC'),
         ('ST', 'ST'),
-    ])
+    ]
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='student_profile')
+    roll_number = models.CharField(max_length=20, unique=True)
+    rank = models.IntegerField(unique=True)
+    category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
     token_paid = models.BooleanField(default=False)
     
     class Meta:
@@ -45,12 +45,13 @@ def dashboard(request):
     if user.user_type == 'super_admin':
         # Import the required models for statistics
         from colleges.models import Course
-        from counselling.models import CounsellingSettings
+        from counselling.models import CounsellingSettings, Payment
         from django.db.models import Sum
         
         # Get statistics for super admin dashboard
         total_students = StudentProfile.objects.count()
-        paid_students = StudentProfile.objects.filter(token_paid=True).count()
+        # Students who paid the counselling fee; token_paid only follows the seat token
+        paid_students = Payment.objects.filter(purpose=Payment.FEE, status='completed').count()
         total_colleges = CollegeProfile.objects.count()
         total_courses = Course.objects.count()
         total_seats = Course.objects.aggregate(total=Sum('total_seats'))['total'] or 0
@@ -1,9 +1,36 @@
 from django.contrib import admin
-from .models import Course
+from .models import Course, CoursePriority, CourseQuota
+
+class CourseQuotaInline(admin.TabularInline):
+    model = CourseQuota
+    extra = 0
+
 
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
-    list_display = ('course_name', 'college', 'course_code', 'total_seats', 'seats_filled', 'available_seats', 'is_active')
+    list_display = ('course_name', 'college', 'course_code', 'total_seats', 'allocated_seats', 'vacant_seats', 'is_active')
     list_filter = ('degree_type', 'is_active', 'college')
+    list_select_related = ('college',)
     search_fields = ('course_name', 'course_code', 'college__college_name')
     readonly_fields = ('available_seats',)
+    inlines = [CourseQuotaInline]
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_seat_counts()
+    
+    @admin.display(ordering='allocated_seats')
+    def allocated_seats(self, obj):
+        return obj.allocated_seats
+    
+    @admin.display(ordering='vacant_seats')
+    def vacant_seats(self, obj):
+        return obj.vacant_seats
+
+
+@admin.register(CoursePriority)
+class CoursePriorityAdmin(admin.ModelAdmin):
+    list_display = ('course', 'position', 'student')
+    list_filter = ('course__college',)
+    list_select_related = ('course', 'student')
+    search_fields = ('course__course_name', 'course__course_code', 'student__roll_number')
+    raw_id_fields = ('course', 'student')
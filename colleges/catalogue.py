@@ -0,0 +1,99 @@
+"""
+Cached course catalogue for the preference form.
+
+The active courses are serialized once per catalogue version and kept in
+the cache, so browsing and filtering them does not touch the database.
+The version is bumped whenever a course or college is saved or deleted;
+a changed version means a new cache key, so stale lists are never read
+and simply expire. Seat counts change with every allocation and are not
+part of the catalogue; see counselling.seats.seat_availability().
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from counselling.versioning import Stamp
+from .models import Course
+
+
+CATALOGUE_VERSION_KEY = 'colleges:catalogue_version'
+
+_catalogue_stamp = Stamp(CATALOGUE_VERSION_KEY)
+
+# Query parameters accepted by filter_courses()
+FILTERS = ('college', 'degree_type', 'department', 'q')
+
+
+def catalogue_version():
+    return _catalogue_stamp.current()
+
+
+def bump_catalogue_version():
+    """Start a new catalogue version once the current transaction commits"""
+    _catalogue_stamp.replace()
+
+
+def get_catalogue():
+    """
+    Active courses as plain dicts, with the filter choices and an ETag,
+    cached per catalogue version for COURSE_CATALOGUE_CACHE_SECONDS.
+    """
+    key = f'colleges:catalogue:{catalogue_version()}'
+    catalogue = cache.get(key)
+    if catalogue is None:
+        rows = Course.objects.filter(is_active=True).order_by('college__college_name', 'course_name').values_list(
+            'id', 'course_code', 'course_name', 'college__college_code', 'college__college_name',
+            'department', 'degree_type', 'duration_years', 'total_seats', 'fee_per_year',
+        )
+        courses = [
+            {
+                'id': course_id,
+                'course_code': course_code,
+                'course_name': course_name,
+                'college_code': college_code,
+                'college_name': college_name,
+                'department': department,
+                'degree_type': degree_type,
+                'duration_years': duration_years,
+                'total_seats': total_seats,
+                'fee_per_year': str(fee),
+            }
+            for (course_id, course_code, course_name, college_code, college_name,
+                 department, degree_type, duration_years, total_seats, fee) in rows
+        ]
+        body = json.dumps(courses)
+        catalogue = {
+            'courses': courses,
+            'colleges': sorted({(c['college_code'], c['college_name']) for c in courses}, key=lambda c: c[1]),
+            'degree_types': sorted({c['degree_type'] for c in courses}),
+            'departments': sorted({c['department'] for c in courses}),
+            # Identical content gives the same ETag in every process
+            'etag': hashlib.md5(body.encode()).hexdigest(),
+        }
+        cache.set(key, catalogue, settings.COURSE_CATALOGUE_CACHE_SECONDS)
+    return catalogue
+
+
+def catalogue_filters(params):
+    """The filter values given in a QueryDict, stripped; missing ones are ''"""
+    return {name: params.get(name, '').strip() for name in FILTERS}
+
+
+def filter_courses(courses, college='', degree_type='', department='', q=''):
+    """Courses matching every given filter; q searches course and college names"""
+    q = q.lower()
+    return [
+        course for course in courses
+        if (not college or course['college_code'] == college)
+        and (not degree_type or course['degree_type'] == degree_type)
+        and (not department or course['department'] == department)
+        and (not q or q in course['course_name'].lower() or q in course['college_name'].lower())
+    ]
+
+
+def filters_etag(catalogue, filters, *parts):
+    """ETag for one filtered view of the catalogue, plus any other versions it depends on"""
+    key = json.dumps([catalogue['etag'], filters, *parts], sort_keys=True)
+    return f'"{hashlib.md5(key.encode()).hexdigest()}"'
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 08:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('colleges', '0002_delete_seatallocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseQuota',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('OBC', 'OBC'), ('SC', 'SC'), ('ST', 'ST')], max_length=20)),
+                ('seats', models.PositiveIntegerField()),
+                ('unfilled_rule', models.CharField(choices=[('RELEASE', 'Release to open seats'), ('LAPSE', 'Leave vacant')], default='RELEASE', max_length=10)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quotas', to='colleges.course')),
+            ],
+            options={
+                'ordering': ['course', 'category'],
+                'unique_together': {('course', 'category')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 09:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_studentprofile_student_paid_rank_idx'),
+        ('colleges', '0003_coursequota'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoursePriority',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='priorities', to='colleges.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_priorities', to='accounts.studentprofile')),
+            ],
+            options={
+                'verbose_name_plural': 'Course priorities',
+                'ordering': ['course', 'position'],
+                'unique_together': {('course', 'student')},
+            },
+        ),
+    ]
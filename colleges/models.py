@@ -1,5 +1,17 @@
 from django.db import models
-from accounts.models import CollegeProfile
+from django.core.exceptions import ValidationError
+from accounts.models import CollegeProfile, StudentProfile
+
+class CourseQuerySet(models.QuerySet):
+    
+    def with_seat_counts(self):
+        """Annotate allocated_seats and vacant_seats, counted from Allocation rows"""
+        return self.annotate(
+            allocated_seats=models.Count('allocations', filter=~models.Q(allocations__status='WITHDRAWN')),
+        ).annotate(
+            vacant_seats=models.F('total_seats') - models.F('allocated_seats'),
+        )
+
 
 class Course(models.Model):
     """Course offered by colleges"""
@@ -23,6 +35,8 @@ class Course(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = CourseQuerySet.as_manager()
+    
     class Meta:
         unique_together = ['college', 'course_code']
         ordering = ['college', 'course_name']
@@ -37,3 +51,60 @@ class Course(models.Model):
     @property
     def is_seats_available(self):
         return self.available_seats > 0
+
+
+class CourseQuota(models.Model):
+    """Seats of a course reserved for one category.
+
+    Seats not covered by a quota form the open (GENERAL) pool, which every
+    student competes for on rank. Reserved-category students fall back to
+    their own quota when no open seat is left.
+    """
+    
+    UNFILLED_RULES = [
+        ('RELEASE', 'Release to open seats'),
+        ('LAPSE', 'Leave vacant'),
+    ]
+    
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='quotas')
+    category = models.CharField(max_length=20, choices=[
+        choice for choice in StudentProfile.CATEGORY_CHOICES if choice[0] != 'GENERAL'
+    ])
+    seats = models.PositiveIntegerField()
+    unfilled_rule = models.CharField(max_length=10, choices=UNFILLED_RULES, default='RELEASE')
+    
+    class Meta:
+        unique_together = ['course', 'category']
+        ordering = ['course', 'category']
+    
+    def __str__(self):
+        return f"{self.course.course_name} - {self.category} ({self.seats})"
+    
+    def clean(self):
+        reserved = CourseQuota.objects.filter(course_id=self.course_id).exclude(pk=self.pk).aggregate(
+            total=models.Sum('seats')
+        )['total'] or 0
+        if reserved + (self.seats or 0) > self.course.total_seats:
+            raise ValidationError("Reserved seats cannot exceed the course's total seats.")
+
+
+class CoursePriority(models.Model):
+    """A student's place in a course's own merit order.
+
+    Used by the deferred-acceptance allocator (see counselling.allocation).
+    Students listed for a course are preferred in position order; everyone
+    else follows in overall rank order, so a course without a list simply
+    ranks on overall rank.
+    """
+    
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='priorities')
+    student = models.ForeignKey(StudentProfile, on_delete=models.CASCADE, related_name='course_priorities')
+    position = models.PositiveIntegerField()  # 1 = first in the course's merit order
+    
+    class Meta:
+        unique_together = ['course', 'student']
+        ordering = ['course', 'position']
+        verbose_name_plural = "Course priorities"
+    
+    def __str__(self):
+        return f"{self.course.course_name} - {self.position}. {self.student.roll_number}"
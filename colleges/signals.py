@@ -0,0 +1,20 @@
+"""
+Start a new course catalogue version whenever a course or college changes.
+
+QuerySet.update() and bulk_create() bypass these receivers; callers doing
+those call catalogue.bump_catalogue_version() themselves.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import CollegeProfile
+from .catalogue import bump_catalogue_version
+from .models import Course
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=CollegeProfile)
+@receiver(post_delete, sender=CollegeProfile)
+def catalogue_changed(sender, **kwargs):
+    bump_catalogue_version()
@@ -0,0 +1,72 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User, StudentProfile, CollegeProfile
+from counselling.models import Allocation
+from .models import Course
+
+
+# Queries each page may run, whatever the number of courses or allocations.
+# Session and user lookups are included.
+QUERY_BUDGETS = {
+    'colleges:college_dashboard': 4,
+    'colleges:course_list': 3,
+    'colleges:course_analytics': 5,
+}
+
+
+class CollegePageQueryTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='college', user_type='college_admin')
+        self.college = CollegeProfile.objects.create(
+            user=self.user, college_name='College', college_code='C1',
+            address='Somewhere', established_year=1990,
+        )
+        self.client.force_login(self.user)
+        self.rank = 0
+
+    def add_courses(self, count, allocations_per_course):
+        courses = []
+        for i in range(count):
+            course = Course.objects.create(
+                college=self.college, course_name=f'Course {len(courses)}', course_code=f'K{Course.objects.count()}',
+                department='CSE', degree_type='B.Tech', total_seats=10, fee_per_year=1000,
+            )
+            for status in ['ALLOCATED', 'CONFIRMED', 'WITHDRAWN'][:allocations_per_course]:
+                self.rank += 1
+                user = User.objects.create(username=f'student_{self.rank}', user_type='student')
+                student = StudentProfile.objects.create(user=user, roll_number=f'R{self.rank}', rank=self.rank)
+                Allocation.objects.create(student=student, course=course, status=status)
+            courses.append(course)
+        return courses
+
+    def assertWithinBudget(self, name, *args):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name, args=args))
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), QUERY_BUDGETS[name], '\n'.join(q['sql'] for q in queries))
+        return response
+
+    def test_pages_stay_within_budget_as_data_grows(self):
+        for count in (1, 30):
+            course = self.add_courses(count, 3)[0]
+            self.assertWithinBudget('colleges:college_dashboard')
+            self.assertWithinBudget('colleges:course_list')
+            self.assertWithinBudget('colleges:course_analytics', course.pk)
+
+    def test_seat_counts_come_from_allocations(self):
+        course = self.add_courses(1, 3)[0]
+        Course.objects.filter(pk=course.pk).update(seats_filled=9)  # stale column is ignored
+
+        response = self.assertWithinBudget('colleges:college_dashboard')
+        # WITHDRAWN seats are free again
+        self.assertEqual(response.context['seats_filled'], 2)
+        self.assertEqual(response.context['available_seats'], 8)
+
+        response = self.assertWithinBudget('colleges:course_analytics', course.pk)
+        self.assertEqual(response.context['total_allocations'], 3)
+        self.assertEqual(response.context['allocated_count'], 1)
+        self.assertEqual(response.context['course'].vacant_seats, 8)
@@ -1,9 +1,10 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db.models import Count, Q, Subquery
 from .models import Course
 from accounts.models import CollegeProfile
-from counselling.models import Allocation
+from counselling.models import Allocation, CounsellingRound, CourseRoundSummary
 
 @login_required
 def college_dashboard(request):
@@ -12,14 +13,18 @@ def college_dashboard(request):
         return redirect('home')
     
     college = get_object_or_404(CollegeProfile, user=request.user)
-    courses = Course.objects.filter(college=college)
+    # One annotated query; the totals are summed from the rows it returns
+    courses = list(Course.objects.filter(college=college).with_seat_counts())
+    total_seats = sum(course.total_seats for course in courses)
+    seats_filled = sum(course.allocated_seats for course in courses)
     
     context = {
         'college': college,
         'courses': courses,
-        'total_courses': courses.count(),
-        'total_seats': sum(course.total_seats for course in courses),
-        'seats_filled': sum(course.seats_filled for course in courses),
+        'total_courses': len(courses),
+        'total_seats': total_seats,
+        'seats_filled': seats_filled,
+        'available_seats': total_seats - seats_filled,
     }
     return render(request, 'colleges/dashboard.html', context)
 
@@ -29,8 +34,7 @@ def course_list(request):
     if request.user.user_type != 'college_admin':
         return redirect('home')
     
-    college = get_object_or_404(CollegeProfile, user=request.user)
-    courses = Course.objects.filter(college=college)
+    courses = Course.objects.filter(college__user=request.user).with_seat_counts()
     
     return render(request, 'colleges/course_list.html', {'courses': courses})
 
@@ -65,13 +69,21 @@ def course_analytics(request, course_id):
     if request.user.user_type != 'college_admin':
         return redirect('home')
     
-    course = get_object_or_404(Course, id=course_id, college__user=request.user)
-    allocations = Allocation.objects.filter(course=course)
+    courses = Course.objects.select_related('college').with_seat_counts().annotate(
+        total_allocations=Count('allocations'),
+        allocated_count=Count('allocations', filter=Q(allocations__status='ALLOCATED')),
+    )
+    course = get_object_or_404(courses, id=course_id, college__user=request.user)
+    allocations = Allocation.objects.filter(course=course).select_related('student__user').order_by('student__rank')
+    # Cut-offs of the latest round, materialised when it ran
+    latest_round = CounsellingRound.objects.order_by('-number').values('pk')[:1]
+    cutoffs = list(CourseRoundSummary.objects.filter(course=course, round=Subquery(latest_round)).select_related('round'))
     
     context = {
         'course': course,
         'allocations': allocations,
-        'total_allocations': allocations.count(),
-        'allocated_count': allocations.filter(status='ALLOCATED').count(),
+        'cutoffs': cutoffs,
+        'total_allocations': course.total_allocations,
+        'allocated_count': course.allocated_count,
     }
     return render(request, 'colleges/course_analytics.html', context)
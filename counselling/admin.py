@@ -3,12 +3,15 @@ from .models import (
     CounsellingSettings,
     Payment,
     Allocation,
-    AllocationStatistics
+    AllocationJob,
+    AllocationStatistics,
+    CounsellingRound,
+    CourseRoundSummary
 )
 
 @admin.register(CounsellingSettings)
 class CounsellingSettingsAdmin(admin.ModelAdmin):
-    list_display = ('registration_open', 'preference_submission_open', 'payment_required', 'allocation_completed', 'counselling_fee')
+    list_display = ('registration_open', 'preference_submission_open', 'payment_required', 'allocation_completed', 'total_rounds', 'allocation_method', 'counselling_fee')
     readonly_fields = ('created_at', 'updated_at')
     
     def has_add_permission(self, request):
@@ -25,11 +28,28 @@ class PaymentAdmin(admin.ModelAdmin):
 
 @admin.register(Allocation)
 class AllocationAdmin(admin.ModelAdmin):
-    list_display = ('student', 'course', 'preference_number', 'allocated_at')
-    list_filter = ('preference_number', 'allocated_at', 'course__college')
+    list_display = ('student', 'course', 'preference_number', 'status', 'round_number', 'allocated_at')
+    list_filter = ('status', 'round_number', 'preference_number', 'allocated_at', 'course__college')
     search_fields = ('student__user__username', 'student__user__email', 'course__name', 'course__college__name')
     ordering = ['student__rank']
 
+@admin.register(CounsellingRound)
+class CounsellingRoundAdmin(admin.ModelAdmin):
+    list_display = ('number', 'started_at', 'completed_at', 'students_processed', 'new_allocations', 'upgrades')
+    readonly_fields = ('number', 'started_at', 'completed_at', 'students_processed', 'new_allocations', 'upgrades')
+
+@admin.register(CourseRoundSummary)
+class CourseRoundSummaryAdmin(admin.ModelAdmin):
+    list_display = ('round', 'course', 'category', 'seats', 'opening_rank', 'closing_rank', 'filled', 'vacant')
+    list_filter = ('round', 'category')
+    list_select_related = ('round', 'course__college')
+
+@admin.register(AllocationJob)
+class AllocationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'phase', 'progress', 'round_number', 'allocated_count', 'throughput', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('status', 'phase', 'progress', 'students_processed', 'throughput', 'round_number', 'allocated_count', 'upgrades', 'error', 'requested_by', 'created_at', 'started_at', 'finished_at')
+
 @admin.register(AllocationStatistics)
 class AllocationStatisticsAdmin(admin.ModelAdmin):
     list_display = ('total_students', 'students_paid', 'students_with_preferences', 'students_allocated', 'seats_filled', 'total_seats')
@@ -0,0 +1,66 @@
+"""
+Seat allocation engine.
+
+The engine replaces the per-student ORM loop that used to live in
+counselling.views.run_allocation. Views and management commands should
+call run_allocation_round() rather than touching Allocation directly;
+it runs a full first round and incremental rounds after that, by serial
+dictatorship on overall rank or by deferred acceptance over each course's
+merit order (see deferred.py). simulate() answers what-if questions about
+seat and preference changes on an in-memory copy (see simulation.py).
+"""
+from .deferred import DeferredAcceptanceRound, deferred_acceptance, load_course_priorities, match_deferred_acceptance
+from .engine import (
+    AllocationError,
+    AllocationResult,
+    MATCHERS,
+    load_preferences,
+    match_full_round,
+    match_serial_dictatorship,
+    release_pass,
+    round_completed,
+    run_allocation_round,
+    serial_pass,
+    write_allocations,
+)
+from .matrix import PreferenceMatrix
+from .partition import course_components, match_partitioned, partition_courses
+from .rounds import IncrementalRound, RoundResult, write_round_changes
+from .seat_matrix import CATEGORIES, SeatMatrix, load_student_categories
+from .simulation import SimulationError, SimulationResult, Snapshot, get_snapshot, simulate
+from .timing import PhaseTimer, peak_memory_mb
+
+__all__ = [
+    'AllocationError',
+    'AllocationResult',
+    'CATEGORIES',
+    'course_components',
+    'deferred_acceptance',
+    'DeferredAcceptanceRound',
+    'get_snapshot',
+    'IncrementalRound',
+    'load_course_priorities',
+    'load_preferences',
+    'load_student_categories',
+    'match_deferred_acceptance',
+    'match_full_round',
+    'match_partitioned',
+    'match_serial_dictatorship',
+    'MATCHERS',
+    'partition_courses',
+    'peak_memory_mb',
+    'PhaseTimer',
+    'PreferenceMatrix',
+    'release_pass',
+    'round_completed',
+    'RoundResult',
+    'run_allocation_round',
+    'SeatMatrix',
+    'serial_pass',
+    'simulate',
+    'SimulationError',
+    'SimulationResult',
+    'Snapshot',
+    'write_allocations',
+    'write_round_changes',
+]
@@ -0,0 +1,276 @@
+"""
+Student-proposing deferred acceptance over course merit orders.
+
+Every (course, quota bucket) pair is a program with its own capacity. A
+student's list is expanded course by course into the open program and
+then their own category's program, the same order serial dictatorship
+tries them in. Free students propose down their list; each program keeps
+the students it has tentatively accepted in a heap keyed on the course's
+priority, so a proposal from a better-placed student evicts the worst
+holder in O(log capacity). Evicted students resume proposing where they
+left off, so each preference is proposed to at most once per program and
+a round costs O(total preferences * log capacity).
+
+Course priority comes from CoursePriority: listed students in position
+order, then everyone else in overall rank order. With no lists at all the
+outcome equals serial dictatorship.
+"""
+import heapq
+
+import numpy as np
+from django.db.models import Q
+
+from colleges.models import CoursePriority
+from students.models import StudentPreference
+from ..models import Allocation, Payment
+from .matrix import PreferenceMatrix
+from .rounds import RoundResult, free_seats
+from .seat_matrix import CATEGORIES, CATEGORY_INDEX, OPEN
+
+
+# Proposals made between two progress callbacks
+PROGRESS_EVERY = 50000
+
+# Priority of a student at the program holding their current seat, ahead of every list
+GUARANTEED = -1
+
+
+def load_course_priorities(matrix):
+    """
+    The priority of each preference in matrix at its course, aligned with
+    matrix.courses; lower is better and every course's values are distinct.
+    """
+    n = matrix.n_students
+    column_rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(matrix.offsets))
+    scores = column_rows.copy()
+    if not n:
+        return scores
+
+    rows = CoursePriority.objects.filter(course_id__in=matrix.course_ids.tolist()).order_by(
+        'course_id', 'position', 'student__rank'
+    ).values_list('course_id', 'student_id')
+    listed = np.array(list(rows), dtype=np.int64).reshape(-1, 2)
+    if not len(listed):
+        return scores
+
+    # Only students taking part in this match can be placed
+    order = np.argsort(matrix.student_ids)
+    student_rows = np.searchsorted(matrix.student_ids, listed[:, 1], sorter=order)
+    student_rows = np.minimum(student_rows, n - 1)
+    known = matrix.student_ids[order[student_rows]] == listed[:, 1]
+    courses = np.searchsorted(matrix.course_ids, listed[:, 0])[known]
+    student_rows = order[student_rows[known]]
+
+    # Dense positions 0, 1, ... within each course, keeping the list order
+    lengths = np.bincount(courses, minlength=matrix.n_courses)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    positions = np.arange(len(courses)) - starts[courses]
+
+    # Unlisted students come after the whole list of the course
+    scores += lengths[matrix.courses]
+    keys = courses * n + student_rows
+    key_order = np.argsort(keys)
+    keys = keys[key_order]
+    column_keys = matrix.courses.astype(np.int64) * n + column_rows
+    found = np.minimum(np.searchsorted(keys, column_keys), len(keys) - 1)
+    match = keys[found] == column_keys
+    scores[match] = positions[key_order[found[match]]]
+    return scores
+
+
+def deferred_acceptance(offsets, ends, courses, scores, capacity, categories, students, held=None, progress=None):
+    """
+    Match students (row indices) by student-proposing deferred acceptance.
+
+    Row i proposes down columns offsets[i]:ends[i]; courses maps a column
+    to its course and scores to the course's priority for that student.
+    capacity[c][b] is the seat count of each program and is not changed.
+    held maps a row to the (column, bucket) it is guaranteed, if any.
+
+    Returns {row: (column, bucket)} for every student placed.
+    """
+    held = held or {}
+    n_buckets = len(CATEGORIES)
+    heaps = {}
+    pointer = {i: 2 * int(offsets[i]) for i in students}
+    free = list(reversed(students))
+    proposals = 0
+
+    while free:
+        i = free.pop()
+        p = pointer[i]
+        end = 2 * int(ends[i])
+        bucket = categories[i]
+        guarantee = held.get(i)
+        while p < end:
+            column = p >> 1
+            reserved = p & 1
+            p += 1
+            if reserved and bucket == OPEN:
+                continue
+            b = bucket if reserved else OPEN
+            c = courses[column]
+            seats = capacity[c][b]
+            if not seats:
+                continue
+            proposals += 1
+            if progress is not None and proposals % PROGRESS_EVERY == 0:
+                progress('match', proposals, 2 * len(courses))
+            score = GUARANTEED if guarantee == (column, b) else scores[column]
+            heap = heaps.setdefault(c * n_buckets + b, [])
+            entry = (-score, i, column)
+            if len(heap) < seats:
+                heapq.heappush(heap, entry)
+                break
+            if -heap[0][0] > score:
+                free.append(heapq.heapreplace(heap, entry)[1])
+                break
+        pointer[i] = p
+
+    placed = {}
+    for key, heap in heaps.items():
+        b = key % n_buckets
+        for score, i, column in heap:
+            placed[i] = (column, b)
+    return placed
+
+
+def _leftover(capacity, placed, courses, release):
+    """Seats each program has after placed, with unfilled RELEASE seats moved to the open pool"""
+    remaining = [list(seats) for seats in capacity]
+    for column, b in placed.values():
+        remaining[courses[column]][b] -= 1
+    released = False
+    for c, seats in enumerate(remaining):
+        for b in range(len(CATEGORIES)):
+            if b != OPEN and seats[b] > 0 and release[c][b]:
+                seats[OPEN] += seats[b]
+                seats[b] = 0
+                released = True
+    return remaining, released
+
+
+def match_deferred_acceptance(matrix, seat_matrix, categories=None, scores=None, progress=None):
+    """
+    Full round of deferred acceptance over category quotas.
+
+    Reserved seats still empty afterwards move to the open pool where the
+    course's quota rule says RELEASE, and the students left unallocated
+    compete for those released seats in a second, open-seat-only pass.
+
+    Returns (assigned, buckets) like match_serial_dictatorship().
+    """
+    n = matrix.n_students
+    if categories is None:
+        categories = np.full(n, OPEN, dtype=np.int8)
+    if scores is None:
+        scores = load_course_priorities(matrix)
+    assigned = np.full(n, -1, dtype=np.int64)
+    buckets = np.full(n, OPEN, dtype=np.int8)
+    if not n:
+        return assigned, buckets
+
+    offsets = matrix.offsets.tolist()
+    courses = matrix.courses.tolist()
+    score_list = scores.tolist()
+    capacity = seat_matrix.seats.tolist()
+    placed = deferred_acceptance(
+        offsets, offsets[1:], courses, score_list, capacity, categories.tolist(), list(range(n)), progress=progress,
+    )
+
+    remaining, released = _leftover(capacity, placed, courses, seat_matrix.release.tolist())
+    if released:
+        waiting = [i for i in range(n) if i not in placed]
+        open_only = [OPEN] * n
+        placed.update(deferred_acceptance(offsets, offsets[1:], courses, score_list, remaining, open_only, waiting))
+
+    for i, (column, b) in placed.items():
+        assigned[i] = column
+        buckets[i] = b
+    return assigned, buckets
+
+
+class DeferredAcceptanceRound:
+    """
+    A later round under deferred acceptance.
+
+    Every floating student (unallocated, or holding an ALLOCATED seat) takes
+    part. A student holding a seat only proposes down to that seat and has
+    top priority at it, so they keep it unless they get a course they
+    prefer. CONFIRMED seats are not available. The result lists the seats
+    that changed, like IncrementalRound.
+    """
+
+    def __init__(self, seat_matrix, round_number):
+        self.seat_matrix = seat_matrix
+        self.round_number = round_number
+
+    def load(self):
+        # rounds.FLOATING, seen from the preference rows
+        floating = Q(student__allocation__isnull=True) | Q(student__allocation__status='ALLOCATED')
+        rows = StudentPreference.objects.filter(
+            floating, student__payments__purpose=Payment.FEE, student__payments__status='completed',
+        ).order_by('student__rank', 'preference_order', 'id').values_list(
+            'student_id', 'course_id', 'preference_order', 'student__category',
+        )
+        categories = {}
+
+        def preferences():
+            for student_id, course_id, preference_order, category in rows.iterator(chunk_size=5000):
+                categories[student_id] = CATEGORY_INDEX.get(category, OPEN)
+                yield student_id, course_id, preference_order
+
+        matrix = PreferenceMatrix.from_rows(preferences(), self.seat_matrix.course_ids)
+        return matrix, [categories[student_id] for student_id in matrix.student_ids.tolist()]
+
+    def run(self, progress=None):
+        matrix, categories = self.load()
+        course_index = matrix.course_index
+        row_of = {student_id: i for i, student_id in enumerate(matrix.student_ids.tolist())}
+        offsets = matrix.offsets.tolist()
+        courses = matrix.courses.tolist()
+        ends = offsets[1:]
+
+        # Seats held by floating students are back in play for this round
+        capacity = free_seats(self.seat_matrix)
+        holdings = {}
+        held = {}
+        seats = Allocation.objects.filter(status='ALLOCATED').values_list('id', 'student_id', 'course_id', 'seat_category')
+        for allocation_id, student_id, course_id, seat_category in seats:
+            c = course_index.get(course_id)
+            i = row_of.get(student_id)
+            if c is None or i is None:
+                continue
+            b = CATEGORY_INDEX.get(seat_category, OPEN)
+            holdings[i] = (allocation_id, course_id, b)
+            row_courses = courses[offsets[i]:ends[i]]
+            if c in row_courses:
+                column = offsets[i] + row_courses.index(c)
+                ends[i] = column + 1
+                held[i] = (column, b)
+                capacity[c, b] += 1
+            # A student who dropped their seat's course keeps it unless they get one they still list
+
+        scores = load_course_priorities(matrix).tolist()
+        placed = deferred_acceptance(
+            offsets, ends, courses, scores, capacity.tolist(), categories, list(range(matrix.n_students)),
+            held=held, progress=progress,
+        )
+        remaining, released = _leftover(capacity.tolist(), placed, courses, self.seat_matrix.release.tolist())
+        if released:
+            waiting = [i for i in range(matrix.n_students) if i not in placed and i not in holdings]
+            placed.update(deferred_acceptance(
+                offsets, ends, courses, scores, remaining, [OPEN] * matrix.n_students, waiting,
+            ))
+
+        changes = []
+        orders = matrix.orders
+        for i, (column, b) in sorted(placed.items()):
+            allocation_id, course_id, bucket = holdings.get(i, (None, None, None))
+            if held.get(i) == (column, b):
+                continue
+            changes.append((
+                int(matrix.student_ids[i]), allocation_id, int(matrix.course_ids[courses[column]]),
+                int(orders[column]), CATEGORIES[b],
+            ))
+        return RoundResult(self.round_number, matrix.n_students, changes)
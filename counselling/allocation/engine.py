@@ -0,0 +1,305 @@
+import os
+
+import numpy as np
+from django.conf import settings as django_settings
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from students.models import StudentPreference
+from ..db import allocation_writes
+from ..models import (
+    Allocation, AllocationStatistics, CounsellingRound, CounsellingSettings, CourseRoundSummary, Payment,
+)
+from ..seats import bulk_seat_changes, fast_delete
+from .deferred import DeferredAcceptanceRound, load_course_priorities, match_deferred_acceptance
+from .matrix import PreferenceMatrix
+from .partition import match_partitioned
+from .rounds import IncrementalRound, write_round_changes
+from .seat_matrix import CATEGORIES, OPEN, SeatMatrix, load_student_categories
+
+
+# Rows per INSERT when writing allocations back
+WRITE_BATCH_SIZE = 2000
+
+# Students matched between two progress callbacks
+PROGRESS_EVERY = 10000
+
+
+# Sent with result= once a committed round is in the database
+round_completed = Signal()
+
+
+class AllocationError(Exception):
+    """Raised when an allocation round cannot be started"""
+
+
+class AllocationResult:
+    """Outcome of a full allocation round"""
+
+    round_number = 1
+    upgrades = 0
+
+    def __init__(self, matrix, assigned, buckets=None):
+        self.matrix = matrix
+        # CSR column of the preference each student got, -1 if unallocated
+        self.assigned = assigned
+        # Quota bucket (index into CATEGORIES) each seat was taken from
+        if buckets is None:
+            buckets = np.full(len(assigned), OPEN, dtype=np.int8)
+        self.buckets = buckets
+
+    @property
+    def students_processed(self):
+        return self.matrix.n_students
+
+    @property
+    def allocated_count(self):
+        return int(np.count_nonzero(self.assigned >= 0))
+
+    @property
+    def new_allocations(self):
+        return self.allocated_count
+
+    @property
+    def unallocated_count(self):
+        return self.students_processed - self.allocated_count
+
+    def iter_matches(self, with_category=False):
+        """
+        Yield (student_id, course_id, preference_order) in rank order, with
+        the seat category appended when with_category is set.
+        """
+        rows = np.flatnonzero(self.assigned >= 0)
+        columns = self.assigned[rows]
+        student_ids = self.matrix.student_ids[rows].tolist()
+        course_ids = self.matrix.course_ids[self.matrix.courses[columns]].tolist()
+        orders = self.matrix.orders[columns].tolist()
+        if not with_category:
+            return zip(student_ids, course_ids, orders)
+        categories = [CATEGORIES[b] for b in self.buckets[rows].tolist()]
+        return zip(student_ids, course_ids, orders, categories)
+
+    @property
+    def matches(self):
+        return list(self.iter_matches())
+
+
+def load_preferences(course_ids):
+    """
+    Stream every eligible preference into a PreferenceMatrix in one query.
+
+    Eligible students have a completed payment and at least one preference,
+    so the preferences of paid students ordered by rank give both the
+    student order and each student's ordered choices.
+    """
+    rows = StudentPreference.objects.filter(
+        student__payments__purpose=Payment.FEE, student__payments__status='completed'
+    ).order_by(
+        'student__rank', 'preference_order', 'id'
+    ).values_list('student_id', 'course_id', 'preference_order')
+    return PreferenceMatrix.from_rows(rows.iterator(chunk_size=5000), course_ids)
+
+
+def _first_free(remaining, courses, start, end, bucket):
+    """CSR column of the first course in start:end with a seat for bucket, or -1"""
+    row = courses[start:end]
+    free = remaining[row, OPEN] > 0
+    if bucket != OPEN:
+        free |= remaining[row, bucket] > 0
+    if not free.any():
+        return -1
+    return start + int(free.argmax())
+
+
+def serial_pass(matrix, remaining, categories, assigned, buckets, start=0, progress=None):
+    """
+    The rank-ordered pass of serial dictatorship over rows start onwards.
+
+    The pass is not vectorised: each row's choice depends on the seats taken
+    by every row ranked above it, so rows are visited one at a time in
+    Python. Only the scan of a single row's preferences is a NumPy slice.
+    The work is linear in the number of preferences.
+
+    remaining holds the seats left once rows before start have chosen and is
+    decremented in place; assigned and buckets are filled in for each row.
+    """
+    n = matrix.n_students
+    offsets = matrix.offsets.tolist()
+    courses = matrix.courses
+    student_buckets = categories.tolist()
+
+    for i in range(start, n):
+        if progress is not None and i % PROGRESS_EVERY == 0:
+            progress('match', i, n)
+        bucket = student_buckets[i]
+        column = _first_free(remaining, courses, offsets[i], offsets[i + 1], bucket)
+        if column < 0:
+            continue
+        course = courses[column]
+        if remaining[course, OPEN] > 0:
+            remaining[course, OPEN] -= 1
+        else:
+            remaining[course, bucket] -= 1
+            buckets[i] = bucket
+        assigned[i] = column
+
+
+def release_pass(matrix, seat_matrix, remaining, assigned):
+    """
+    De-reservation: unfilled reserved seats go to the open pool, and every
+    unallocated row gets one rank-ordered look at them.
+    """
+    released = np.where(seat_matrix.release, remaining, 0)
+    released[:, OPEN] = 0
+    if not released.any():
+        return
+    remaining -= released
+    remaining[:, OPEN] += released.sum(axis=1)
+    offsets = matrix.offsets.tolist()
+    courses = matrix.courses
+    for i in np.flatnonzero(assigned < 0).tolist():
+        column = _first_free(remaining, courses, offsets[i], offsets[i + 1], OPEN)
+        if column >= 0:
+            remaining[courses[column], OPEN] -= 1
+            assigned[i] = column
+
+
+def match_serial_dictatorship(matrix, seat_matrix, categories=None, progress=None):
+    """
+    Rank-ordered serial dictatorship over category quotas.
+
+    Each student, best rank first, takes the first preferred course with a
+    free open seat or, failing that, a free seat in their own category's
+    quota. Every bucket is filled in this single pass. Reserved seats still
+    empty afterwards move to the open pool where the course's quota rule
+    says RELEASE, and students left unallocated get one rank-ordered look
+    at those released seats, so each preference is examined at most twice.
+    Both passes are per-student loops; see serial_pass().
+
+    Returns (assigned, buckets): the CSR column each student was matched on
+    (-1 if unallocated) and the quota bucket the seat came from. progress,
+    if given, is called as progress('match', done, total) along the way.
+    """
+    n = matrix.n_students
+    remaining = seat_matrix.seats.copy()
+    if categories is None:
+        categories = np.full(n, OPEN, dtype=np.int8)
+    assigned = np.full(n, -1, dtype=np.int64)
+    buckets = np.full(n, OPEN, dtype=np.int8)
+    serial_pass(matrix, remaining, categories, assigned, buckets, progress=progress)
+    release_pass(matrix, seat_matrix, remaining, assigned)
+    return assigned, buckets
+
+
+# Full-round matcher for each CounsellingSettings.allocation_method
+MATCHERS = {
+    'serial_dictatorship': match_serial_dictatorship,
+    'deferred_acceptance': match_deferred_acceptance,
+}
+
+
+def write_allocations(result):
+    """Replace the Allocation table with the matches in result; runs inside bulk_seat_changes()"""
+    fast_delete(Allocation.objects.all())
+    Allocation.objects.bulk_create(
+        (
+            Allocation(
+                student_id=student_id,
+                course_id=course_id,
+                preference_number=preference_order,
+                seat_category=seat_category,
+            )
+            for student_id, course_id, preference_order, seat_category in result.iter_matches(with_category=True)
+        ),
+        batch_size=WRITE_BATCH_SIZE,
+    )
+
+
+def match_full_round(seat_matrix, progress=None, method='serial_dictatorship'):
+    """
+    First round: match every eligible student with the given method. Large
+    rounds are split into independent course partitions matched in parallel.
+    """
+    matrix = load_preferences(seat_matrix.course_ids)
+    categories = load_student_categories(matrix.student_ids)
+    workers = django_settings.ALLOCATION_WORKERS or os.cpu_count() or 1
+    if workers > 1 and matrix.n_preferences >= django_settings.ALLOCATION_PARALLEL_MIN_PREFERENCES:
+        scores = load_course_priorities(matrix) if method == 'deferred_acceptance' else None
+        assigned, buckets = match_partitioned(matrix, seat_matrix, categories, method, scores, workers, progress)
+    else:
+        assigned, buckets = MATCHERS[method](matrix, seat_matrix, categories, progress=progress)
+    return AllocationResult(matrix, assigned, buckets)
+
+
+def _no_progress(phase, done, total):
+    pass
+
+
+def run_allocation_round(commit=True, progress=None, method=None):
+    """
+    Run the next counselling round.
+
+    The first round matches every eligible student from scratch. Later
+    rounds keep existing seats and only re-process students who can gain
+    from seats freed by withdrawals, upgrades or changed preferences.
+    With commit=False the match is computed and returned without writing
+    allocations or touching the counselling settings.
+
+    method is 'serial_dictatorship' (overall rank) or 'deferred_acceptance'
+    (course merit orders) and defaults to the counselling settings.
+
+    progress is an optional callable taking (phase, done, total); it is
+    called as the round moves through its load, match and write phases.
+    """
+    progress = progress or _no_progress
+    settings = CounsellingSettings.get_settings()
+    if commit and settings.allocation_completed:
+        raise AllocationError("Allocation has already been completed!")
+    method = method or settings.allocation_method
+    if method not in MATCHERS:
+        raise AllocationError(f"Unknown allocation method '{method}'.")
+
+    previous = CounsellingRound.latest()
+    started_at = timezone.now()
+    progress('load', 0, 0)
+    seat_matrix = SeatMatrix.load()
+    if previous is None:
+        result = match_full_round(seat_matrix, progress=progress, method=method)
+    elif method == 'deferred_acceptance':
+        result = DeferredAcceptanceRound(seat_matrix, previous.number + 1).run(progress=progress)
+    else:
+        result = IncrementalRound(seat_matrix, previous.number + 1, since=previous.started_at).run(progress=progress)
+    progress('match', result.students_processed, result.students_processed)
+
+    if commit:
+        progress('write', 0, result.allocated_count)
+        # On its own connection when ALLOCATION_DATABASE_URL is set
+        with allocation_writes(), bulk_seat_changes():
+            if previous is None:
+                write_allocations(result)
+            else:
+                write_round_changes(result, batch_size=WRITE_BATCH_SIZE)
+
+            counselling_round = CounsellingRound.objects.create(
+                number=result.round_number,
+                started_at=started_at,
+                completed_at=timezone.now(),
+                students_processed=result.students_processed,
+                new_allocations=result.new_allocations,
+                upgrades=result.upgrades,
+            )
+            # Cut-off ranks and fill per course, read by the reports and course analytics
+            CourseRoundSummary.materialise(counselling_round)
+
+            # Mark allocation as completed after the last round
+            if result.round_number >= settings.total_rounds:
+                settings.allocation_completed = True
+                settings.save()
+
+            # Update statistics
+            AllocationStatistics.calculate_stats()
+        progress('write', result.allocated_count, result.allocated_count)
+        transaction.on_commit(lambda: round_completed.send(sender=run_allocation_round, result=result))
+
+    return result
@@ -0,0 +1,87 @@
+from array import array
+
+import numpy as np
+
+
+class PreferenceMatrix:
+    """
+    Compact CSR representation of every student's ordered preference list.
+
+    Row i holds the choices of student_ids[i] (students are kept in rank
+    order) in columns offsets[i]:offsets[i + 1]. courses stores dense course
+    indices into course_ids and orders stores the original preference_order,
+    so memory is a few integers per preference instead of a model instance.
+    """
+
+    def __init__(self, student_ids, offsets, courses, orders, course_ids):
+        self.student_ids = student_ids
+        self.offsets = offsets
+        self.courses = courses
+        self.orders = orders
+        self.course_ids = course_ids
+
+    @classmethod
+    def from_rows(cls, rows, course_ids):
+        """
+        Build the matrix from a (student_id, course_id, preference_order)
+        stream that is already sorted by student rank then preference order.
+        """
+        course_ids = np.asarray(course_ids, dtype=np.int64)
+        course_index = {course_id: index for index, course_id in enumerate(course_ids.tolist())}
+
+        # array.array keeps the growing buffers as raw machine integers
+        student_ids = array('q')
+        offsets = array('q', [0])
+        courses = array('i')
+        orders = array('i')
+
+        previous = None
+        for student_id, course_id, preference_order in rows:
+            if student_id != previous:
+                if previous is not None:
+                    offsets.append(len(courses))
+                student_ids.append(student_id)
+                previous = student_id
+            courses.append(course_index[course_id])
+            orders.append(preference_order)
+        if previous is not None:
+            offsets.append(len(courses))
+
+        return cls(
+            student_ids=np.frombuffer(student_ids, dtype=np.int64).copy(),
+            offsets=np.frombuffer(offsets, dtype=np.int64).copy(),
+            courses=np.frombuffer(courses, dtype=np.int32).copy(),
+            orders=np.frombuffer(orders, dtype=np.int32).copy(),
+            course_ids=course_ids,
+        )
+
+    @property
+    def course_index(self):
+        """Map course id to its dense index"""
+        return {course_id: index for index, course_id in enumerate(self.course_ids.tolist())}
+
+    @property
+    def n_students(self):
+        return len(self.student_ids)
+
+    @property
+    def n_courses(self):
+        return len(self.course_ids)
+
+    @property
+    def n_preferences(self):
+        return len(self.courses)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.student_ids, self.offsets, self.courses, self.orders, self.course_ids))
+
+    def row(self, i):
+        """Column slice holding student i's preferences"""
+        return slice(self.offsets[i], self.offsets[i + 1])
+
+    def __len__(self):
+        return self.n_students
+
+    def __repr__(self):
+        return f"<PreferenceMatrix {self.n_students} students x {self.n_courses} courses, {self.n_preferences} preferences>"
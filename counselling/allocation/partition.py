@@ -0,0 +1,146 @@
+"""
+Parallel matching over independent course partitions.
+
+Two courses are connected when some student lists both. The connected
+components of that graph share no applicants, so matching each one on its
+own gives exactly the result of matching everything together, for serial
+dictatorship and deferred acceptance alike. Components are packed into
+one partition per worker, each partition is matched in a process pool,
+and the results are written back by row and column, so the merged match
+does not depend on which worker finishes first.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+import numpy as np
+from django.conf import settings
+
+from .matrix import PreferenceMatrix
+from .seat_matrix import OPEN, SeatMatrix
+
+
+def course_components(matrix):
+    """Component label of every course; courses nobody lists are on their own"""
+    labels = np.arange(matrix.n_courses, dtype=np.int64)
+    # Linking each preference to the next one of the same student connects the whole list
+    same_student = np.ones(matrix.n_preferences, dtype=bool)
+    same_student[matrix.offsets[1:-1]] = False
+    same_student = same_student[1:]
+    left = matrix.courses[:-1][same_student].astype(np.int64)
+    right = matrix.courses[1:][same_student].astype(np.int64)
+
+    while True:
+        lowest = np.minimum(labels[left], labels[right])
+        updated = labels.copy()
+        np.minimum.at(updated, left, lowest)
+        np.minimum.at(updated, right, lowest)
+        # Follow labels to their root so long chains collapse in a few passes
+        while True:
+            rooted = updated[updated]
+            if np.array_equal(rooted, updated):
+                break
+            updated = rooted
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def partition_courses(matrix, parts):
+    """
+    Partition index of every course: components packed into at most parts
+    partitions, largest first, by number of preferences.
+    """
+    labels = course_components(matrix)
+    weights = np.bincount(labels[matrix.courses], minlength=matrix.n_courses)
+    components, label_index = np.unique(labels, return_inverse=True)
+    sizes = weights[components]
+
+    loads = [0] * parts
+    assignment = np.zeros(len(components), dtype=np.int64)
+    # Stable sort so equal components always land in the same partition
+    for component in np.argsort(-sizes, kind='stable').tolist():
+        part = loads.index(min(loads))
+        assignment[component] = part
+        loads[part] += int(sizes[component])
+    return assignment[label_index]
+
+
+def submatrix(matrix, seat_matrix, rows, courses, categories, scores):
+    """
+    The matching inputs restricted to rows (in rank order) and courses,
+    plus the global column of each sub-matrix column.
+    """
+    lengths = np.diff(matrix.offsets)[rows]
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+    columns = np.repeat(matrix.offsets[rows] - offsets[:-1], lengths) + np.arange(offsets[-1])
+    local = np.full(matrix.n_courses, -1, dtype=np.int64)
+    local[courses] = np.arange(len(courses))
+
+    sub = PreferenceMatrix(
+        student_ids=matrix.student_ids[rows],
+        offsets=offsets,
+        courses=local[matrix.courses[columns]].astype(np.int32),
+        orders=matrix.orders[columns],
+        course_ids=matrix.course_ids[courses],
+    )
+    seats = SeatMatrix(seat_matrix.course_ids[courses], seat_matrix.seats[courses], seat_matrix.release[courses])
+    return sub, seats, categories[rows], None if scores is None else scores[columns], columns
+
+
+def _setup_worker():
+    # Spawned workers start without Django; forked ones already have it
+    django.setup()
+
+
+def _match(method, matrix, seat_matrix, categories, scores, progress=None):
+    from .engine import MATCHERS
+
+    if scores is None:
+        return MATCHERS[method](matrix, seat_matrix, categories, progress=progress)
+    return MATCHERS[method](matrix, seat_matrix, categories, scores, progress=progress)
+
+
+def match_partitioned(matrix, seat_matrix, categories, method, scores=None, workers=None, progress=None):
+    """
+    Match every partition in its own process and merge the results.
+
+    Returns (assigned, buckets) for the whole matrix, identical to matching
+    it in one piece. scores, needed by deferred acceptance, must be loaded
+    beforehand because workers do not query the database.
+    """
+    workers = workers or settings.ALLOCATION_WORKERS or os.cpu_count() or 1
+    n = matrix.n_students
+    assigned = np.full(n, -1, dtype=np.int64)
+    buckets = np.full(n, OPEN, dtype=np.int8)
+    if not n:
+        return assigned, buckets
+
+    course_parts = partition_courses(matrix, workers)
+    row_parts = course_parts[matrix.courses[matrix.offsets[:-1]]]
+    if len(np.unique(row_parts)) == 1:
+        # Everything is connected: nothing to run side by side
+        return _match(method, matrix, seat_matrix, categories, scores, progress)
+    jobs = []
+    for part in np.unique(row_parts).tolist():
+        rows = np.flatnonzero(row_parts == part)
+        courses = np.flatnonzero(course_parts == part)
+        jobs.append((rows, submatrix(matrix, seat_matrix, rows, courses, categories, scores)))
+
+    if progress is not None:
+        progress('match', 0, n)
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), initializer=_setup_worker) as pool:
+        futures = [
+            (rows, columns, pool.submit(_match, method, sub, seats, sub_categories, sub_scores))
+            for rows, (sub, seats, sub_categories, sub_scores, columns) in jobs
+        ]
+        done = 0
+        for rows, columns, future in futures:
+            sub_assigned, sub_buckets = future.result()
+            placed = sub_assigned >= 0
+            assigned[rows[placed]] = columns[sub_assigned[placed]]
+            buckets[rows] = sub_buckets
+            done += len(rows)
+            if progress is not None:
+                progress('match', done, n)
+    return assigned, buckets
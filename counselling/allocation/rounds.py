@@ -0,0 +1,285 @@
+import heapq
+
+import numpy as np
+from django.db.models import Count, F, Q
+
+from accounts.models import StudentProfile
+from students.models import StudentPreference
+from ..models import Allocation, Payment
+from .seat_matrix import CATEGORIES, CATEGORY_INDEX, OPEN
+
+
+# Students re-processed between two progress callbacks
+PROGRESS_EVERY = 10000
+
+# Students whose seat may still move: unallocated, or holding an ALLOCATED
+# (floating) seat. CONFIRMED seats are frozen and WITHDRAWN students are out.
+FLOATING = Q(allocation__isnull=True) | Q(allocation__status='ALLOCATED')
+
+
+class RoundStudent:
+    """A student loaded into an incremental round"""
+
+    __slots__ = ('student_id', 'rank', 'bucket', 'preferences', 'allocation_id', 'course_id', 'seat_bucket')
+
+    def __init__(self, student_id, rank, bucket, allocation_id, course_id, seat_bucket):
+        self.student_id = student_id
+        self.rank = rank
+        self.bucket = bucket
+        # [(course_id, preference_order)] in preference order
+        self.preferences = []
+        self.allocation_id = allocation_id
+        self.course_id = course_id
+        self.seat_bucket = seat_bucket
+
+    def better_choices(self):
+        """Preferences ranked above the seat currently held (all of them if none is)"""
+        for position, (course_id, preference_order) in enumerate(self.preferences):
+            if course_id == self.course_id:
+                return self.preferences[:position]
+        return self.preferences
+
+
+class RoundResult:
+    """Outcome of an incremental round"""
+
+    def __init__(self, round_number, students_processed, changes):
+        self.round_number = round_number
+        self.students_processed = students_processed
+        # [(student_id, allocation_id or None, course_id, preference_order, seat_category)]
+        self.changes = changes
+
+    @property
+    def new_allocations(self):
+        return sum(1 for change in self.changes if change[1] is None)
+
+    @property
+    def upgrades(self):
+        return len(self.changes) - self.new_allocations
+
+    @property
+    def allocated_count(self):
+        return len(self.changes)
+
+    def iter_matches(self, with_category=False):
+        """Yield the seats this round changed, in the same shape as AllocationResult"""
+        for student_id, allocation_id, course_id, preference_order, seat_category in self.changes:
+            if with_category:
+                yield student_id, course_id, preference_order, seat_category
+            else:
+                yield student_id, course_id, preference_order
+
+
+def free_seats(seat_matrix):
+    """
+    Seats of every quota bucket not held by an ALLOCATED or CONFIRMED student.
+
+    Open-pool holders beyond the open quota took released reserved seats in
+    an earlier round, so the excess is charged to RELEASE buckets.
+    """
+    index = {course_id: c for c, course_id in enumerate(seat_matrix.course_ids.tolist())}
+    held = np.zeros(seat_matrix.seats.shape, dtype=np.int64)
+    rows = Allocation.objects.exclude(status='WITHDRAWN').values_list('course_id', 'seat_category').annotate(
+        held=Count('id')
+    ).order_by()
+    for course_id, seat_category, count in rows:
+        held[index[course_id], CATEGORY_INDEX.get(seat_category, OPEN)] += count
+
+    remaining = seat_matrix.seats - held
+    excess = np.maximum(-remaining[:, OPEN], 0)
+    remaining[:, OPEN] += excess
+    for b in range(len(CATEGORIES)):
+        if b == OPEN:
+            continue
+        charged = np.where(seat_matrix.release[:, b], np.minimum(excess, np.maximum(remaining[:, b], 0)), 0)
+        remaining[:, b] -= charged
+        excess -= charged
+    return np.maximum(remaining, 0)
+
+
+def interested_students(course_ids, rank_above=0, unallocated_only=False, category=None):
+    """Floating students (of category, if given) who rank one of course_ids above their current seat"""
+    if unallocated_only:
+        seat_filter = Q(allocation__isnull=True)
+    else:
+        seat_filter = Q(allocation__isnull=True) | Q(
+            allocation__status='ALLOCATED',
+            allocation__preference_number__gt=F('preferences__preference_order'),
+        )
+    students = StudentProfile.objects.filter(
+        seat_filter,
+        payments__purpose=Payment.FEE, payments__status='completed',
+        rank__gt=rank_above,
+        preferences__course_id__in=list(course_ids),
+    )
+    if category is not None:
+        students = students.filter(category=category)
+    return students.values('id')
+
+
+def changed_students(since):
+    """Floating students who touched their preference list after since"""
+    return StudentProfile.objects.filter(
+        FLOATING,
+        Q(preferences__created_at__gt=since) | Q(preferences__updated_at__gt=since),
+        payments__purpose=Payment.FEE, payments__status='completed',
+    ).values('id')
+
+
+class IncrementalRound:
+    """
+    Re-run serial dictatorship for the students a round can actually change.
+
+    Everyone keeps their current seat as a floor. Students are only loaded
+    when a course they rank above that seat has a free seat, either at the
+    start of the round (vacancies, withdrawals) or because a better-ranked
+    student upgraded out of it, or when their preference list changed. The
+    loaded students are processed in rank order, so the outcome equals a
+    full rank-ordered pass while the work scales with the churn.
+    """
+
+    def __init__(self, seat_matrix, round_number, since):
+        self.seat_matrix = seat_matrix
+        self.round_number = round_number
+        self.since = since
+        self.course_index = {course_id: c for c, course_id in enumerate(seat_matrix.course_ids.tolist())}
+        self.remaining = free_seats(seat_matrix).tolist()
+        self.students = {}
+        self.heap = []
+        # Course id -> rank after which every interested student is loaded
+        self.loaded_after = {}
+
+    def load(self, student_ids):
+        """Load the preference lists of students not seen yet in this round"""
+        rows = StudentPreference.objects.filter(
+            student_id__in=student_ids
+        ).order_by('student__rank', 'preference_order', 'id').values_list(
+            'student_id', 'student__rank', 'student__category', 'course_id', 'preference_order',
+            'student__allocation__id', 'student__allocation__course_id', 'student__allocation__seat_category',
+        )
+        fresh = set()
+        for student_id, rank, category, course_id, preference_order, allocation_id, held_course_id, seat_category in rows:
+            if student_id not in fresh:
+                if student_id in self.students:
+                    continue
+                fresh.add(student_id)
+                self.students[student_id] = RoundStudent(
+                    student_id, rank, CATEGORY_INDEX.get(category, OPEN), allocation_id, held_course_id,
+                    CATEGORY_INDEX.get(seat_category, OPEN),
+                )
+                heapq.heappush(self.heap, (rank, student_id))
+            self.students[student_id].preferences.append((course_id, preference_order))
+        return len(fresh)
+
+    def run(self, progress=None):
+        course_ids = self.seat_matrix.course_ids.tolist()
+        vacant = [course_id for course_id, seats in zip(course_ids, self.remaining) if seats[OPEN] > 0]
+        if vacant:
+            self.load(interested_students(vacant))
+        for course_id in vacant:
+            self.loaded_after[course_id] = 0
+        # A reserved seat is only open to its own category, so only students of that category are
+        # looked up for it. A seat that lapsed unfilled in an earlier round stays vacant and is looked
+        # up again every round, but everyone of the category who wanted it already holds a better
+        # seat, so the lookup only finds students who became eligible since.
+        for b, category in enumerate(CATEGORIES):
+            reserved = [
+                course_id for course_id, seats in zip(course_ids, self.remaining)
+                if b != OPEN and seats[b] > 0 and seats[OPEN] == 0
+            ]
+            if reserved:
+                self.load(interested_students(reserved, category=category))
+        if self.since is not None:
+            self.load(changed_students(self.since))
+
+        processed = 0
+        if progress is not None:
+            progress('match', 0, len(self.students))
+        changes = {}
+        while self.heap:
+            rank, student_id = heapq.heappop(self.heap)
+            student = self.students[student_id]
+            processed += 1
+            if progress is not None and processed % PROGRESS_EVERY == 0:
+                progress('match', processed, len(self.students))
+            move = self._best_move(student, student.bucket)
+            if move is None:
+                continue
+            course_id, preference_order, bucket = move
+            vacated = student.course_id
+            if vacated is not None:
+                self.remaining[self.course_index[vacated]][student.seat_bucket] += 1
+            student.course_id, student.seat_bucket = course_id, bucket
+            changes[student_id] = (student_id, student.allocation_id, course_id, preference_order, CATEGORIES[bucket])
+
+            # The seat just vacated is only open to students ranked below this one
+            if vacated is not None and vacated not in self.loaded_after:
+                self.loaded_after[vacated] = rank
+                self.load(interested_students([vacated], rank_above=rank))
+
+        processed += self._release_reserved(changes)
+        return RoundResult(self.round_number, processed, list(changes.values()))
+
+    def _best_move(self, student, bucket):
+        remaining = self.remaining
+        for course_id, preference_order in student.better_choices():
+            seats = remaining[self.course_index[course_id]]
+            if seats[OPEN] > 0:
+                seats[OPEN] -= 1
+                return course_id, preference_order, OPEN
+            if bucket != OPEN and seats[bucket] > 0:
+                seats[bucket] -= 1
+                return course_id, preference_order, bucket
+        return None
+
+    def _release_reserved(self, changes):
+        """
+        Offer unfilled RELEASE-rule reserved seats to students still without
+        a seat; returns how many students it loaded that the main pass had not.
+        """
+        released = set()
+        for c, seats in enumerate(self.remaining):
+            for b in range(len(CATEGORIES)):
+                if b != OPEN and seats[b] > 0 and self.seat_matrix.release[c, b]:
+                    seats[OPEN] += seats[b]
+                    seats[b] = 0
+                    released.add(int(self.seat_matrix.course_ids[c]))
+        if not released:
+            return 0
+
+        loaded = self.load(interested_students(released, unallocated_only=True))
+        self.heap = []
+        waiting = sorted(
+            (student.rank, student.student_id) for student in self.students.values() if student.course_id is None
+        )
+        for rank, student_id in waiting:
+            student = self.students[student_id]
+            move = self._best_move(student, OPEN)
+            if move is not None:
+                course_id, preference_order, bucket = move
+                student.course_id, student.seat_bucket = course_id, bucket
+                changes[student_id] = (student_id, None, course_id, preference_order, CATEGORIES[bucket])
+        return loaded
+
+
+def write_round_changes(result, batch_size=2000):
+    """Apply an incremental round: update moved seats, create new ones"""
+    upgraded = []
+    created = []
+    for student_id, allocation_id, course_id, preference_order, seat_category in result.changes:
+        allocation = Allocation(
+            student_id=student_id,
+            course_id=course_id,
+            preference_number=preference_order,
+            seat_category=seat_category,
+            round_number=result.round_number,
+        )
+        if allocation_id is None:
+            created.append(allocation)
+        else:
+            allocation.pk = allocation_id
+            upgraded.append(allocation)
+    Allocation.objects.bulk_update(
+        upgraded, ['course', 'preference_number', 'seat_category', 'round_number'], batch_size=batch_size
+    )
+    Allocation.objects.bulk_create(created, batch_size=batch_size)
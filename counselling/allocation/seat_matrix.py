@@ -0,0 +1,125 @@
+import numpy as np
+
+from accounts.models import StudentProfile
+from colleges.models import Course, CourseQuota
+from .. import db
+from ..models import Payment
+
+
+# Quota buckets in column order. GENERAL is the open pool every student can use.
+CATEGORIES = [code for code, label in StudentProfile.CATEGORY_CHOICES]
+CATEGORY_INDEX = {code: index for index, code in enumerate(CATEGORIES)}
+OPEN = CATEGORY_INDEX['GENERAL']
+
+
+class SeatMatrix:
+    """
+    Per-course, per-category seat counts.
+
+    seats[c, b] is the number of seats of course c in quota bucket b (see
+    CATEGORIES); release[c, b] is True when seats of that bucket left unfilled
+    after the rank-ordered pass move to the open pool of the same course.
+    """
+
+    def __init__(self, course_ids, seats, release=None):
+        self.course_ids = np.asarray(course_ids, dtype=np.int64)
+        self.seats = np.asarray(seats, dtype=np.int64).reshape(len(self.course_ids), len(CATEGORIES))
+        if release is None:
+            release = np.zeros(self.seats.shape, dtype=bool)
+        self.release = release
+
+    @classmethod
+    def load(cls):
+        """Build the seat matrix from Course and CourseQuota in two queries"""
+        course_ids = []
+        totals = []
+        for course_id, total_seats in Course.objects.order_by('id').values_list('id', 'total_seats'):
+            course_ids.append(course_id)
+            totals.append(total_seats)
+
+        course_ids = np.array(course_ids, dtype=np.int64)
+        seats = np.zeros((len(course_ids), len(CATEGORIES)), dtype=np.int64)
+        seats[:, OPEN] = totals
+        release = np.zeros(seats.shape, dtype=bool)
+
+        quotas = CourseQuota.objects.values_list('course_id', 'category', 'seats', 'unfilled_rule')
+        for course_id, category, quota_seats, unfilled_rule in quotas:
+            c = int(np.searchsorted(course_ids, course_id))
+            b = CATEGORY_INDEX[category]
+            seats[c, b] = quota_seats
+            release[c, b] = unfilled_rule == 'RELEASE'
+
+        # Whatever is not reserved stays open
+        reserved = seats.sum(axis=1) - seats[:, OPEN]
+        seats[:, OPEN] = np.maximum(seats[:, OPEN] - reserved, 0)
+        return cls(course_ids, seats, release)
+
+    @property
+    def capacities(self):
+        """Total seats per course"""
+        return self.seats.sum(axis=1)
+
+    @property
+    def n_courses(self):
+        return len(self.course_ids)
+
+    def vacancies(self, filled):
+        """
+        Vacant seats per course and bucket, given the seats held in each.
+        Open seats held beyond the open pool were released from the
+        course's RELEASE quotas, so they come out of those vacancies first.
+        """
+        vacant = np.maximum(self.seats - filled, 0)
+        overflow = np.maximum(filled[:, OPEN] - self.seats[:, OPEN], 0)
+        for b in range(len(CATEGORIES)):
+            moved = np.where(self.release[:, b], np.minimum(overflow, vacant[:, b]), 0)
+            vacant[:, b] -= moved
+            overflow -= moved
+        return vacant
+
+
+def load_student_values(student_ids, field, dtype, convert=None):
+    """
+    field of each student in student_ids, aligned with them, and a mask of
+    the students found. Paid students are read in one pass; any of
+    student_ids it misses, such as a student whose fee payment changed
+    since the ids were loaded, is looked up by id. A student still missing
+    has been deleted.
+    """
+    student_ids = np.asarray(student_ids, dtype=np.int64)
+    rows = StudentProfile.objects.filter(
+        payments__purpose=Payment.FEE, payments__status='completed'
+    ).order_by('id').values_list('id', field)
+    ids = []
+    values = []
+    for student_id, value in rows.iterator(chunk_size=5000):
+        ids.append(student_id)
+        values.append(convert(value) if convert else value)
+    ids = np.array(ids, dtype=np.int64)
+
+    aligned = np.zeros(len(student_ids), dtype=dtype)
+    found = np.zeros(len(student_ids), dtype=bool)
+    if len(ids):
+        # searchsorted gives the slot an unknown id would take, so every hit is checked
+        positions = np.minimum(np.searchsorted(ids, student_ids), len(ids) - 1)
+        found = ids[positions] == student_ids
+        aligned[found] = np.array(values, dtype=dtype)[positions[found]]
+
+    missing = {int(student_ids[i]): i for i in np.flatnonzero(~found)}
+    for chunk in db.chunked(list(missing)):
+        for student_id, value in StudentProfile.objects.filter(pk__in=chunk).values_list('id', field):
+            aligned[missing[student_id]] = convert(value) if convert else value
+            found[missing[student_id]] = True
+    return aligned, found
+
+
+def load_student_categories(student_ids):
+    """Return the quota bucket of each student, aligned with student_ids; OPEN for a deleted student"""
+    student_ids = np.asarray(student_ids, dtype=np.int64)
+    if not len(student_ids):
+        return np.full(0, OPEN, dtype=np.int8)
+    categories, found = load_student_values(
+        student_ids, 'category', np.int8, lambda category: CATEGORY_INDEX.get(category, OPEN)
+    )
+    categories[~found] = OPEN
+    return categories
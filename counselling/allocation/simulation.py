@@ -0,0 +1,357 @@
+"""
+What-if runs of a full allocation round, entirely in memory.
+
+A Snapshot holds the inputs of a first-round match (preferences, seat
+matrix, categories) and the outcome of matching them, and is kept per
+process for SIMULATION_SNAPSHOT_SECONDS or until the next committed round.
+simulate() applies capacity and preference deltas to a copy of it and
+reports the students whose seat would change; nothing is written.
+
+Under serial dictatorship a student's seat only depends on the students
+ranked above them. Extra seats at a course change nothing until the first
+student who found it full, and fewer seats nothing until the first student
+who took or wanted one of them, so everyone before that student (or the
+first one whose list changed) keeps their seat and only the suffix of the
+rank order from there on is matched again. Deferred acceptance has no such cut-off and is rerun on
+the whole snapshot.
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from accounts.models import StudentProfile
+from ..models import CounsellingSettings, Payment
+from .deferred import load_course_priorities, match_deferred_acceptance
+from .engine import load_preferences, release_pass, serial_pass
+from .matrix import PreferenceMatrix
+from .seat_matrix import CATEGORIES, CATEGORY_INDEX, OPEN, SeatMatrix, load_student_categories, load_student_values
+
+
+class SimulationError(Exception):
+    """Raised when the deltas of a simulation are not valid"""
+
+
+def load_ranks(student_ids):
+    """Return the rank of each student, aligned with student_ids"""
+    student_ids = np.asarray(student_ids, dtype=np.int64)
+    if not len(student_ids):
+        return np.zeros(0, dtype=np.int64)
+    ranks, found = load_student_values(student_ids, 'rank', np.int64)
+    if not found.all():
+        student_id = int(student_ids[np.argmin(found)])
+        raise SimulationError(f"Student {student_id} was deleted while the round was loaded; try again.")
+    return ranks
+
+
+class Snapshot:
+    """Inputs and outcome of a full round, as the simulation starts from them"""
+
+    def __init__(self, method, matrix, seat_matrix, categories, ranks):
+        self.method = method
+        self.matrix = matrix
+        self.seat_matrix = seat_matrix
+        self.categories = categories
+        self.ranks = ranks
+        self.taken_at = timezone.now()
+        self.created = time.monotonic()
+        n = matrix.n_students
+
+        if method == 'serial_dictatorship':
+            # The rank-ordered pass is kept apart so a suffix can be replayed on top of it
+            self.first_pass = np.full(n, -1, dtype=np.int64)
+            self.buckets = np.full(n, OPEN, dtype=np.int8)
+            remaining = seat_matrix.seats.copy()
+            serial_pass(matrix, remaining, categories, self.first_pass, self.buckets)
+            self.assigned = self.first_pass.copy()
+            release_pass(matrix, seat_matrix, remaining, self.assigned)
+            self.scores = None
+        else:
+            self.scores = load_course_priorities(matrix)
+            self.assigned, self.buckets = match_deferred_acceptance(matrix, seat_matrix, categories, self.scores)
+
+    @classmethod
+    def take(cls, method):
+        seat_matrix = SeatMatrix.load()
+        matrix = load_preferences(seat_matrix.course_ids)
+        categories = load_student_categories(matrix.student_ids)
+        return cls(method, matrix, seat_matrix, categories, load_ranks(matrix.student_ids))
+
+    @property
+    def age(self):
+        return time.monotonic() - self.created
+
+
+_snapshots = {}
+_lock = threading.Lock()
+
+
+def get_snapshot(method, refresh=False):
+    """The process's snapshot for method, taken again once it is stale"""
+    with _lock:
+        snapshot = _snapshots.get(method)
+        if refresh or snapshot is None or snapshot.age > settings.SIMULATION_SNAPSHOT_SECONDS:
+            snapshot = _snapshots[method] = Snapshot.take(method)
+        return snapshot
+
+
+def clear_snapshots(**kwargs):
+    """round_completed receiver; the next simulation starts from the new data"""
+    with _lock:
+        _snapshots.clear()
+
+
+def apply_capacity(seat_matrix, capacity):
+    """
+    A copy of seat_matrix with the capacity deltas applied, and the dense
+    indices of the courses that gained seats and of those that lost some
+    (in any bucket). Each delta is a dict with course_id,
+    seats (added, or removed when negative) and an optional category,
+    GENERAL (the open pool) by default.
+    """
+    seats = seat_matrix.seats.copy()
+    for delta in capacity:
+        try:
+            course_id = int(delta['course_id'])
+            added = int(delta['seats'])
+        except (KeyError, TypeError, ValueError):
+            raise SimulationError("Each capacity change needs an integer course_id and seats.")
+        category = delta.get('category', 'GENERAL')
+        if category not in CATEGORY_INDEX:
+            raise SimulationError(f"Unknown seat category '{category}'.")
+        c = int(np.searchsorted(seat_matrix.course_ids, course_id))
+        if c == seat_matrix.n_courses or seat_matrix.course_ids[c] != course_id:
+            raise SimulationError(f"Course {course_id} does not exist.")
+        b = CATEGORY_INDEX[category]
+        seats[c, b] += added
+        if seats[c, b] < 0:
+            raise SimulationError(f"Course {course_id} would have fewer than 0 {category} seats.")
+    differs = seats != seat_matrix.seats
+    shrunk = np.flatnonzero((seats < seat_matrix.seats).any(axis=1))
+    grown = np.flatnonzero(differs.any(axis=1) & ~np.isin(np.arange(len(seats)), shrunk))
+    return SeatMatrix(seat_matrix.course_ids, seats, seat_matrix.release), grown, shrunk
+
+
+def apply_preferences(snapshot, preferences):
+    """
+    The snapshot's matrix, categories and ranks with the preference deltas
+    applied, and the first row that differs. Each delta is a dict with
+    student_id and the course_ids that replace the student's list; an
+    empty list takes the student out of the match.
+    """
+    matrix = snapshot.matrix
+    n = matrix.n_students
+    if not preferences:
+        return matrix, snapshot.categories, snapshot.ranks, n
+
+    course_index = matrix.course_index
+    lists = {}
+    for delta in preferences:
+        try:
+            student_id = int(delta['student_id'])
+            course_ids = [int(course_id) for course_id in delta['course_ids']]
+        except (KeyError, TypeError, ValueError):
+            raise SimulationError("Each preference change needs an integer student_id and a list of course_ids.")
+        if len(set(course_ids)) != len(course_ids):
+            raise SimulationError(f"Student {student_id} lists a course more than once.")
+        unknown = [course_id for course_id in course_ids if course_id not in course_index]
+        if unknown:
+            raise SimulationError(f"Course {unknown[0]} does not exist.")
+        lists[student_id] = [course_index[course_id] for course_id in course_ids]
+
+    # Students already in the match change their row; paid students without a list get a new one
+    requested = np.array(sorted(lists), dtype=np.int64)
+    rows = np.zeros(len(requested), dtype=np.int64)
+    present = np.zeros(len(requested), dtype=bool)
+    if n:
+        order = np.argsort(matrix.student_ids)
+        rows = order[np.minimum(np.searchsorted(matrix.student_ids, requested, sorter=order), n - 1)]
+        present = matrix.student_ids[rows] == requested
+    edits = []
+    for student_id, row in zip(requested[present].tolist(), rows[present].tolist()):
+        edits.append((row, True, student_id, int(snapshot.ranks[row]), int(snapshot.categories[row])))
+    missing = requested[~present].tolist()
+    if missing:
+        profiles = StudentProfile.objects.filter(
+            pk__in=missing, payments__purpose=Payment.FEE, payments__status='completed',
+        ).values_list('id', 'rank', 'category')
+        known = {student_id: (rank, category) for student_id, rank, category in profiles}
+        for student_id in missing:
+            if student_id not in known:
+                raise SimulationError(f"Student {student_id} has not paid the counselling fee.")
+            rank, category = known[student_id]
+            row = int(np.searchsorted(snapshot.ranks, rank))
+            edits.append((row, False, student_id, rank, CATEGORY_INDEX.get(category, OPEN)))
+    edits.sort()
+
+    lengths = np.diff(matrix.offsets)
+    pieces = {'student_ids': [], 'ranks': [], 'categories': [], 'courses': [], 'orders': [], 'lengths': []}
+
+    def keep(start, end):
+        pieces['student_ids'].append(matrix.student_ids[start:end])
+        pieces['ranks'].append(snapshot.ranks[start:end])
+        pieces['categories'].append(snapshot.categories[start:end])
+        pieces['courses'].append(matrix.courses[matrix.offsets[start]:matrix.offsets[end]])
+        pieces['orders'].append(matrix.orders[matrix.offsets[start]:matrix.offsets[end]])
+        pieces['lengths'].append(lengths[start:end])
+
+    previous = 0
+    for row, replaces, student_id, rank, category in edits:
+        keep(previous, row)
+        courses = lists[student_id]
+        if courses:
+            pieces['student_ids'].append([student_id])
+            pieces['ranks'].append([rank])
+            pieces['categories'].append([category])
+            pieces['courses'].append(courses)
+            pieces['orders'].append(range(1, len(courses) + 1))
+            pieces['lengths'].append([len(courses)])
+        previous = row + 1 if replaces else row
+    keep(previous, n)
+
+    lengths = np.concatenate(pieces['lengths']).astype(np.int64)
+    edited = PreferenceMatrix(
+        student_ids=np.concatenate(pieces['student_ids']).astype(np.int64),
+        offsets=np.concatenate(([0], np.cumsum(lengths))).astype(np.int64),
+        courses=np.concatenate(pieces['courses']).astype(np.int32),
+        orders=np.concatenate(pieces['orders']).astype(np.int32),
+        course_ids=matrix.course_ids,
+    )
+    categories = np.concatenate(pieces['categories']).astype(np.int8)
+    ranks = np.concatenate(pieces['ranks']).astype(np.int64)
+    return edited, categories, ranks, edits[0][0]
+
+
+def first_affected_row(snapshot, grown, shrunk):
+    """
+    The first row whose rank-ordered pass found a grown course full or
+    took a reserved seat there, or looked at a shrunk course at or above
+    the seat it got; rows before it are matched exactly as in the snapshot.
+    """
+    matrix = snapshot.matrix
+    n = matrix.n_students
+    if not n or not (len(grown) or len(shrunk)):
+        return n
+    column_rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(matrix.offsets))
+    # Every column a row tried before the one it got, or its whole list when it got none
+    seat = np.where(snapshot.first_pass >= 0, snapshot.first_pass, matrix.offsets[1:])[column_rows]
+    columns = np.arange(matrix.n_preferences)
+    # A seat taken from a quota bucket moves to a grown open pool
+    reserved = (snapshot.buckets != OPEN)[column_rows]
+    hits = np.isin(matrix.courses, grown) & ((columns < seat) | ((columns == seat) & reserved))
+    hits |= np.isin(matrix.courses, shrunk) & (columns <= seat)
+    if not hits.any():
+        return n
+    return int(column_rows[hits.argmax()])
+
+
+def outcome(matrix, assigned, buckets):
+    """(student_ids, course_ids, buckets) of every student, course id -1 when unallocated"""
+    placed = assigned >= 0
+    course_ids = np.full(matrix.n_students, -1, dtype=np.int64)
+    course_ids[placed] = matrix.course_ids[matrix.courses[assigned[placed]]]
+    return matrix.student_ids, course_ids, np.where(placed, buckets, OPEN)
+
+
+class SimulationResult:
+    """Seats that would change, against the snapshot's outcome"""
+
+    def __init__(self, snapshot, matrix, ranks, assigned, buckets, start, seconds):
+        self.snapshot = snapshot
+        self.matrix = matrix
+        self.assigned = assigned
+        self.buckets = buckets
+        self.recomputed_from = start
+        self.students_recomputed = matrix.n_students - start
+        self.seconds = seconds
+        self.start_rank = int(ranks[start]) if start < matrix.n_students else None
+
+        before_ids, before_courses, before_buckets = outcome(snapshot.matrix, snapshot.assigned, snapshot.buckets)
+        after_ids, after_courses, after_buckets = outcome(matrix, assigned, buckets)
+        self.allocated_before = int(np.count_nonzero(before_courses >= 0))
+        self.allocated_after = int(np.count_nonzero(after_courses >= 0))
+
+        # Line both outcomes up on every student in either of them
+        student_ids = np.union1d(before_ids, after_ids)
+        student_ranks = np.zeros(len(student_ids), dtype=np.int64)
+        columns = []
+        for ids, courses, seat_buckets, row_ranks in (
+            (before_ids, before_courses, before_buckets, snapshot.ranks),
+            (after_ids, after_courses, after_buckets, ranks),
+        ):
+            positions = np.searchsorted(student_ids, ids)
+            aligned_courses = np.full(len(student_ids), -1, dtype=np.int64)
+            aligned_buckets = np.full(len(student_ids), OPEN, dtype=np.int8)
+            aligned_courses[positions] = courses
+            aligned_buckets[positions] = seat_buckets
+            student_ranks[positions] = row_ranks
+            columns.append((aligned_courses, aligned_buckets))
+        (old_courses, old_buckets), (new_courses, new_buckets) = columns
+        changed = (old_courses != new_courses) | ((new_courses >= 0) & (old_buckets != new_buckets))
+        changed = np.flatnonzero(changed)
+        changed = changed[np.argsort(student_ranks[changed], kind='stable')]
+
+        def seat(course_id, bucket):
+            if course_id < 0:
+                return None
+            return {'course_id': course_id, 'seat_category': CATEGORIES[bucket]}
+
+        self.changes = [
+            {
+                'student_id': student_id,
+                'rank': rank,
+                'before': seat(old_course, old_bucket),
+                'after': seat(new_course, new_bucket),
+            }
+            for student_id, rank, old_course, old_bucket, new_course, new_bucket in zip(
+                student_ids[changed].tolist(), student_ranks[changed].tolist(),
+                old_courses[changed].tolist(), old_buckets[changed].tolist(),
+                new_courses[changed].tolist(), new_buckets[changed].tolist(),
+            )
+        ]
+
+    def as_dict(self):
+        return {
+            'method': self.snapshot.method,
+            'snapshot_taken_at': self.snapshot.taken_at.isoformat(),
+            'recomputed_from_rank': self.start_rank,
+            'students_recomputed': self.students_recomputed,
+            'seconds': round(self.seconds, 3),
+            'allocated_before': self.allocated_before,
+            'allocated_after': self.allocated_after,
+            'changes': self.changes,
+        }
+
+
+def simulate(capacity=(), preferences=(), method=None, snapshot=None):
+    """
+    Match the snapshot again with capacity and preference deltas applied
+    (see apply_capacity() and apply_preferences()) and return a
+    SimulationResult. The Allocation table is not read or written.
+    """
+    if snapshot is None:
+        snapshot = get_snapshot(method or CounsellingSettings.get_settings().allocation_method)
+    started = time.perf_counter()
+    seat_matrix, grown, shrunk = apply_capacity(snapshot.seat_matrix, capacity)
+    matrix, categories, ranks, first_changed = apply_preferences(snapshot, preferences)
+
+    if snapshot.method == 'serial_dictatorship':
+        start = min(first_changed, first_affected_row(snapshot, grown, shrunk))
+        assigned = np.full(matrix.n_students, -1, dtype=np.int64)
+        buckets = np.full(matrix.n_students, OPEN, dtype=np.int8)
+        # Rows before start are identical in both matrices and keep their seats
+        assigned[:start] = snapshot.first_pass[:start]
+        buckets[:start] = snapshot.buckets[:start]
+        remaining = seat_matrix.seats.copy()
+        placed = assigned[:start] >= 0
+        np.subtract.at(remaining, (matrix.courses[assigned[:start][placed]], buckets[:start][placed]), 1)
+        serial_pass(matrix, remaining, categories, assigned, buckets, start=start)
+        release_pass(matrix, seat_matrix, remaining, assigned)
+    else:
+        start = 0
+        scores = snapshot.scores if matrix is snapshot.matrix else load_course_priorities(matrix)
+        assigned, buckets = match_deferred_acceptance(matrix, seat_matrix, categories, scores)
+
+    return SimulationResult(snapshot, matrix, ranks, assigned, buckets, start, time.perf_counter() - started)
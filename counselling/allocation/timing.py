@@ -0,0 +1,46 @@
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class PhaseTimer:
+    """
+    Progress callback that records wall time per allocation phase.
+
+    Pass an instance as run_allocation_round(progress=...); a phase runs from
+    its first callback until the next phase starts or stop() is called.
+    """
+
+    def __init__(self):
+        self.started = {}
+        self.durations = {}
+        self.current = None
+        self.total_start = time.perf_counter()
+
+    def __call__(self, phase, done, total):
+        if phase != self.current:
+            self._switch(phase)
+
+    def _switch(self, phase):
+        now = time.perf_counter()
+        if self.current is not None:
+            self.durations[self.current] = self.durations.get(self.current, 0) + now - self.started[self.current]
+        self.current = phase
+        if phase is not None:
+            self.started[phase] = now
+
+    def stop(self):
+        self._switch(None)
+        self.total = time.perf_counter() - self.total_start
+        return self
+
+
+def peak_memory_mb():
+    """Peak resident set size of this process in MB, or None if unknown"""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
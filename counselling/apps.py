@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class CounsellingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'counselling'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from . import signals  # noqa: F401
+        from .allocation import round_completed
+        from .allocation.simulation import clear_snapshots
+        from .db import configure_sqlite
+        from .predictor import cutoffs_changed
+        connection_created.connect(configure_sqlite, dispatch_uid='counselling.configure_sqlite')
+        round_completed.connect(clear_snapshots, dispatch_uid='counselling.clear_snapshots')
+        round_completed.connect(cutoffs_changed, dispatch_uid='counselling.cutoffs_changed')
@@ -0,0 +1,148 @@
+"""
+Benchmark suite for allocation, statistics, exports and dashboards.
+
+Each size runs against a throwaway test database seeded with seed_data(),
+so benchmarks never touch the real database. Results are plain dicts that
+the `benchmark` command saves as JSON and compares against earlier runs.
+"""
+import logging
+import platform
+import subprocess
+import tempfile
+import time
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from .models import AllocationStatistics
+from .seeding import SeedConfig, seed_data
+
+
+def _consume(response):
+    """Read the whole body so streaming responses are timed end to end"""
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def _get(url):
+    def case(client):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+        return _consume(response)
+    return case
+
+
+def _run_allocation(client):
+    with override_settings(ALLOCATION_RUN_IN_BACKGROUND=False):
+        response = client.post(reverse('counselling:run_allocation'))
+    if response.status_code != 302:
+        raise RuntimeError(f"run_allocation returned {response.status_code}")
+    return 0
+
+
+def _calculate_stats(client):
+    AllocationStatistics.calculate_stats()
+    return 0
+
+
+def benchmark_cases():
+    """(name, callable) pairs in run order; allocation runs before the exports"""
+    return [
+        ('calculate_stats', _calculate_stats),
+        ('admin_dashboard', _get(reverse('counselling:admin_dashboard'))),
+        ('dashboard_api', _get(reverse('counselling:dashboard_api'))),
+        ('reports_dashboard', _get(reverse('reports:reports_dashboard'))),
+        ('run_allocation', _run_allocation),
+        ('admin_dashboard_after_allocation', _get(reverse('counselling:admin_dashboard'))),
+        ('export_results', _get(reverse('counselling:export_results'))),
+        ('export_allocations', _get(reverse('reports:export_allocations'))),
+    ]
+
+
+def time_case(func, client):
+    """Run one case, returning seconds, query count, response bytes or the error"""
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        try:
+            size = func(client)
+        except Exception as e:
+            return {'seconds': None, 'error': f"{type(e).__name__}: {e}"}
+        seconds = time.perf_counter() - started
+    return {'seconds': round(seconds, 4), 'queries': len(queries), 'bytes': size}
+
+
+def run_size(students, seed=42, stdout=None):
+    """Seed a fresh test database with students and time every case"""
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    # Reports the report views build go to a throwaway directory
+    media = tempfile.TemporaryDirectory()
+    media_override = override_settings(MEDIA_ROOT=media.name)
+    media_override.enable()
+    # Failing cases are recorded in the results; keep their tracebacks out of the output
+    request_logger = logging.getLogger('django.request')
+    request_level = request_logger.level
+    request_logger.setLevel(logging.CRITICAL)
+    try:
+        started = time.perf_counter()
+        seed_data(SeedConfig(students=students, seed=seed))
+        results = {'seed': {'seconds': round(time.perf_counter() - started, 4)}}
+
+        admin = User.objects.create(username='benchmark_admin', user_type='super_admin')
+        client = Client()
+        client.force_login(admin)
+        for name, func in benchmark_cases():
+            results[name] = time_case(func, client)
+            if stdout is not None:
+                outcome = results[name]
+                if outcome['seconds'] is None:
+                    stdout.write(f"  {name:<34} FAILED {outcome['error']}")
+                else:
+                    stdout.write(f"  {name:<34} {outcome['seconds']:>9.3f}s {outcome['queries']:>7} queries")
+        return results
+    finally:
+        request_logger.setLevel(request_level)
+        media_override.disable()
+        media.cleanup()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def environment():
+    """Metadata stored next to the timings so runs can be compared fairly"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'created_at': timezone.now().isoformat(),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+    }
+
+
+def compare(current, previous, threshold=1.2):
+    """
+    Yield (size, case, old_seconds, new_seconds, ratio, regressed) for every
+    case timed in both runs.
+    """
+    for size, cases in current['sizes'].items():
+        old_cases = previous.get('sizes', {}).get(size, {})
+        for name, outcome in cases.items():
+            old = old_cases.get(name, {})
+            if outcome.get('seconds') is None or not old.get('seconds'):
+                continue
+            ratio = outcome['seconds'] / old['seconds']
+            yield size, name, old['seconds'], outcome['seconds'], ratio, ratio > threshold
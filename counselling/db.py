@@ -0,0 +1,89 @@
+"""
+Database connections for the allocation write phase.
+
+Inside allocation_writes() every query of the current thread is routed to
+ALLOCATION_DB_ALIAS and runs in one transaction on that connection. The
+alias is 'default' unless ALLOCATION_DATABASE_URL is set, in which case
+the write phase gets a connection of its own and does not tie up the one
+serving requests. Code that defers work to commit time uses on_commit()
+here so the work waits for the connection that is actually writing.
+
+configure_sqlite() puts every new SQLite connection into
+SQLITE_JOURNAL_MODE; in WAL mode readers no longer block the writer.
+
+Lookups over an arbitrary list of ids are split with chunked(), which
+keeps every IN (...) list under SQLite's bound parameter limit.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+_state = threading.local()
+
+# Longest IN (...) list sent in one query
+IN_LOOKUP_LIMIT = 900
+
+
+def write_alias():
+    """Alias the current thread writes to"""
+    return getattr(_state, 'alias', None) or DEFAULT_DB_ALIAS
+
+
+def get_connection():
+    return connections[write_alias()]
+
+
+def on_commit(func):
+    """Run func when the current thread's write transaction commits, or now outside one"""
+    transaction.on_commit(func, using=write_alias())
+
+
+def chunked(items, size=IN_LOOKUP_LIMIT):
+    """Consecutive slices of items, each short enough for one IN (...) lookup"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+@contextmanager
+def allocation_writes():
+    """Route the block's queries to ALLOCATION_DB_ALIAS inside one transaction"""
+    previous = getattr(_state, 'alias', None)
+    _state.alias = settings.ALLOCATION_DB_ALIAS
+    try:
+        with transaction.atomic(using=_state.alias):
+            yield
+    finally:
+        _state.alias = previous
+
+
+class AllocationRouter:
+    """Sends the allocation write phase to its own connection; everything else is left to the defaults"""
+
+    def db_for_read(self, model, **hints):
+        return getattr(_state, 'alias', None)
+
+    def db_for_write(self, model, **hints):
+        return getattr(_state, 'alias', None)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias points at the same database
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db != DEFAULT_DB_ALIAS and db == settings.ALLOCATION_DB_ALIAS:
+            return False
+        return None
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """connection_created receiver applying the journal mode to SQLite connections"""
+    if connection.vendor != 'sqlite' or not settings.SQLITE_JOURNAL_MODE:
+        return
+    if connection.settings_dict['NAME'] == ':memory:' or 'mode=memory' in str(connection.settings_dict['NAME']):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA journal_mode = {settings.SQLITE_JOURNAL_MODE}')
+        cursor.execute(f'PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}')
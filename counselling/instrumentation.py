@@ -0,0 +1,200 @@
+"""
+Per-request query and latency instrumentation.
+
+RequestMetricsMiddleware times every request and, through a database
+execute wrapper, every SQL query it runs, so it works with DEBUG off.
+Template rendering is timed by the TimedDjangoTemplates backend. Each
+request is logged at DEBUG level and folded into per-view histograms that
+the super admin can read from the metrics endpoint. A SQL statement run
+N_PLUS_ONE_THRESHOLD or more times in one request is logged as a likely
+N+1 pattern, and any request slower than SLOW_REQUEST_MS is logged too.
+Metrics live in process memory, one set per worker.
+"""
+import bisect
+import copy
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+QUERY_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500]
+SIZE_BUCKETS = [1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024]
+
+_state = threading.local()
+
+
+def _histogram(bounds):
+    return {'bounds': bounds, 'counts': [0] * (len(bounds) + 1)}
+
+
+def _observe(histogram, value):
+    histogram['counts'][bisect.bisect_left(histogram['bounds'], value)] += 1
+
+
+def _shorten(sql, length=300):
+    sql = re.sub(r'\s+', ' ', sql)
+    return sql if len(sql) <= length else sql[:length] + '...'
+
+
+class RequestProfile:
+    """Queries and render time of one request; called by the database as an execute wrapper"""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.slowest = (0.0, '')
+        self.render_seconds = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            seconds = time.perf_counter() - started
+            self.queries += 1
+            self.sql_seconds += seconds
+            self.statements[sql] += 1
+            if seconds > self.slowest[0]:
+                self.slowest = (seconds, sql)
+
+    def repeated_statements(self, threshold):
+        """(count, sql) for statements run at least threshold times, most repeated first"""
+        return [(count, sql) for sql, count in self.statements.most_common() if count >= threshold]
+
+
+class MetricsRegistry:
+    """Per-view aggregates of the profiled requests, shared by the threads of one process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+    def record(self, view, seconds, profile, size, n_plus_one):
+        with self.lock:
+            metrics = self.views.get(view)
+            if metrics is None:
+                metrics = self.views[view] = {
+                    'requests': 0,
+                    'total_ms': 0.0,
+                    'sql_ms': 0.0,
+                    'render_ms': 0.0,
+                    'queries': 0,
+                    'bytes': 0,
+                    'n_plus_one': 0,
+                    'slowest_query': {'ms': 0.0, 'sql': ''},
+                    'latency_ms': _histogram(LATENCY_BUCKETS_MS),
+                    'query_count': _histogram(QUERY_BUCKETS),
+                    'response_bytes': _histogram(SIZE_BUCKETS),
+                }
+            metrics['requests'] += 1
+            metrics['total_ms'] += seconds * 1000
+            metrics['sql_ms'] += profile.sql_seconds * 1000
+            metrics['render_ms'] += profile.render_seconds * 1000
+            metrics['queries'] += profile.queries
+            metrics['n_plus_one'] += bool(n_plus_one)
+            _observe(metrics['latency_ms'], seconds * 1000)
+            _observe(metrics['query_count'], profile.queries)
+            if size is not None:
+                metrics['bytes'] += size
+                _observe(metrics['response_bytes'], size)
+            slowest_ms, slowest_sql = profile.slowest[0] * 1000, profile.slowest[1]
+            if slowest_ms > metrics['slowest_query']['ms']:
+                metrics['slowest_query'] = {'ms': round(slowest_ms, 2), 'sql': _shorten(slowest_sql)}
+
+    def snapshot(self):
+        """Copy of the aggregates with per-request means added"""
+        with self.lock:
+            views = copy.deepcopy(self.views)
+        for view in views.values():
+            for field in ('total_ms', 'sql_ms', 'render_ms', 'queries'):
+                view[f'mean_{field}'] = round(view[field] / view['requests'], 2)
+        return dict(sorted(views.items()))
+
+
+metrics = MetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+    """Profile each request's queries, render time and response size"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        _state.profile = profile
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _state.profile = None
+        seconds = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        size = None if response.streaming else len(response.content)
+        n_plus_one = profile.repeated_statements(settings.N_PLUS_ONE_THRESHOLD)
+        metrics.record(view, seconds, profile, size, n_plus_one)
+
+        logger.debug(
+            "%s %s %s %.1fms queries=%d sql=%.1fms render=%.1fms bytes=%s",
+            request.method, view, response.status_code, seconds * 1000, profile.queries,
+            profile.sql_seconds * 1000, profile.render_seconds * 1000, size if size is not None else 'streamed',
+        )
+        if n_plus_one:
+            count, sql = n_plus_one[0]
+            logger.warning("Possible N+1 in %s: the same query ran %d times: %s", view, count, _shorten(sql))
+        if seconds * 1000 > settings.SLOW_REQUEST_MS:
+            logger.warning(
+                "Slow request %s %s: %.0fms, %d queries, slowest %.1fms: %s", request.method, view,
+                seconds * 1000, profile.queries, profile.slowest[0] * 1000, _shorten(profile.slowest[1]),
+            )
+        return response
+
+
+class TimedTemplate:
+    """Backend template that adds its render time to the current request's profile"""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            profile = getattr(_state, 'profile', None)
+            if profile is not None:
+                profile.render_seconds += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend whose templates report their render time"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
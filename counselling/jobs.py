@@ -0,0 +1,202 @@
+"""
+Background allocation jobs.
+
+The admin dashboard only queues an AllocationJob; the `allocation_worker`
+management command claims queued jobs and runs them outside the request
+cycle, writing phase and progress back to the job row as it goes. While
+the job runs, a side thread stamps heartbeat_at on a connection of its
+own, including through phases that report no progress; a job left
+running by a worker that died is failed once it has been silent for
+ALLOCATION_JOB_TIMEOUT_SECONDS.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .allocation import run_allocation_round
+from .models import AllocationJob
+
+
+logger = logging.getLogger(__name__)
+
+# Share of the progress bar each phase covers
+PHASE_SPAN = {
+    'load': (0, 10),
+    'match': (10, 80),
+    'write': (80, 100),
+}
+
+
+class JobAlreadyActive(Exception):
+    """Raised when a job is queued while another one is still pending"""
+
+
+STALE_ERROR = "The allocation worker stopped reporting progress."
+
+
+def fail_stale_jobs(timeout=None):
+    """Fail running jobs silent for ALLOCATION_JOB_TIMEOUT_SECONDS; returns how many"""
+    timeout = settings.ALLOCATION_JOB_TIMEOUT_SECONDS if timeout is None else timeout
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=timeout)
+    stale = AllocationJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff), status='RUNNING',
+    )
+    count = stale.update(status='FAILED', error=STALE_ERROR, finished_at=now)
+    if count:
+        logger.warning("Failed %s allocation job(s) left running by a worker that stopped", count)
+    return count
+
+
+def enqueue_allocation(user=None):
+    """Queue an allocation round, refusing if one is already queued or running"""
+    fail_stale_jobs()
+    try:
+        with transaction.atomic():
+            active = AllocationJob.objects.filter(status__in=['QUEUED', 'RUNNING']).first()
+            if active is not None:
+                raise JobAlreadyActive(
+                    f"Allocation job #{active.pk} is already {active.get_status_display().lower()}."
+                )
+            return AllocationJob.objects.create(requested_by=user)
+    except IntegrityError:
+        # Another request queued one between the check and the insert
+        raise JobAlreadyActive("An allocation job is already queued.")
+
+
+def claim_next_job():
+    """Mark the oldest queued job as running and return it, or None"""
+    for job in AllocationJob.objects.filter(status='QUEUED').order_by('created_at')[:5]:
+        now = timezone.now()
+        claimed = AllocationJob.objects.filter(pk=job.pk, status='QUEUED').update(
+            status='RUNNING', started_at=now, heartbeat_at=now, phase='load'
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+class JobProgress:
+    """
+    Progress callback for run_allocation_round that writes to the job row.
+
+    Writes are throttled to one per interval seconds per phase so a fast
+    match loop does not turn into a stream of UPDATEs.
+    """
+
+    def __init__(self, job, interval=1.0):
+        self.job = job
+        self.interval = interval
+        self.phase = None
+        self.last_write = 0
+        self.match_started = None
+
+    def __call__(self, phase, done, total):
+        now = time.monotonic()
+        if phase == 'match' and self.match_started is None:
+            self.match_started = now
+        if phase == self.phase and now - self.last_write < self.interval and done < total:
+            return
+
+        start, end = PHASE_SPAN.get(phase, (0, 100))
+        fraction = done / total if total else 0
+        fields = {
+            'phase': phase,
+            'progress': round(start + (end - start) * fraction, 1),
+            'heartbeat_at': timezone.now(),
+        }
+        if phase == 'match':
+            elapsed = now - self.match_started
+            fields['students_processed'] = done
+            fields['throughput'] = round(done / elapsed, 1) if elapsed > 0 else 0
+        AllocationJob.objects.filter(pk=self.job.pk).update(**fields)
+        self.phase = phase
+        self.last_write = now
+
+
+class Heartbeat:
+    """
+    Context manager stamping the job's heartbeat_at every interval seconds
+    from a side thread. The thread has its own connection, so the stamps
+    are visible while the round's write transaction is still open. On
+    SQLite a stamp waits for that transaction like any other write; one
+    that times out is skipped and the next is tried.
+    """
+
+    def __init__(self, job, interval=None):
+        self.job = job
+        self.interval = settings.ALLOCATION_JOB_HEARTBEAT_SECONDS if interval is None else interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._beat, name=f'allocation-job-{job.pk}-heartbeat', daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def _beat(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    AllocationJob.objects.filter(pk=self.job.pk, status='RUNNING').update(heartbeat_at=timezone.now())
+                except DatabaseError:
+                    logger.warning("Heartbeat of allocation job #%s skipped", self.job.pk, exc_info=True)
+        finally:
+            connections.close_all()
+
+
+def run_job(job):
+    """Run a claimed job to completion and record the outcome"""
+    # A job failed as stale meanwhile keeps that outcome
+    running = AllocationJob.objects.filter(pk=job.pk, status='RUNNING')
+    try:
+        with Heartbeat(job):
+            result = run_allocation_round(progress=JobProgress(job))
+    except Exception as e:
+        logger.exception("Allocation job #%s failed", job.pk)
+        running.update(status='FAILED', error=str(e), finished_at=timezone.now())
+        return False
+
+    finished = running.update(
+        status='SUCCEEDED',
+        phase='done',
+        progress=100,
+        round_number=result.round_number,
+        students_processed=result.students_processed,
+        allocated_count=result.allocated_count,
+        upgrades=result.upgrades,
+        finished_at=timezone.now(),
+    )
+    if not finished:
+        logger.warning("Allocation job #%s finished after it was failed as stale", job.pk)
+    return bool(finished)
+
+
+def job_status(job):
+    """JSON-friendly view of a job for the dashboard poller"""
+    if job is None:
+        return None
+    return {
+        'id': job.pk,
+        'status': job.status,
+        'phase': job.phase,
+        'progress': job.progress,
+        'students_processed': job.students_processed,
+        'throughput': job.throughput,
+        'round_number': job.round_number,
+        'allocated_count': job.allocated_count,
+        'upgrades': job.upgrades,
+        'error': job.error,
+        'created_at': job.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'finished_at': job.finished_at.strftime('%Y-%m-%d %H:%M:%S') if job.finished_at else None,
+    }
@@ -0,0 +1,228 @@
+"""
+Load test for deadline-day traffic.
+
+Virtual users, each a thread with its own test Client, log in as seeded
+students and send a weighted mix of the requests students and admins make
+around payment and preference deadlines. Like the benchmarks it runs
+against a throwaway database seeded with seed_data(); on SQLite that
+database is a file, so the threads contend for it the way separate
+workers would. The `loadtest` command prints and saves the results;
+`benchmark_writes` repeats a write-only load once per SQLite setting.
+"""
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+
+import numpy as np
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from colleges.models import Course
+from .models import CounsellingSettings
+from .seeding import SEED_PASSWORD, SEED_PREFIX, SeedConfig, seed_data
+
+
+# Relative weight of each action in the default mix
+DEFAULT_MIX = {
+    'login': 1,
+    'student_dashboard': 3,
+    'fill_preferences': 2,
+    'course_catalogue': 2,
+    'submit_preferences': 2,
+    'make_payment': 1,
+    'dashboard_api': 1,
+}
+
+# Only the requests that write, for comparing database settings under write contention
+WRITE_MIX = {
+    'submit_preferences': 3,
+    'make_payment': 1,
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+class VirtualUser:
+    """One simulated user: a student session plus an admin session for the dashboard"""
+
+    def __init__(self, index, students, course_ids, admin, seed):
+        self.rng = random.Random(seed + index)
+        self.students = students
+        self.course_ids = course_ids
+        # Server errors become 500 responses; raised, they would surface in whichever thread's client looks next
+        self.client = Client(raise_request_exception=False)
+        self.client.force_login(User.objects.get(username=self.pick_student()))
+        self.admin_client = Client(raise_request_exception=False)
+        self.admin_client.force_login(admin)
+
+    def pick_student(self):
+        return f'{SEED_PREFIX}student_{self.rng.randrange(self.students)}'
+
+    def login(self):
+        return self.client.post(reverse('login'), {'username': self.pick_student(), 'password': SEED_PASSWORD})
+
+    def student_dashboard(self):
+        return self.client.get(reverse('counselling:student_dashboard'))
+
+    def fill_preferences(self):
+        return self.client.get(reverse('students:fill_preferences'))
+
+    def course_catalogue(self):
+        filters = self.rng.choice([{}, {'degree_type': 'B.Tech'}, {'q': 'college'}])
+        return self.client.get(reverse('students:course_catalogue'), filters)
+
+    def submit_preferences(self):
+        courses = self.rng.sample(self.course_ids, min(len(self.course_ids), self.rng.randint(3, 10)))
+        return self.client.post(reverse('students:fill_preferences'), {'courses': courses})
+
+    def make_payment(self):
+        return self.client.post(reverse('counselling:make_payment'), {
+            'payment_method': 'upi', 'idempotency_key': str(uuid.uuid4()),
+        })
+
+    def dashboard_api(self):
+        return self.admin_client.get(reverse('counselling:dashboard_api'))
+
+
+def _timed(action):
+    """(seconds, queries, ok) for one request"""
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        try:
+            response = action()
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+        seconds = time.perf_counter() - started
+    return seconds, len(queries), ok
+
+
+def _worker(user, mix, deadline, records):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    try:
+        while time.perf_counter() < deadline:
+            name = user.rng.choices(names, weights)[0]
+            records.append((name, *_timed(getattr(user, name))))
+    finally:
+        connection.close()
+
+
+def summarize(records, elapsed):
+    """Latency percentiles, throughput and query counts per action and in total"""
+    def summary(rows):
+        seconds = np.array([row[1] for row in rows])
+        queries = np.array([row[2] for row in rows])
+        result = {
+            'requests': len(rows),
+            'errors': sum(1 for row in rows if not row[3]),
+            'throughput': round(len(rows) / elapsed, 2) if elapsed else 0,
+            'mean_queries': round(float(queries.mean()), 1),
+            'max_queries': int(queries.max()),
+        }
+        for percentile, value in zip(PERCENTILES, np.percentile(seconds, PERCENTILES)):
+            result[f'p{percentile}_ms'] = round(float(value) * 1000, 1)
+        return result
+
+    by_action = {}
+    for row in records:
+        by_action.setdefault(row[0], []).append(row)
+    results = {name: summary(rows) for name, rows in sorted(by_action.items())}
+    if records:
+        results['total'] = summary(records)
+    return results
+
+
+def run_load(users, duration, mix, seed=42):
+    """Drive users threads through mix for duration seconds against the current database"""
+    students = User.objects.filter(username__startswith=f'{SEED_PREFIX}student_').count()
+    if not students:
+        raise RuntimeError("No seeded students to log in as.")
+    course_ids = list(Course.objects.filter(is_active=True).values_list('id', flat=True))
+    admin = User.objects.create(username=f'loadtest_admin_{uuid.uuid4().hex[:8]}', user_type='super_admin')
+    settings = CounsellingSettings.get_settings()
+    settings.preference_submission_open = True
+    settings.save()
+
+    virtual_users = [VirtualUser(i, students, course_ids, admin, seed) for i in range(users)]
+    records = [[] for _ in virtual_users]
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=_worker, args=(user, mix, started + duration, user_records))
+        for user, user_records in zip(virtual_users, records)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize([row for rows in records for row in rows], time.perf_counter() - started)
+
+
+def run_loadtest(students, users, duration, mix=None, seed=42, stdout=None):
+    """Seed a throwaway database with students and load it with users virtual users"""
+    directory = tempfile.TemporaryDirectory()
+    test_settings = connection.settings_dict['TEST']
+    old_name, old_test_name = connection.settings_dict['NAME'], test_settings.get('NAME')
+    if connection.vendor == 'sqlite':
+        # Threads share an in-memory database through one cache with table-level locks
+        test_settings['NAME'] = os.path.join(directory.name, 'loadtest.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    # Callback threads would outlive the throwaway database; payments are left processing
+    overrides = override_settings(MEDIA_ROOT=directory.name, PAYMENT_MOCK_CALLBACKS=False)
+    overrides.enable()
+    # Failed requests are counted in the results; keep their tracebacks out of the output
+    request_logger = logging.getLogger('django.request')
+    request_level = request_logger.level
+    request_logger.setLevel(logging.CRITICAL)
+    try:
+        started = time.perf_counter()
+        seed_data(SeedConfig(students=students, seed=seed, paid_fraction=0.5))
+        if stdout is not None:
+            stdout.write(f"Seeded {students} students in {time.perf_counter() - started:.1f}s")
+        return run_load(users, duration, mix or DEFAULT_MIX, seed=seed)
+    finally:
+        request_logger.setLevel(request_level)
+        overrides.disable()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = old_test_name
+        directory.cleanup()
+
+
+def compare_write_settings(students, users, duration, journal_modes, transaction_modes, busy_timeout=None,
+                           seed=42, stdout=None):
+    """
+    run_loadtest() with WRITE_MIX for every pair of SQLite journal mode and
+    transaction mode, optionally with a different busy timeout. Returns
+    {'<journal mode>/<transaction mode>': results}.
+    """
+    if connection.vendor != 'sqlite':
+        raise RuntimeError("Journal and transaction modes only apply to SQLite.")
+    # Every thread's connection is built from this same settings dict
+    options = connection.settings_dict['OPTIONS']
+    saved = {key: options.get(key) for key in ('timeout', 'transaction_mode')}
+    if busy_timeout is not None:
+        options['timeout'] = busy_timeout
+    try:
+        results = {}
+        for journal_mode in journal_modes:
+            for transaction_mode in transaction_modes:
+                name = f'{journal_mode}/{transaction_mode}'
+                if stdout is not None:
+                    stdout.write(name)
+                options['transaction_mode'] = transaction_mode
+                with override_settings(SQLITE_JOURNAL_MODE=journal_mode):
+                    results[name] = run_loadtest(students, users, duration, WRITE_MIX, seed=seed, stdout=stdout)
+        return results
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                options.pop(key, None)
+            else:
+                options[key] = value
@@ -0,0 +1,64 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from counselling.allocation import MATCHERS, AllocationError, PhaseTimer, peak_memory_mb, run_allocation_round
+
+
+class Command(BaseCommand):
+    help = "Run the next allocation round headless and report a timing breakdown"
+
+    def add_arguments(self, parser):
+        mode = parser.add_mutually_exclusive_group()
+        mode.add_argument('--dry-run', action='store_true', help="Compute the match without writing anything")
+        mode.add_argument('--output', metavar='FILE', help="Write the match to a CSV file instead of the database")
+        parser.add_argument(
+            '--method', choices=sorted(MATCHERS), help="Matching method (default: the counselling settings)",
+        )
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        commit = not (options['dry_run'] or options['output'])
+        timer = PhaseTimer()
+        try:
+            result = run_allocation_round(commit=commit, progress=timer, method=options['method'])
+        except AllocationError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            timer('output', 0, 0)
+            with open(options['output'], 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['student_id', 'course_id', 'preference_number', 'seat_category'])
+                writer.writerows(result.iter_matches(with_category=True))
+        timer.stop()
+
+        match_seconds = timer.durations.get('match', 0)
+        report = {
+            'round': result.round_number,
+            'mode': 'commit' if commit else ('output' if options['output'] else 'dry-run'),
+            'students_processed': result.students_processed,
+            'allocated': result.allocated_count,
+            'upgrades': result.upgrades,
+            'phases': {phase: round(seconds, 3) for phase, seconds in timer.durations.items()},
+            'total_seconds': round(timer.total, 3),
+            'students_per_second': round(result.students_processed / match_seconds, 1) if match_seconds else None,
+            'peak_memory_mb': round(peak_memory_mb(), 1) if peak_memory_mb() is not None else None,
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Round {report['round']} ({report['mode']}): {report['allocated']} students allocated, "
+            f"{report['upgrades']} upgrades, {report['students_processed']} processed"
+        ))
+        for phase, seconds in report['phases'].items():
+            self.stdout.write(f"  {phase:<8} {seconds:>9.3f}s")
+        self.stdout.write(f"  {'total':<8} {report['total_seconds']:>9.3f}s")
+        if report['students_per_second'] is not None:
+            self.stdout.write(f"  {report['students_per_second']:.0f} students/s")
+        if report['peak_memory_mb'] is not None:
+            self.stdout.write(f"  peak memory {report['peak_memory_mb']:.1f} MB")
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from counselling.jobs import claim_next_job, fail_stale_jobs, run_job
+from reports.generation import generate_round_reports
+
+
+class Command(BaseCommand):
+    help = "Run queued allocation jobs in the background (no broker needed)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Process queued jobs and exit")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds between queue checks")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Allocation worker started")
+        while True:
+            close_old_connections()
+            fail_stale_jobs()
+            job = claim_next_job()
+            if job is None:
+                self.generate_reports()
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f"Running allocation job #{job.pk}")
+            if run_job(job):
+                self.stdout.write(self.style.SUCCESS(f"Allocation job #{job.pk} finished"))
+            else:
+                self.stdout.write(self.style.ERROR(f"Allocation job #{job.pk} failed"))
+
+    def generate_reports(self):
+        """Build the reports of a round that finished since the last check, here or inline"""
+        try:
+            reports = generate_round_reports()
+        except Exception as e:
+            # A failed report must not stop the worker; the next idle check tries again
+            self.stderr.write(self.style.ERROR(f"Generating reports failed: {e}"))
+            return
+        if reports:
+            self.stdout.write(self.style.SUCCESS(f"Generated {len(reports)} report(s)"))
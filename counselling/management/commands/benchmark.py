@@ -0,0 +1,57 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from counselling.benchmarks import compare, environment, run_size
+
+
+class Command(BaseCommand):
+    help = "Time allocation, statistics, exports and dashboards on seeded data and save the results as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='1000,10000,100000,1000000',
+            help="Comma-separated student counts (default: 1000,10000,100000,1000000)",
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help="JSON file to write (default: benchmarks/<timestamp>.json, ignored by git)")
+        parser.add_argument('--compare', metavar='FILE', help="Earlier results to compare against")
+        parser.add_argument('--threshold', type=float, default=1.2, help="Slowdown ratio reported as a regression")
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size]
+        except ValueError:
+            raise CommandError("--sizes must be a comma-separated list of integers")
+
+        results = environment()
+        results['sizes'] = {}
+        for students in sizes:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{students} students"))
+            results['sizes'][str(students)] = run_size(students, seed=options['seed'], stdout=self.stdout)
+
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks', timezone.now().strftime('%Y%m%d-%H%M%S') + '.json'
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {output}"))
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                previous = json.load(f)
+            regressions = 0
+            for size, name, old, new, ratio, regressed in compare(results, previous, options['threshold']):
+                line = f"  {size:>8} {name:<34} {old:>9.3f}s -> {new:>9.3f}s  x{ratio:.2f}"
+                if regressed:
+                    regressions += 1
+                    self.stdout.write(self.style.ERROR(line + "  REGRESSION"))
+                else:
+                    self.stdout.write(line)
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{regressions} benchmark regressions against {options['compare']}")
@@ -0,0 +1,81 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from counselling.benchmarks import environment
+from counselling.loadtest import PERCENTILES, WRITE_MIX, compare_write_settings
+from counselling_system.sqlite3.base import DatabaseWrapper
+
+
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+
+
+class Command(BaseCommand):
+    help = "Compare concurrent write throughput on SQLite across journal and transaction modes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000, help="Students to seed (default 1000)")
+        parser.add_argument('--users', type=int, default=10, help="Concurrent writers (default 10)")
+        parser.add_argument('--duration', type=float, default=15, help="Seconds per journal mode (default 15)")
+        parser.add_argument(
+            '--journal-modes', default='DELETE,WAL', help="Comma-separated journal modes to compare (default DELETE,WAL)",
+        )
+        parser.add_argument(
+            '--transaction-modes', default='DEFERRED,IMMEDIATE',
+            help="Comma-separated transaction modes to compare (default DEFERRED,IMMEDIATE)",
+        )
+        parser.add_argument(
+            '--busy-timeout', type=float,
+            help=f"Seconds a writer waits for the lock (default: SQLITE_BUSY_TIMEOUT, {settings.SQLITE_BUSY_TIMEOUT:g})",
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help="JSON file to write (default: benchmarks/writes-<timestamp>.json, ignored by git)")
+
+    def modes(self, value, allowed, kind):
+        modes = [mode.strip().upper() for mode in value.split(',') if mode.strip()]
+        unknown = set(modes) - set(allowed)
+        if unknown or not modes:
+            raise CommandError(f"Unknown {kind} modes: {', '.join(sorted(unknown)) or value!r}")
+        return modes
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("benchmark_writes compares SQLite settings; DATABASE_URL is not SQLite.")
+        journal_modes = self.modes(options['journal_modes'], JOURNAL_MODES, 'journal')
+        transaction_modes = self.modes(options['transaction_modes'], DatabaseWrapper.transaction_modes, 'transaction')
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{options['users']} writers for {options['duration']:g}s per setting on {options['students']} students"
+        ))
+        results = compare_write_settings(
+            options['students'], options['users'], options['duration'], journal_modes, transaction_modes,
+            busy_timeout=options['busy_timeout'], seed=options['seed'], stdout=self.stdout,
+        )
+
+        columns = ''.join(f"{f'p{p}':>9}" for p in PERCENTILES)
+        self.stdout.write(f"  {'modes':<20}{'writes':>8}{'errors':>8}{'writes/s':>10}{columns}")
+        for mode, actions in results.items():
+            row = actions.get('total')
+            if row is None:
+                self.stdout.write(self.style.ERROR(f"  {mode:<20}no requests completed"))
+                continue
+            latencies = ''.join(f"{row[f'p{p}_ms']:>7.0f}ms" for p in PERCENTILES)
+            line = f"  {mode:<20}{row['requests']:>8}{row['errors']:>8}{row['throughput']:>10.1f}{latencies}"
+            self.stdout.write(self.style.ERROR(line) if row['errors'] else line)
+
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks', timezone.now().strftime('writes-%Y%m%d-%H%M%S') + '.json'
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump({
+                **environment(),
+                'options': {key: options[key] for key in ('students', 'users', 'duration', 'busy_timeout')},
+                'mix': WRITE_MIX,
+                'settings': results,
+            }, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {output}"))
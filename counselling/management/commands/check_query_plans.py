@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from counselling.queryplans import run_plan_checks
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot queries on seeded data and fail if any falls back to a full table scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=20000, help="Students to seed (default 20000)")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--show-plans', action='store_true', help="Print the plan of every statement")
+
+    def handle(self, *args, **options):
+        try:
+            results = run_plan_checks(options['students'], seed=options['seed'], stdout=self.stdout)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        failed = []
+        for name, result in results.items():
+            self.stdout.write(
+                f"  {name:<24}{len(result['statements']):>3} statements  "
+                + (self.style.SUCCESS('ok') if result['ok'] else self.style.ERROR('FAILED'))
+            )
+            for statement in result['statements']:
+                problems = [f"full scan of {table}" for table in statement['full_scans']] + statement['sorts']
+                if options['show_plans'] or problems:
+                    self.stdout.write(f"      {statement['sql'][:200]}")
+                    for line in statement['plan']:
+                        self.stdout.write(f"        {line}")
+                for problem in problems:
+                    self.stdout.write(self.style.ERROR(f"      {problem}"))
+            if not result['ok']:
+                failed.append(name)
+
+        if failed:
+            raise CommandError(f"Query plans regressed: {', '.join(failed)}")
+        self.stdout.write(self.style.SUCCESS("Every hot query uses an index"))
@@ -0,0 +1,59 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from counselling.benchmarks import environment
+from counselling.loadtest import DEFAULT_MIX, PERCENTILES, run_loadtest
+
+
+class Command(BaseCommand):
+    help = "Simulate deadline-day traffic on seeded data and report latency, throughput and queries per view"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000, help="Students to seed (default 1000)")
+        parser.add_argument('--users', type=int, default=10, help="Concurrent virtual users (default 10)")
+        parser.add_argument('--duration', type=float, default=30, help="Seconds to run (default 30)")
+        parser.add_argument(
+            '--mix', help="Comma-separated action=weight pairs (default: "
+            + ','.join(f'{name}={weight}' for name, weight in DEFAULT_MIX.items()) + ")",
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help="JSON file to write (default: benchmarks/loadtest-<timestamp>.json, ignored by git)")
+
+    def handle(self, *args, **options):
+        mix = DEFAULT_MIX
+        if options['mix']:
+            try:
+                mix = {name: float(weight) for name, weight in (pair.split('=') for pair in options['mix'].split(','))}
+            except ValueError:
+                raise CommandError("--mix must look like login=1,student_dashboard=3")
+            unknown = set(mix) - set(DEFAULT_MIX)
+            if unknown:
+                raise CommandError(f"Unknown actions: {', '.join(sorted(unknown))}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{options['users']} users for {options['duration']:g}s on {options['students']} students"
+        ))
+        results = run_loadtest(
+            options['students'], options['users'], options['duration'], mix, seed=options['seed'], stdout=self.stdout,
+        )
+
+        columns = ''.join(f"{f'p{p}':>9}" for p in PERCENTILES)
+        self.stdout.write(f"  {'action':<20}{'requests':>9}{'errors':>8}{'req/s':>8}{columns}{'queries':>9}")
+        for name, row in results.items():
+            latencies = ''.join(f"{row[f'p{p}_ms']:>7.0f}ms" for p in PERCENTILES)
+            line = (f"  {name:<20}{row['requests']:>9}{row['errors']:>8}{row['throughput']:>8.1f}"
+                    f"{latencies}{row['mean_queries']:>9.1f}")
+            self.stdout.write(self.style.ERROR(line) if row['errors'] else line)
+
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks', timezone.now().strftime('loadtest-%Y%m%d-%H%M%S') + '.json'
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump({**environment(), 'options': {key: options[key] for key in ('students', 'users', 'duration')},
+                       'mix': mix, 'actions': results}, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {output}"))
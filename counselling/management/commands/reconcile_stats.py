@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from counselling.models import AllocationStatistics
+from counselling.seats import recount_seats
+from counselling.stats import COUNTERS
+
+
+class Command(BaseCommand):
+    help = "Recount the dashboard statistics and course seat counters, reporting any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, metavar='SECONDS', help="Keep reconciling at this interval")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            self.reconcile()
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+
+    def reconcile(self):
+        before = AllocationStatistics.objects.filter(pk=1).values(*COUNTERS).first()
+        stats = AllocationStatistics.calculate_stats()
+        drift = {
+            field: getattr(stats, field) - before[field]
+            for field in COUNTERS
+            if before is not None and getattr(stats, field) != before[field]
+        }
+        if drift:
+            changes = ', '.join(f"{field} {delta:+d}" for field, delta in drift.items())
+            self.stdout.write(self.style.WARNING(f"Corrected drift: {changes}"))
+        else:
+            self.stdout.write("Statistics reconciled, no drift")
+
+        corrected = recount_seats()
+        if corrected:
+            self.stdout.write(self.style.WARNING(f"Corrected seat counters of {corrected} courses"))
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from counselling.seeding import SEED_PASSWORD, SeedConfig, SeedDataExists, clear_seed_data, seed_data
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate synthetic students, colleges, courses, payments and preferences"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--colleges', type=int, help="Default: one per 2000 students, at least 5")
+        parser.add_argument('--courses-per-college', type=int, default=10)
+        parser.add_argument('--min-preferences', type=int, default=3)
+        parser.add_argument('--max-preferences', type=int, default=10)
+        parser.add_argument('--seat-ratio', type=float, default=0.6, help="Total seats as a share of students")
+        parser.add_argument('--paid-fraction', type=float, default=0.9)
+        parser.add_argument('--skew', type=float, default=1.1, help="Zipf exponent of course popularity")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--clear', action='store_true', help="Delete earlier seed data first")
+        parser.add_argument('--clear-only', action='store_true', help="Delete seed data and exit")
+
+    def handle(self, *args, **options):
+        if options['clear'] or options['clear_only']:
+            deleted = clear_seed_data()
+            self.stdout.write(f"Deleted {deleted} seeded rows")
+            if options['clear_only']:
+                return
+
+        config = SeedConfig(
+            students=options['students'],
+            colleges=options['colleges'],
+            courses_per_college=options['courses_per_college'],
+            min_preferences=options['min_preferences'],
+            max_preferences=options['max_preferences'],
+            seat_ratio=options['seat_ratio'],
+            paid_fraction=options['paid_fraction'],
+            skew=options['skew'],
+            seed=options['seed'],
+        )
+        started = time.perf_counter()
+        try:
+            seed_data(config, stdout=self.stdout)
+        except SeedDataExists as e:
+            raise CommandError(f"{e} Use --clear.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {config.students} students, {config.colleges} colleges and {config.courses} courses "
+            f"in {time.perf_counter() - started:.1f}s (password: {SEED_PASSWORD})"
+        ))
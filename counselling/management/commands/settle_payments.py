@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from counselling.payments import SETTLE_BATCH_SIZE, settle_payments
+
+
+class Command(BaseCommand):
+    help = "Settle payments whose gateway callback never arrived, in bulk"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=float, default=60, metavar='SECONDS',
+                            help="Only settle payments unchanged for this long (default 60)")
+        parser.add_argument('--batch-size', type=int, default=SETTLE_BATCH_SIZE,
+                            help="Payments looked up with the gateway per round trip")
+        parser.add_argument('--every', type=float, metavar='SECONDS', help="Keep settling at this interval")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            started = time.perf_counter()
+            settled = settle_payments(older_than=options['older_than'], batch_size=options['batch_size'])
+            self.stdout.write(
+                f"Settled {settled['completed']} completed, {settled['failed']} failed and "
+                f"{settled['abandoned']} abandoned payments in {time.perf_counter() - started:.2f}s"
+            )
+            if not options['every']:
+                break
+            time.sleep(options['every'])
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counselling', '0002_allocation_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='allocation',
+            name='seat_category',
+            field=models.CharField(default='GENERAL', max_length=20),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-18 08:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counselling', '0003_allocation_seat_category'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CounsellingRound',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(unique=True)),
+                ('started_at', models.DateTimeField()),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('students_processed', models.IntegerField(default=0)),
+                ('new_allocations', models.IntegerField(default=0)),
+                ('upgrades', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['number'],
+            },
+        ),
+        migrations.AddField(
+            model_name='allocation',
+            name='round_number',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='counsellingsettings',
+            name='total_rounds',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
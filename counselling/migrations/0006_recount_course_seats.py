@@ -0,0 +1,25 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def recount_course_seats(apps, schema_editor):
+    """Course.seats_filled becomes a live counter; start it from the current allocations"""
+    Allocation = apps.get_model('counselling', 'Allocation')
+    Course = apps.get_model('colleges', 'Course')
+    held = Allocation.objects.filter(
+        course=OuterRef('pk'), status__in=['ALLOCATED', 'CONFIRMED']
+    ).order_by().values('course').annotate(held=Count('id')).values('held')
+    Course.objects.update(seats_filled=Coalesce(Subquery(held), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('colleges', '0003_coursequota'),
+        ('counselling', '0005_allocationjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(recount_course_seats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counselling', '0006_recount_course_seats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='gateway_reference',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+    ]
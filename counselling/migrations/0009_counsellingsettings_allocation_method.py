@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counselling', '0008_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='counsellingsettings',
+            name='allocation_method',
+            field=models.CharField(choices=[('serial_dictatorship', 'Serial dictatorship (overall rank)'), ('deferred_acceptance', 'Deferred acceptance (course merit orders)')], default='serial_dictatorship', max_length=30),
+        ),
+    ]
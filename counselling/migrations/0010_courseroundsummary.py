@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-18 09:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('colleges', '0004_coursepriority'),
+        ('counselling', '0009_counsellingsettings_allocation_method'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseRoundSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=20)),
+                ('seats', models.IntegerField(default=0)),
+                ('opening_rank', models.IntegerField(blank=True, null=True)),
+                ('closing_rank', models.IntegerField(blank=True, null=True)),
+                ('filled', models.IntegerField(default=0)),
+                ('vacant', models.IntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='round_summaries', to='colleges.course')),
+                ('round', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_summaries', to='counselling.counsellinground')),
+            ],
+            options={
+                'ordering': ['round_id', 'course_id', 'category'],
+                'unique_together': {('course', 'round', 'category')},
+            },
+        ),
+    ]
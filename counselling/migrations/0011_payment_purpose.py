@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 09:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_studentprofile_student_paid_rank_idx'),
+        ('counselling', '0010_courseroundsummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='purpose',
+            field=models.CharField(choices=[('fee', 'Counselling Fee'), ('token', 'Seat Token')], default='fee', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='accounts.studentprofile'),
+        ),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(fields=('student', 'purpose'), name='payment_student_purpose_unique'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-18 09:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counselling', '0011_payment_purpose'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='allocationjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='allocationjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['QUEUED', 'RUNNING'])), fields=('status',), name='allocationjob_one_per_active_status'),
+        ),
+    ]
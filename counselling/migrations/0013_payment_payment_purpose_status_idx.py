@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 09:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counselling', '0012_allocationjob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['purpose', 'status', 'student'], name='payment_purpose_status_idx'),
+        ),
+    ]
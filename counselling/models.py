@@ -1,18 +1,38 @@
 from django.db import models
+from django.conf import settings as django_settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+import copy
 import uuid
 
+from . import db
+from .versioning import Memo
+
 User = get_user_model()
 
+STATS_CACHE_KEY = 'counselling:allocation_statistics'
+
+# Stamp replaced whenever CounsellingSettings is saved
+SETTINGS_VERSION_KEY = 'counselling:settings_version'
+
 class CounsellingSettings(models.Model):
     """Simple counselling system settings"""
     
+    ALLOCATION_METHOD_CHOICES = [
+        ('serial_dictatorship', 'Serial dictatorship (overall rank)'),
+        ('deferred_acceptance', 'Deferred acceptance (course merit orders)'),
+    ]
+    
     registration_open = models.BooleanField(default=True)
     preference_submission_open = models.BooleanField(default=True)
     payment_required = models.BooleanField(default=True)
     allocation_completed = models.BooleanField(default=False)
+    total_rounds = models.PositiveIntegerField(default=1)  # Allocation is completed after this many rounds
+    allocation_method = models.CharField(
+        max_length=30, choices=ALLOCATION_METHOD_CHOICES, default='serial_dictatorship'
+    )
     counselling_fee = models.DecimalField(max_digits=10, decimal_places=2, default=500.00)
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
@@ -24,15 +44,46 @@ class CounsellingSettings(models.Model):
     def __str__(self):
         return "Counselling System Settings"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.settings_changed()
+    
+    @classmethod
+    def settings_changed(cls):
+        """Drop the memoised settings here at once and in other processes when the change commits"""
+        _settings_memo.changed()
+    
     @classmethod
     def get_settings(cls):
-        """Get or create settings instance"""
-        settings, created = cls.objects.get_or_create(pk=1)
-        return settings
+        """
+        Get or create settings instance. The row is memoised in this process
+        (see counselling.versioning), so steady-state reads cost a cache
+        lookup and no query; its updated_at is the stamp read back from the
+        database. Only rows read outside a transaction are memoised. Callers
+        get their own copy.
+        """
+        settings, version = _settings_memo.get()
+        return copy.copy(settings)
+
+
+# The settings row as last read by this process
+_settings_memo = Memo(
+    SETTINGS_VERSION_KEY,
+    lambda: CounsellingSettings.objects.get_or_create(pk=1)[0],
+    lambda: CounsellingSettings.objects.filter(pk=1).values_list('updated_at', flat=True).first(),
+    memoise_in_transactions=False,
+)
 
 
 class Payment(models.Model):
-    """Simplified payment system - mock payment gateway"""
+    """Counselling fee or seat token payment; processed through counselling.payments"""
+    
+    FEE = 'fee'
+    TOKEN = 'token'
+    PURPOSE_CHOICES = [
+        (FEE, 'Counselling Fee'),
+        (TOKEN, 'Seat Token'),
+    ]
     
     PAYMENT_STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -50,7 +101,8 @@ class Payment(models.Model):
         ('wallet', 'Digital Wallet'),
     ]
     
-    student = models.OneToOneField('accounts.StudentProfile', on_delete=models.CASCADE, related_name='payment')
+    student = models.ForeignKey('accounts.StudentProfile', on_delete=models.CASCADE, related_name='payments')
+    purpose = models.CharField(max_length=10, choices=PURPOSE_CHOICES, default=FEE)
     transaction_id = models.CharField(max_length=100, unique=True, default=uuid.uuid4)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES)
@@ -59,39 +111,30 @@ class Payment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
-    # Mock payment gateway fields
-    gateway_reference = models.CharField(max_length=100, blank=True)
+    # Key of the request that started the current attempt, so a repeated request is not charged twice
+    idempotency_key = models.CharField(max_length=64, blank=True)
+    
+    # Payment gateway fields
+    gateway_reference = models.CharField(max_length=100, blank=True, db_index=True)
     failure_reason = models.TextField(blank=True)
     
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            # One fee and one token per student; a failed attempt is retried on the same row
+            models.UniqueConstraint(fields=['student', 'purpose'], name='payment_student_purpose_unique'),
+        ]
+        indexes = [
+            # Paid counts and recent payments on the dashboards
+            models.Index(fields=['status', 'payment_date'], name='payment_status_date_idx'),
+            # Stale payments collected by settle_payments
+            models.Index(fields=['status', 'updated_at'], name='payment_status_updated_idx'),
+            # Paid student counts by purpose, answered from the index alone
+            models.Index(fields=['purpose', 'status', 'student'], name='payment_purpose_status_idx'),
+        ]
     
     def __str__(self):
         return f"Payment {self.transaction_id} - {self.student.user.username} - {self.status}"
-    
-    def process_payment(self):
-        """Mock payment processing - simulates payment gateway"""
-        import random
-        
-        if self.status != 'pending':
-            return False
-            
-        self.status = 'processing'
-        self.save()
-        
-        # Simulate payment processing (90% success rate)
-        success = random.random() < 0.9
-        
-        if success:
-            self.status = 'completed'
-            self.payment_date = timezone.now()
-            self.gateway_reference = f"GW{random.randint(100000, 999999)}"
-        else:
-            self.status = 'failed'
-            self.failure_reason = "Insufficient funds or card declined"
-            
-        self.save()
-        return success
 
 
 class Allocation(models.Model):
@@ -107,15 +150,160 @@ class Allocation(models.Model):
     course = models.ForeignKey('colleges.Course', on_delete=models.CASCADE, related_name='allocations')
     preference_number = models.IntegerField(default=1)  # Which preference got allocated (1st, 2nd, etc.)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='ALLOCATED')
+    seat_category = models.CharField(max_length=20, default='GENERAL')  # Quota the seat was taken from
+    round_number = models.PositiveIntegerField(default=1)  # Round in which the current seat was allocated
     allocated_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['student__rank']
+        indexes = [
+            # Seats held per course and quota bucket, counted without reading the rows
+            models.Index(fields=['course', 'status', 'seat_category'], name='allocation_course_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.user.username} -> {self.course.course_name} ({self.course.college.college_name})"
 
 
+class CounsellingRound(models.Model):
+    """One allocation round and what it changed"""
+    
+    number = models.PositiveIntegerField(unique=True)
+    started_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True, blank=True)
+    students_processed = models.IntegerField(default=0)
+    new_allocations = models.IntegerField(default=0)
+    upgrades = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['number']
+    
+    def __str__(self):
+        return f"Round {self.number}"
+    
+    @classmethod
+    def latest(cls):
+        """Most recent completed round, or None before the first round"""
+        return cls.objects.order_by('-number').first()
+
+
+class CourseRoundSummary(models.Model):
+    """Cut-off ranks and fill of a course after a round, per seat category"""
+    
+    # Category of the row covering every seat of the course
+    ALL = 'ALL'
+    
+    round = models.ForeignKey(CounsellingRound, on_delete=models.CASCADE, related_name='course_summaries')
+    course = models.ForeignKey('colleges.Course', on_delete=models.CASCADE, related_name='round_summaries')
+    category = models.CharField(max_length=20)  # Seat category, or ALL
+    seats = models.IntegerField(default=0)
+    opening_rank = models.IntegerField(null=True, blank=True)  # Best rank holding a seat
+    closing_rank = models.IntegerField(null=True, blank=True)  # Last rank holding a seat
+    filled = models.IntegerField(default=0)
+    vacant = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['round_id', 'course_id', 'category']
+        # Also the index behind the per-course lookup
+        unique_together = ['course', 'round', 'category']
+    
+    def __str__(self):
+        return f"{self.course_id} {self.category} - Round {self.round_id}"
+    
+    @property
+    def fill_percentage(self):
+        return round(self.filled / self.seats * 100, 2) if self.seats else 0
+    
+    @classmethod
+    def materialise(cls, counselling_round):
+        """Replace the round's rows from the seats held now, in one aggregate query; returns the rows"""
+        import numpy as np
+        from .allocation.seat_matrix import CATEGORIES, SeatMatrix
+        from .seats import HELD_STATUSES
+        
+        seat_matrix = SeatMatrix.load()
+        held = Allocation.objects.filter(status__in=HELD_STATUSES).values('course_id', 'seat_category').annotate(
+            opening=models.Min('student__rank'), closing=models.Max('student__rank'), filled=models.Count('id'),
+        ).order_by().values_list('course_id', 'seat_category', 'opening', 'closing', 'filled')
+        held = {
+            (course_id, category): (opening, closing, filled)
+            for course_id, category, opening, closing, filled in held
+        }
+        buckets = [
+            [held.get((course_id, category), (None, None, 0)) for category in CATEGORIES]
+            for course_id in seat_matrix.course_ids.tolist()
+        ]
+        vacancies = seat_matrix.vacancies(
+            np.array([[filled for opening, closing, filled in row] for row in buckets], dtype=np.int64)
+            .reshape(seat_matrix.seats.shape)
+        ).tolist()
+        
+        rows = []
+        for c, course_id in enumerate(seat_matrix.course_ids.tolist()):
+            seats = seat_matrix.seats[c].tolist()
+            vacant = vacancies[c]
+            for b, (opening, closing, filled) in enumerate(buckets[c]):
+                if seats[b] or filled:
+                    rows.append(cls(
+                        round=counselling_round, course_id=course_id, category=CATEGORIES[b], seats=seats[b],
+                        opening_rank=opening, closing_rank=closing, filled=filled, vacant=vacant[b],
+                    ))
+            ranks = [rank for opening, closing, filled in buckets[c] for rank in (opening, closing) if rank is not None]
+            filled = sum(bucket[2] for bucket in buckets[c])
+            rows.append(cls(
+                round=counselling_round, course_id=course_id, category=cls.ALL, seats=sum(seats),
+                opening_rank=min(ranks, default=None), closing_rank=max(ranks, default=None),
+                filled=filled, vacant=max(sum(seats) - filled, 0),
+            ))
+        
+        cls.objects.filter(round=counselling_round).delete()
+        cls.objects.bulk_create(rows, batch_size=2000)
+        return rows
+
+
+class AllocationJob(models.Model):
+    """Allocation round queued for the background worker"""
+    
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    phase = models.CharField(max_length=20, blank=True)  # load, match, write
+    progress = models.FloatField(default=0)  # Percentage across all phases
+    students_processed = models.IntegerField(default=0)
+    throughput = models.FloatField(default=0)  # Students matched per second
+    round_number = models.PositiveIntegerField(null=True, blank=True)
+    allocated_count = models.IntegerField(default=0)
+    upgrades = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # Last progress write from the worker
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # Two requests queueing at once cannot both pass the active-job check in enqueue_allocation()
+            models.UniqueConstraint(
+                fields=['status'], condition=models.Q(status__in=['QUEUED', 'RUNNING']),
+                name='allocationjob_one_per_active_status',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Allocation job #{self.pk} - {self.status}"
+    
+    @property
+    def is_active(self):
+        return self.status in ('QUEUED', 'RUNNING')
+
+
 class AllocationStatistics(models.Model):
     """Simple statistics for admin dashboard"""
     
@@ -136,25 +324,42 @@ class AllocationStatistics(models.Model):
     def __str__(self):
         return f"Statistics - {self.students_allocated}/{self.total_students} allocated"
     
+    @classmethod
+    def get_cached(cls):
+        """Current statistics without recounting; served from the cache for a few seconds"""
+        stats = cache.get(STATS_CACHE_KEY)
+        if stats is None:
+            stats = cls.objects.filter(pk=1).first()
+            if stats is None:
+                return cls.calculate_stats()
+            cache.set(STATS_CACHE_KEY, stats, django_settings.ALLOCATION_STATS_CACHE_SECONDS)
+        return stats
+    
     @classmethod
     def calculate_stats(cls):
-        """Calculate and update statistics"""
+        """Recount every statistic from scratch and update the cached copy"""
         from accounts.models import StudentProfile
         from colleges.models import Course
         from students.models import StudentPreference
+        from .stats import discard_pending
         
+        # The recount sees this transaction's changes, so deltas recorded so far are already included
+        discard_pending()
         stats, created = cls.objects.get_or_create(pk=1)
         
         stats.total_students = StudentProfile.objects.count()
-        stats.students_paid = Payment.objects.filter(status='completed').count()
+        stats.students_paid = Payment.objects.filter(purpose=Payment.FEE, status='completed').count()
         stats.students_with_preferences = StudentPreference.objects.values('student').distinct().count()
         stats.students_allocated = Allocation.objects.count()
         stats.total_seats = Course.objects.aggregate(total=models.Sum('total_seats'))['total'] or 0
         stats.seats_filled = Allocation.objects.count()
         
         settings = CounsellingSettings.get_settings()
-        if settings.allocation_completed:
+        if not settings.allocation_completed:
+            stats.allocation_date = None
+        elif stats.allocation_date is None:
             stats.allocation_date = timezone.now()
             
         stats.save()
+        cache.set(STATS_CACHE_KEY, stats, django_settings.ALLOCATION_STATS_CACHE_SECONDS)
         return stats
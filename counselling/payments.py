@@ -0,0 +1,252 @@
+"""
+Payment processing.
+
+A student makes two payments: the counselling fee that makes them eligible
+for allocation, and the seat token that confirms an allocated seat; each
+has its own Payment row. A payment is started with an idempotency key, so a resubmitted form or a
+retried request finds the payment it already started instead of charging
+again. The charge goes to the gateway named by PAYMENT_GATEWAY, which
+answers at once with a reference; the outcome arrives later through
+complete_payment(), called from the gateway's callback. Payments whose
+callback never came are collected in bulk by `manage.py settle_payments`.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from accounts.models import StudentProfile
+from . import db, stats
+from .models import Payment
+
+
+logger = logging.getLogger(__name__)
+
+OUTCOMES = ('completed', 'failed')
+
+# Each batch's references are looked up in one IN (...) list
+SETTLE_BATCH_SIZE = db.IN_LOOKUP_LIMIT
+
+ABANDONED_REASON = "The payment never reached the gateway."
+
+
+class PaymentError(Exception):
+    """Raised for a payment request or callback that cannot be processed"""
+
+
+class PaymentGateway:
+    """Interface a payment gateway implements"""
+
+    def charge(self, payment):
+        """Start charging payment and return the gateway's reference; the outcome is reported later"""
+        raise NotImplementedError
+
+    def fetch_outcomes(self, references):
+        """{reference: (status, failure_reason)} for the given charges that have finished"""
+        raise NotImplementedError
+
+    def parse_callback(self, request):
+        """(reference, status, failure_reason) from a callback request, or raise PaymentError"""
+        raise NotImplementedError
+
+
+class MockGateway(PaymentGateway):
+    """
+    Local stand-in for a real gateway. Each charge finishes latency seconds
+    after it was made and fails for a failure_rate share of references. With
+    callbacks on, the outcome is reported from a background thread the way a
+    gateway's webhook would; callbacks to the HTTP endpoint are signed with
+    an HMAC of the body.
+    """
+
+    def __init__(self, latency=None, failure_rate=None, callbacks=None):
+        self.latency = settings.PAYMENT_MOCK_LATENCY if latency is None else latency
+        self.failure_rate = settings.PAYMENT_MOCK_FAILURE_RATE if failure_rate is None else failure_rate
+        self.callbacks = settings.PAYMENT_MOCK_CALLBACKS if callbacks is None else callbacks
+
+    def charge(self, payment):
+        # The charge time is part of the reference so outcomes can be looked up without any state
+        reference = f"MOCK-{int(time.time() * 1000)}-{uuid.uuid4().hex[:12].upper()}"
+        if self.callbacks:
+            timer = threading.Timer(self.latency, self._deliver, args=[reference])
+            timer.daemon = True
+            transaction.on_commit(timer.start)
+        return reference
+
+    def outcome(self, reference):
+        if int(reference.rsplit('-', 1)[1], 16) % 1000 < self.failure_rate * 1000:
+            return 'failed', "Insufficient funds or card declined"
+        return 'completed', ''
+
+    def fetch_outcomes(self, references):
+        finished_before = (time.time() - self.latency) * 1000
+        return {
+            reference: self.outcome(reference)
+            for reference in references
+            if reference.startswith('MOCK-') and int(reference.split('-')[1]) <= finished_before
+        }
+
+    def parse_callback(self, request):
+        expected = sign_callback(request.body)
+        if not hmac.compare_digest(expected, request.headers.get('X-Mock-Signature', '')):
+            raise PaymentError("Bad callback signature.")
+        try:
+            data = json.loads(request.body)
+            return data['reference'], data['status'], data.get('failure_reason', '')
+        except (ValueError, KeyError, TypeError):
+            raise PaymentError("Malformed callback body.")
+
+    def _deliver(self, reference):
+        try:
+            complete_payment(reference, *self.outcome(reference))
+        except Exception:
+            logger.exception("Mock gateway callback for %s failed", reference)
+        finally:
+            connections.close_all()
+
+
+def sign_callback(body):
+    """HMAC the mock gateway sends with a callback body"""
+    return hmac.new(settings.PAYMENT_CALLBACK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+def get_gateway():
+    return import_string(settings.PAYMENT_GATEWAY)()
+
+
+def mark_tokens_paid(payments):
+    """Set token_paid for the students whose seat token is among the completed payments in the queryset"""
+    return StudentProfile.objects.filter(
+        pk__in=payments.filter(purpose=Payment.TOKEN, status='completed').values('student_id'),
+    ).update(token_paid=True)
+
+
+def request_idempotency_key(request):
+    """
+    Key of the payment form a request submits. The form carries a key per
+    rendering, so submitting it twice charges once; a request without one
+    gets a fresh key.
+    """
+    return request.POST.get('idempotency_key') or str(uuid.uuid4())
+
+
+def start_payment(student, amount, payment_method, idempotency_key, gateway=None, purpose=Payment.FEE):
+    """
+    Start a payment of the given purpose for student, or return the one
+    idempotency_key already started. A payment that is pending, in flight or completed is returned as
+    it is, whichever request started it; a failed one, including one settle_payments abandoned, is
+    tried again.
+    """
+    with transaction.atomic():
+        payment = Payment.objects.select_for_update().filter(student=student, purpose=purpose).first()
+        if payment is not None and (
+            (idempotency_key and payment.idempotency_key == idempotency_key) or payment.status != 'failed'
+        ):
+            return payment
+
+        if payment is None:
+            payment = Payment(student=student, purpose=purpose)
+        else:
+            payment.transaction_id = str(uuid.uuid4())
+        payment.idempotency_key = idempotency_key
+        payment.amount = amount
+        payment.payment_method = payment_method
+        payment.status = 'pending'
+        payment.gateway_reference = ''
+        payment.failure_reason = ''
+        payment.save()
+
+    # Charged after the row lock is released; callbacks are only sent once the reference is stored
+    try:
+        with transaction.atomic():
+            payment.gateway_reference = (gateway or get_gateway()).charge(payment)
+            payment.status = 'processing'
+            payment.save(update_fields=['status', 'gateway_reference', 'updated_at'])
+    except Exception as e:
+        logger.exception("Charging payment %s failed", payment.transaction_id)
+        payment.status = 'failed'
+        payment.gateway_reference = ''
+        payment.failure_reason = f"Payment gateway error: {e}"
+        payment.save(update_fields=['status', 'gateway_reference', 'failure_reason', 'updated_at'])
+    return payment
+
+
+def complete_payment(reference, status, failure_reason=''):
+    """
+    Record a gateway's outcome for the charge with this reference. Repeated
+    callbacks are harmless: only a processing payment is changed. Returns
+    the payment, or None for an unknown reference.
+    """
+    if status not in OUTCOMES:
+        raise PaymentError(f"Unknown payment status '{status}'.")
+
+    with transaction.atomic():
+        payment = Payment.objects.select_for_update().filter(gateway_reference=reference).first()
+        if payment is None or payment.status != 'processing':
+            return payment
+        payment.status = status
+        if status == 'completed':
+            payment.payment_date = timezone.now()
+        else:
+            payment.failure_reason = failure_reason
+        payment.save()
+        mark_tokens_paid(Payment.objects.filter(pk=payment.pk))
+    return payment
+
+
+def settle_payments(gateway=None, older_than=60, batch_size=SETTLE_BATCH_SIZE):
+    """
+    Settle payments left processing for older_than seconds with the outcomes
+    the gateway reports, and fail pending ones that never reached it. Each
+    batch is written with a few bulk UPDATEs. Returns the counts settled.
+    """
+    gateway = gateway or get_gateway()
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=older_than)
+    settled = {'completed': 0, 'failed': 0, 'abandoned': 0}
+
+    processing = Payment.objects.filter(status='processing', updated_at__lte=cutoff).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(processing.filter(pk__gt=last_pk).values_list('pk', 'gateway_reference')[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+        outcomes = gateway.fetch_outcomes([reference for pk, reference in batch])
+        completed = [reference for reference, (status, reason) in outcomes.items() if status == 'completed']
+        failures = {}
+        for reference, (status, reason) in outcomes.items():
+            if status == 'failed':
+                failures.setdefault(reason, []).append(reference)
+
+        with transaction.atomic():
+            if completed:
+                finishing = Payment.objects.filter(gateway_reference__in=completed, status='processing')
+                counts = {
+                    purpose: finishing.filter(purpose=purpose).update(
+                        status='completed', payment_date=now, updated_at=now,
+                    )
+                    for purpose, label in Payment.PURPOSE_CHOICES
+                }
+                mark_tokens_paid(Payment.objects.filter(gateway_reference__in=completed))
+                # Bulk updates skip the signals that keep the dashboard statistics current
+                stats.record(students_paid=counts[Payment.FEE])
+                settled['completed'] += sum(counts.values())
+            for reason, references in failures.items():
+                settled['failed'] += Payment.objects.filter(
+                    gateway_reference__in=references, status='processing'
+                ).update(status='failed', failure_reason=reason, updated_at=now)
+
+    settled['abandoned'] = Payment.objects.filter(status='pending', updated_at__lte=cutoff).update(
+        status='failed', failure_reason=ABANDONED_REASON, updated_at=now,
+    )
+    return settled
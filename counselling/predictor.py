@@ -0,0 +1,93 @@
+"""
+Rank predictor over historical cut-offs.
+
+For every seat category RankIndex keeps the closing ranks a student of
+that category has been admitted at, per active course, sorted ascending:
+the best closing rank over all rounds of the open pool and of the
+category's own quota. The courses whose closing rank covers a rank are
+then one bisect away. The index is built from CourseRoundSummary in one
+query and memoised per process (see counselling.versioning); a committed
+round replaces its stamp, and the newest summary row is the stamp read
+back from the database. Answering a prediction reads the cache, not the
+database.
+"""
+from bisect import bisect_left
+
+from django.db.models import Max
+
+from .allocation.seat_matrix import CATEGORIES
+from .models import CourseRoundSummary
+from .versioning import Memo
+
+
+# Stamp replaced whenever a round commits new cut-offs
+PREDICTOR_VERSION_KEY = 'counselling:rank_predictor_version'
+
+
+class RankIndex:
+    """Courses by closing rank for each seat category"""
+
+    def __init__(self, rows):
+        """rows: (course_id, course_code, course_name, college_name, seat_category, closing_rank)"""
+        best = {}
+        courses = {}
+        for course_id, course_code, course_name, college_name, seat_category, closing_rank in rows:
+            best[course_id, seat_category] = closing_rank
+            courses[course_id] = {'course_id': course_id, 'course_code': course_code,
+                                  'course_name': course_name, 'college_name': college_name}
+
+        self.closing = {}
+        self.entries = {}
+        for category in CATEGORIES:
+            entries = []
+            for course_id, course in courses.items():
+                # Open seats are available to every category
+                routes = [(best.get((course_id, seat_category)), seat_category)
+                          for seat_category in dict.fromkeys(['GENERAL', category])]
+                routes = [route for route in routes if route[0] is not None]
+                if routes:
+                    closing_rank, seat_category = max(routes, key=lambda route: route[0])
+                    entries.append(dict(course, seat_category=seat_category, closing_rank=closing_rank))
+            entries.sort(key=lambda entry: (entry['closing_rank'], entry['course_id']))
+            self.closing[category] = [entry['closing_rank'] for entry in entries]
+            self.entries[category] = entries
+
+    @classmethod
+    def build(cls):
+        rows = CourseRoundSummary.objects.filter(
+            course__is_active=True, closing_rank__isnull=False,
+        ).exclude(category=CourseRoundSummary.ALL).values(
+            'course_id', 'course__course_code', 'course__course_name', 'course__college__college_name', 'category',
+        ).annotate(closing=Max('closing_rank')).order_by().values_list(
+            'course_id', 'course__course_code', 'course__course_name', 'course__college__college_name', 'category',
+            'closing',
+        )
+        return cls(rows)
+
+    def predict(self, rank, category='GENERAL', limit=None):
+        """Courses whose closing rank for category is rank or worse, closest cut-off first"""
+        entries = self.entries[category]
+        start = bisect_left(self.closing[category], rank)
+        end = len(entries) if limit is None else min(start + limit, len(entries))
+        return entries[start:end]
+
+    def __len__(self):
+        return len(self.entries['GENERAL'])
+
+
+# The index as last built by this process
+_index_memo = Memo(
+    PREDICTOR_VERSION_KEY,
+    RankIndex.build,
+    lambda: CourseRoundSummary.objects.aggregate(last=Max('pk'))['last'],
+)
+
+
+def rank_index():
+    """This process's RankIndex and the version it was built under"""
+    return _index_memo.get()
+
+
+def cutoffs_changed(**kwargs):
+    """round_completed receiver: rebuild here and in other processes on their next prediction"""
+    _index_memo.changed()
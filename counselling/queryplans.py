@@ -0,0 +1,216 @@
+"""
+Query plan checks for the hot queries.
+
+Each HotQuery runs one access path that the allocation engine or the
+dashboards depend on. check_plans() records the SQL it sends, asks the
+database for the plan of every statement and flags a full scan of any
+table the query is not expected to read in full, and a sort where the
+rows should already come out of an index in order. The
+`check_query_plans` command runs the checks on a throwaway database
+seeded with seed_data() and allocated once.
+"""
+import re
+import tempfile
+import time
+
+from django.db import connection
+from django.db.models import Count, Q, Subquery
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from accounts.models import StudentProfile
+from colleges.models import Course
+from students.models import StudentPreference
+from .allocation import run_allocation_round
+from .allocation.engine import load_preferences
+from .allocation.rounds import free_seats, interested_students
+from .allocation.seat_matrix import SeatMatrix
+from .models import Allocation, AllocationStatistics, CounsellingRound, CourseRoundSummary, Payment
+from .payments import SETTLE_BATCH_SIZE
+from .seats import recount_seats
+from .seeding import SeedConfig, seed_data
+
+
+# Plan lines that mean a table is read row by row, and lines that mean a sort
+FULL_SCAN = {
+    'sqlite': re.compile(r'^SCAN (\S+)$'),
+    'postgresql': re.compile(r'Seq Scan on (\S+)'),
+}
+SORT = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR (?:ORDER BY|RIGHT PART OF ORDER BY)'),
+    'postgresql': re.compile(r'^\s*(?:->\s*)?(?:Incremental )?Sort\b'),
+}
+EXPLAIN = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+}
+
+# Aliases Django gives tables in subqueries and self-joins: "accounts_studentprofile" U1
+ALIAS = re.compile(r'"(\w+)" (U\d+|T\d+)\b')
+
+
+class HotQuery:
+    """
+    One access path. full_scans names the tables it has to read in full;
+    with ordered set, the rows must come from an index already sorted.
+    """
+
+    def __init__(self, name, run, full_scans=(), ordered=False):
+        self.name = name
+        self.run = run
+        self.full_scans = set(full_scans)
+        self.ordered = ordered
+
+
+def hot_queries(sample):
+    """The checked queries; sample holds a student_id, course_id and rank that exist in the data"""
+    return [
+        HotQuery('paid_payments', lambda: Payment.objects.filter(status='completed').count()),
+        HotQuery(
+            'recent_payments',
+            lambda: list(Payment.objects.filter(status='completed').order_by('-payment_date')[:10]),
+            ordered=True,
+        ),
+        HotQuery(
+            'stale_payments',
+            lambda: list(Payment.objects.filter(status='processing', updated_at__lte=timezone.now()).values_list(
+                'pk', 'gateway_reference',
+            )[:SETTLE_BATCH_SIZE]),
+        ),
+        HotQuery(
+            'paid_students', lambda: Payment.objects.filter(purpose=Payment.FEE, status='completed').count(),
+        ),
+        HotQuery(
+            'student_preferences',
+            lambda: list(StudentPreference.objects.filter(student_id=sample['student_id']).order_by('preference_order')),
+            ordered=True,
+        ),
+        HotQuery(
+            'course_analytics',
+            lambda: list(Course.objects.filter(pk=sample['course_id']).with_seat_counts().annotate(
+                allocated_count=Count('allocations', filter=Q(allocations__status='ALLOCATED')),
+            )),
+        ),
+        HotQuery(
+            'course_cutoffs',
+            lambda: list(CourseRoundSummary.objects.filter(
+                course_id=sample['course_id'],
+                round=Subquery(CounsellingRound.objects.order_by('-number').values('pk')[:1]),
+            )),
+        ),
+        HotQuery(
+            'course_allocations',
+            lambda: list(Allocation.objects.filter(course_id=sample['course_id']).order_by('student__rank')),
+        ),
+        HotQuery(
+            'free_seats', lambda: free_seats(SeatMatrix.load()),
+            full_scans=['colleges_course', 'colleges_coursequota'],
+        ),
+        HotQuery('recount_seats', recount_seats, full_scans=['colleges_course']),
+        HotQuery(
+            'interested_students',
+            lambda: list(interested_students([sample['course_id']], rank_above=sample['rank'])),
+        ),
+        HotQuery(
+            'load_preferences',
+            lambda: load_preferences(list(Course.objects.values_list('id', flat=True))),
+            # Every paid student's whole list is read
+            full_scans=['colleges_course', 'students_studentpreference'],
+        ),
+        HotQuery(
+            'calculate_stats', AllocationStatistics.calculate_stats,
+            # The seat total sums every course
+            full_scans=['colleges_course'],
+        ),
+    ]
+
+
+class StatementRecorder:
+    """Execute wrapper keeping the SQL and parameters of every statement"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many:
+            self.statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+def explain(sql, params):
+    """The plan lines for one statement"""
+    with connection.cursor() as cursor:
+        cursor.execute(EXPLAIN[connection.vendor] + sql, params)
+        return [row[-1] if connection.vendor == 'sqlite' else row[0] for row in cursor.fetchall()]
+
+
+def check_statement(query, sql, params, tables):
+    plan = explain(sql, params)
+    aliases = dict((alias, table) for table, alias in ALIAS.findall(sql))
+    full_scans = []
+    sorts = []
+    for line in plan:
+        scan = FULL_SCAN[connection.vendor].search(line)
+        if scan:
+            table = scan.group(1).strip('"')
+            table = aliases.get(table, table)
+            # Derived tables such as SQLite's "subquery" are already in memory
+            if table in tables and table not in query.full_scans:
+                full_scans.append(table)
+        if query.ordered and SORT[connection.vendor].search(line):
+            sorts.append(line.strip())
+    return {'sql': sql, 'plan': plan, 'full_scans': full_scans, 'sorts': sorts}
+
+
+def check_plans(queries):
+    """Run and explain each query; returns {name: {'ok', 'statements'}}"""
+    tables = set(connection.introspection.table_names())
+    results = {}
+    for query in queries:
+        recorder = StatementRecorder()
+        with connection.execute_wrapper(recorder):
+            query.run()
+        statements = [
+            check_statement(query, sql, params, tables) for sql, params in recorder.statements
+            # Transaction control and savepoints have no plan
+            if sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT'))
+        ]
+        results[query.name] = {
+            'ok': not any(statement['full_scans'] or statement['sorts'] for statement in statements),
+            'statements': statements,
+        }
+    return results
+
+
+def sample_rows():
+    """A paid student with preferences and an allocated course to point the queries at"""
+    allocation = Allocation.objects.select_related('student').order_by('student__rank').first()
+    if allocation is None:
+        raise RuntimeError("The allocation round placed no students.")
+    return {'student_id': allocation.student_id, 'course_id': allocation.course_id, 'rank': allocation.student.rank}
+
+
+def run_plan_checks(students, seed=42, stdout=None):
+    """Seed a throwaway database, allocate one round and check every hot query"""
+    if connection.vendor not in EXPLAIN:
+        raise RuntimeError(f"Query plans are not checked on {connection.vendor}.")
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    media = tempfile.TemporaryDirectory()
+    media_override = override_settings(MEDIA_ROOT=media.name)
+    media_override.enable()
+    try:
+        started = time.perf_counter()
+        seed_data(SeedConfig(students=students, seed=seed))
+        run_allocation_round()
+        if connection.vendor == 'postgresql':
+            # Autovacuum would normally have gathered statistics by now
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        if stdout is not None:
+            stdout.write(f"Seeded and allocated {students} students in {time.perf_counter() - started:.1f}s")
+        return check_plans(hot_queries(sample_rows()))
+    finally:
+        media_override.disable()
+        media.cleanup()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
@@ -0,0 +1,118 @@
+"""
+Live seat counters.
+
+Course.seats_filled is the number of seats held (ALLOCATED or CONFIRMED) in
+each course. Allocation signals adjust it with an F() update inside the
+transaction that changes the row, so the counter commits or rolls back with
+it. Bulk writers such as the allocation engine wrap their work in
+bulk_seat_changes() and recount once with a single UPDATE instead.
+
+The per-row receivers on Allocation, Payment and StudentPreference stop
+QuerySet.delete() from deleting with a single statement, so inside
+bulk_seat_changes() those rows are removed with fast_delete().
+"""
+import hashlib
+import json
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from colleges.models import Course
+from . import db
+from .models import Allocation
+
+
+HELD_STATUSES = ('ALLOCATED', 'CONFIRMED')
+
+SEATS_CACHE_KEY = 'counselling:seat_availability'
+
+_state = threading.local()
+
+
+def invalidate_seat_cache():
+    cache.delete(SEATS_CACHE_KEY)
+
+
+def adjust_seats(course_id, delta):
+    """Atomically add delta to one course's counter"""
+    if not course_id or not delta or getattr(_state, 'bulk', 0):
+        return
+    Course.objects.filter(pk=course_id).update(seats_filled=F('seats_filled') + delta)
+    db.on_commit(invalidate_seat_cache)
+
+
+def recount_seats():
+    """Set every course counter from the Allocation table; returns the number corrected"""
+    held = Allocation.objects.filter(
+        course=OuterRef('pk'), status__in=HELD_STATUSES
+    ).order_by().values('course').annotate(held=Count('id')).values('held')
+    held = Coalesce(Subquery(held), 0)
+    corrected = Course.objects.exclude(seats_filled=held).update(seats_filled=held)
+    db.on_commit(invalidate_seat_cache)
+    return corrected
+
+
+@contextmanager
+def bulk_seat_changes():
+    """Skip per-row counter updates inside the block and recount once it succeeds"""
+    _state.bulk = getattr(_state, 'bulk', 0) + 1
+    try:
+        yield
+    finally:
+        _state.bulk -= 1
+    if not _state.bulk:
+        recount_seats()
+
+
+def fast_delete(queryset):
+    """
+    Delete the queryset's rows with one DELETE, without loading them or
+    sending signals; returns the number deleted. Only for models no other
+    row references (Allocation, Payment, StudentPreference) and only inside
+    bulk_seat_changes(); the caller recounts the statistics afterwards.
+    """
+    if not getattr(_state, 'bulk', 0):
+        raise RuntimeError("fast_delete() skips the seat counters and must run inside bulk_seat_changes()")
+    return queryset._raw_delete(queryset.db)
+
+
+def seat_availability():
+    """
+    JSON body and ETag of the vacancy list for active courses, with the
+    vacancies by course id, cached for SEAT_AVAILABILITY_CACHE_SECONDS and
+    dropped whenever a counter changes.
+    """
+    payload = cache.get(SEATS_CACHE_KEY)
+    if payload is None:
+        courses = list(Course.objects.filter(is_active=True).order_by('college__college_name', 'course_name').values_list(
+            'id', 'college__college_name', 'course_code', 'course_name', 'total_seats', 'seats_filled'
+        ))
+        body = json.dumps({
+            'generated_at': timezone.now().isoformat(),
+            'courses': [
+                {
+                    'id': course_id,
+                    'college': college_name,
+                    'course_code': course_code,
+                    'course_name': course_name,
+                    'total_seats': total_seats,
+                    'seats_filled': seats_filled,
+                    'available_seats': max(total_seats - seats_filled, 0),
+                }
+                for course_id, college_name, course_code, course_name, total_seats, seats_filled in courses
+            ],
+        })
+        # The timestamp is left out so an unchanged seat list keeps its ETag
+        digest = hashlib.md5(body[body.index('"courses"'):].encode()).hexdigest()
+        payload = {
+            'body': body,
+            'etag': f'"{digest}"',
+            'available': {course[0]: max(course[4] - course[5], 0) for course in courses},
+        }
+        cache.set(SEATS_CACHE_KEY, payload, settings.SEAT_AVAILABILITY_CACHE_SECONDS)
+    return payload
@@ -0,0 +1,189 @@
+"""
+Synthetic data for benchmarks and load tests.
+
+Everything is bulk-inserted in chunks so that a million students can be
+seeded without holding all model instances in memory. Generated users are
+prefixed with SEED_PREFIX so they can be removed again with clear_seed_data().
+"""
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max, Q
+
+from accounts.models import User, StudentProfile, CollegeProfile
+from colleges.catalogue import bump_catalogue_version
+from colleges.models import Course
+from students.models import StudentPreference
+from .models import Allocation, AllocationStatistics, Payment
+from .seats import bulk_seat_changes, fast_delete
+
+
+SEED_PREFIX = 'seed_'
+SEED_PASSWORD = 'seedpass123'
+
+# Share of students per category, roughly the national reservation split
+CATEGORY_WEIGHTS = [('GENERAL', 0.50), ('OBC', 0.27), ('SC', 0.15), ('ST', 0.08)]
+
+DEGREE_TYPES = ['B.Tech', 'B.E.', 'B.Sc', 'M.Tech', 'M.E.', 'M.Sc']
+DEPARTMENTS = ['Computer Science', 'Electronics', 'Mechanical', 'Civil', 'Electrical', 'Chemical',
+               'Biotechnology', 'Mathematics', 'Physics', 'Information Technology']
+
+BATCH_SIZE = 5000
+
+
+class SeedDataExists(Exception):
+    """Raised when seeding on top of an earlier seed run"""
+
+
+class SeedConfig:
+    """Knobs for seed_data(); defaults scale colleges and seats with students"""
+
+    def __init__(self, students, colleges=None, courses_per_college=10, min_preferences=3,
+                 max_preferences=10, seat_ratio=0.6, paid_fraction=0.9, skew=1.1, seed=42):
+        self.students = students
+        self.colleges = colleges or max(5, students // 2000)
+        self.courses_per_college = courses_per_college
+        self.min_preferences = min_preferences
+        self.max_preferences = max_preferences
+        # Total seats as a share of students
+        self.seat_ratio = seat_ratio
+        self.paid_fraction = paid_fraction
+        # Zipf exponent of course popularity; higher means fiercer competition for top courses
+        self.skew = skew
+        self.seed = seed
+
+    @property
+    def courses(self):
+        return self.colleges * self.courses_per_college
+
+
+def clear_seed_data():
+    """Delete every user created by seed_data(), with their profiles and rows"""
+    seeded_student = Q(student__user__username__startswith=SEED_PREFIX)
+    seeded_course = Q(course__college__user__username__startswith=SEED_PREFIX)
+    with transaction.atomic(), bulk_seat_changes():
+        # The rows cascading from seeded students and courses, in one statement each
+        fast_delete(Allocation.objects.filter(seeded_student | seeded_course))
+        fast_delete(StudentPreference.objects.filter(seeded_student | seeded_course))
+        fast_delete(Payment.objects.filter(seeded_student))
+        Course.objects.filter(college__user__username__startswith=SEED_PREFIX).delete()
+        deleted = User.objects.filter(username__startswith=SEED_PREFIX).delete()[0]
+        AllocationStatistics.calculate_stats()
+    return deleted
+
+
+def _password_hash():
+    # Hashing is deliberately slow, so every seeded user shares one hash
+    return make_password(SEED_PASSWORD)
+
+
+def seed_colleges(config, rng, password):
+    """Create colleges and their courses; returns course ids ordered by popularity"""
+    users = User.objects.bulk_create(
+        User(username=f'{SEED_PREFIX}college_{i}', password=password, user_type='college_admin')
+        for i in range(config.colleges)
+    )
+    colleges = CollegeProfile.objects.bulk_create(
+        CollegeProfile(
+            user=user,
+            college_name=f'Seed College {i}',
+            college_code=f'SC{i:06d}'[:10],
+            address='Generated',
+            established_year=int(rng.integers(1950, 2020)),
+        )
+        for i, user in enumerate(users)
+    )
+
+    n_courses = config.courses
+    total_seats = max(n_courses, int(config.students * config.seat_ratio))
+    seats = rng.multinomial(total_seats - n_courses, np.full(n_courses, 1 / n_courses)) + 1
+    courses = []
+    for c in range(n_courses):
+        college = colleges[c // config.courses_per_college]
+        department = DEPARTMENTS[c % len(DEPARTMENTS)]
+        courses.append(Course(
+            college=college,
+            course_name=f'{department} {c}',
+            course_code=f'SC{c}',
+            department=department,
+            degree_type=DEGREE_TYPES[c % len(DEGREE_TYPES)],
+            total_seats=int(seats[c]),
+            fee_per_year=int(rng.integers(50, 300)) * 1000,
+        ))
+    courses = Course.objects.bulk_create(courses, batch_size=BATCH_SIZE)
+    bump_catalogue_version()
+    return np.array([course.pk for course in courses], dtype=np.int64)
+
+
+def _preference_lists(config, rng, course_ids, popularity, count):
+    """Draw count skewed preference lists of distinct courses"""
+    n_courses = len(course_ids)
+    lengths = rng.integers(config.min_preferences, config.max_preferences + 1, size=count)
+    lengths = np.minimum(lengths, n_courses)
+    # Oversample with replacement and keep the first distinct draws of each row
+    draws = rng.choice(n_courses, size=(count, config.max_preferences * 3), p=popularity)
+    for row, length in zip(draws.tolist(), lengths.tolist()):
+        choices = list(dict.fromkeys(row))[:length]
+        while len(choices) < length:
+            extra = int(rng.integers(n_courses))
+            if extra not in choices:
+                choices.append(extra)
+        yield [int(course_ids[c]) for c in choices]
+
+
+def seed_data(config, stdout=None):
+    """Bulk-generate users, students, colleges, courses, payments and preferences"""
+    if User.objects.filter(username__startswith=SEED_PREFIX).exists():
+        raise SeedDataExists("Seed data already exists; clear it first.")
+
+    rng = np.random.default_rng(config.seed)
+    password = _password_hash()
+
+    course_ids = seed_colleges(config, rng, password)
+    popularity = 1 / np.arange(1, len(course_ids) + 1) ** config.skew
+    popularity /= popularity.sum()
+
+    rank_base = StudentProfile.objects.aggregate(top=Max('rank'))['top'] or 0
+    ranks = rng.permutation(config.students) + rank_base + 1
+    codes = [code for code, weight in CATEGORY_WEIGHTS]
+    weights = [weight for code, weight in CATEGORY_WEIGHTS]
+
+    for start in range(0, config.students, BATCH_SIZE):
+        count = min(BATCH_SIZE, config.students - start)
+        categories = rng.choice(len(codes), size=count, p=weights)
+        paid = rng.random(count) < config.paid_fraction
+
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                User(username=f'{SEED_PREFIX}student_{start + i}', password=password, user_type='student')
+                for i in range(count)
+            )
+            students = StudentProfile.objects.bulk_create(
+                StudentProfile(
+                    user=user,
+                    roll_number=f'SR{start + i:08d}',
+                    rank=int(ranks[start + i]),
+                    category=codes[categories[i]],
+                )
+                for i, user in enumerate(users)
+            )
+            Payment.objects.bulk_create(
+                # The counselling fee; token_paid stays unset until a seat token is paid for an allocation
+                Payment(student=student, purpose=Payment.FEE, amount=500, payment_method='upi', status='completed')
+                for student, is_paid in zip(students, paid.tolist()) if is_paid
+            )
+            StudentPreference.objects.bulk_create(
+                (
+                    StudentPreference(student=student, course_id=course_id, preference_order=order)
+                    for student, choices in zip(
+                        students, _preference_lists(config, rng, course_ids, popularity, count)
+                    )
+                    for order, course_id in enumerate(choices, start=1)
+                ),
+                batch_size=BATCH_SIZE,
+            )
+        if stdout is not None:
+            stdout.write(f"  {start + count}/{config.students} students")
+
+    # Bulk inserts skip the signals that keep the statistics current
+    AllocationStatistics.calculate_stats()
@@ -0,0 +1,124 @@
+"""
+Keep the dashboard statistics and course seat counters in step with the
+rows they count.
+
+Bulk operations (bulk_create, QuerySet.update, seats.fast_delete) bypass
+these receivers; callers doing those run
+AllocationStatistics.calculate_stats() afterwards and wrap their writes in
+seats.bulk_seat_changes().
+"""
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from accounts.models import StudentProfile
+from colleges.models import Course
+from students.models import StudentPreference
+from . import seats, stats
+from .models import Allocation, Payment
+
+# Attribute holding the value a field had when the instance was loaded
+LOADED = '_stats_loaded'
+
+
+@receiver(post_save, sender=StudentProfile)
+def student_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.record(total_students=1)
+
+
+@receiver(post_delete, sender=StudentProfile)
+def student_deleted(sender, instance, **kwargs):
+    stats.record(total_students=-1)
+
+
+@receiver(post_init, sender=Payment)
+@receiver(post_init, sender=Course)
+def remember_loaded_values(sender, instance, **kwargs):
+    # Read __dict__ so deferred fields are not fetched just to be remembered
+    field = 'status' if sender is Payment else 'total_seats'
+    setattr(instance, LOADED, instance.__dict__.get(field))
+
+
+@receiver(post_init, sender=Allocation)
+def remember_held_seat(sender, instance, **kwargs):
+    status = instance.__dict__.get('status')
+    course_id = instance.__dict__.get('course_id')
+    if status is None or course_id is None:
+        setattr(instance, LOADED, None)
+    else:
+        setattr(instance, LOADED, course_id if status in seats.HELD_STATUSES else 0)
+
+
+def _held_course(allocation):
+    return allocation.course_id if allocation.status in seats.HELD_STATUSES else 0
+
+
+@receiver(post_save, sender=Payment)
+def payment_saved(sender, instance, created, **kwargs):
+    # Only the counselling fee counts towards students_paid
+    if instance.purpose != Payment.FEE:
+        return
+    old_status = '' if created else getattr(instance, LOADED, None)
+    if old_status is None:
+        stats.mark_stale()
+    elif (old_status == 'completed') != (instance.status == 'completed'):
+        stats.record(students_paid=1 if instance.status == 'completed' else -1)
+    setattr(instance, LOADED, instance.status)
+
+
+@receiver(post_delete, sender=Payment)
+def payment_deleted(sender, instance, **kwargs):
+    if instance.purpose == Payment.FEE and instance.status == 'completed':
+        stats.record(students_paid=-1)
+
+
+@receiver(post_save, sender=Course)
+def course_saved(sender, instance, created, **kwargs):
+    old_seats = 0 if created else getattr(instance, LOADED, None)
+    if old_seats is None:
+        stats.mark_stale()
+    elif instance.total_seats != old_seats:
+        stats.record(total_seats=instance.total_seats - old_seats)
+    setattr(instance, LOADED, instance.total_seats)
+
+
+@receiver(post_delete, sender=Course)
+def course_deleted(sender, instance, **kwargs):
+    stats.record(total_seats=-instance.total_seats)
+
+
+@receiver(post_save, sender=StudentPreference)
+def preference_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.record_preference_change(
+            instance.student_id,
+            lambda: StudentPreference.objects.filter(student_id=instance.student_id)
+            .exclude(pk=instance.pk).exists(),
+        )
+
+
+@receiver(post_delete, sender=StudentPreference)
+def preference_deleted(sender, instance, **kwargs):
+    stats.record_preference_change(instance.student_id, True)
+
+
+@receiver(post_save, sender=Allocation)
+def allocation_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.record(students_allocated=1, seats_filled=1)
+
+    # Course id of the seat held before and after the save; 0 when none is held
+    old_course = 0 if created else getattr(instance, LOADED, None)
+    new_course = _held_course(instance)
+    if old_course is None:
+        seats.recount_seats()
+    elif old_course != new_course:
+        seats.adjust_seats(old_course, -1)
+        seats.adjust_seats(new_course, 1)
+    setattr(instance, LOADED, new_course)
+
+
+@receiver(post_delete, sender=Allocation)
+def allocation_deleted(sender, instance, **kwargs):
+    stats.record(students_allocated=-1, seats_filled=-1)
+    seats.adjust_seats(_held_course(instance), -1)
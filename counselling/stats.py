@@ -0,0 +1,145 @@
+"""
+Incremental upkeep of the AllocationStatistics counters.
+
+Signal receivers (see signals.py) record deltas while a transaction runs.
+The deltas are applied with a single UPDATE when the transaction commits,
+so nothing is applied if it rolls back, and a bulk delete costs one write
+rather than one per row. Dashboards read the counters through
+AllocationStatistics.get_cached(); calculate_stats() recounts everything
+and is run periodically by `manage.py reconcile_stats` to correct drift
+from bulk operations that bypass signals.
+"""
+import threading
+import weakref
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from . import db
+from .models import STATS_CACHE_KEY, AllocationStatistics
+
+
+COUNTERS = [
+    'total_students',
+    'students_paid',
+    'students_with_preferences',
+    'students_allocated',
+    'total_seats',
+    'seats_filled',
+]
+
+_state = threading.local()
+
+
+class PendingDeltas:
+    """Counter changes recorded in the current transaction"""
+
+    def __init__(self):
+        self.deltas = defaultdict(int)
+        # student id -> whether they had preferences before this transaction
+        self.preference_students = {}
+        self.stale = False
+        # Weak reference to the callback queued with on_commit
+        self.queued = None
+
+    def is_current(self):
+        """False once the transaction that queued the flush has committed or rolled back"""
+        # The transaction holds the only reference to the callback and drops
+        # it once it has run it on commit or discarded it on rollback,
+        # including the rollback of a savepoint it was queued in
+        return self.queued is None or self.queued() is not None
+
+    def queue(self):
+        if self.queued is None:
+            flush = self.flush
+            self.queued = weakref.ref(flush)
+            # Runs immediately in autocommit mode
+            db.on_commit(flush)
+
+    def flush(self):
+        if getattr(_state, 'pending', None) is self:
+            _state.pending = None
+        if self.stale:
+            AllocationStatistics.calculate_stats()
+            return
+
+        deltas = dict(self.deltas)
+        if self.preference_students:
+            deltas['students_with_preferences'] = (
+                deltas.get('students_with_preferences', 0)
+                + _count_with_preferences(list(self.preference_students))
+                - sum(self.preference_students.values())
+            )
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        updated = AllocationStatistics.objects.filter(pk=1).update(
+            updated_at=timezone.now(),
+            **{field: F(field) + delta for field, delta in deltas.items()},
+        )
+        if not updated:
+            # No counters row yet; start from a full count
+            AllocationStatistics.calculate_stats()
+        else:
+            cache.delete(STATS_CACHE_KEY)
+
+
+def _count_with_preferences(student_ids):
+    from students.models import StudentPreference
+
+    total = 0
+    for chunk in db.chunked(student_ids):
+        total += StudentPreference.objects.filter(student_id__in=chunk).values('student').distinct().count()
+    return total
+
+
+def _pending():
+    pending = getattr(_state, 'pending', None)
+    if pending is None or not pending.is_current():
+        pending = _state.pending = PendingDeltas()
+    return pending
+
+
+def record(**deltas):
+    """Add deltas to counters, e.g. record(students_paid=1), applied on commit"""
+    pending = _pending()
+    for field, delta in deltas.items():
+        if field not in COUNTERS:
+            raise ValueError(f"Unknown statistics counter: {field}")
+        pending.deltas[field] += delta
+    pending.queue()
+
+
+def record_preference_change(student_id, had_preferences):
+    """
+    Note that a student's preference list changed. had_preferences is their
+    state before the change, or a callable returning it; it is only
+    evaluated for the first change to each student in a transaction.
+    """
+    pending = _pending()
+    if student_id not in pending.preference_students:
+        if callable(had_preferences):
+            had_preferences = had_preferences()
+        pending.preference_students[student_id] = bool(had_preferences)
+    pending.queue()
+
+
+def mark_stale():
+    """Recount everything on commit instead of applying deltas"""
+    pending = _pending()
+    pending.stale = True
+    pending.queue()
+
+
+def discard_pending():
+    """Drop deltas recorded so far in this transaction; used before a full recount"""
+    pending = getattr(_state, 'pending', None)
+    if pending is not None:
+        # Its queued flush becomes a no-op; later changes start a new batch
+        pending.deltas.clear()
+        pending.preference_students.clear()
+        pending.stale = False
+        _state.pending = None
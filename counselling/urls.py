@@ -10,8 +10,13 @@ urlpatterns = [
     path('admin/reset-system/', views.reset_system, name='reset_system'),
     path('admin/export-results/', views.export_results, name='export_results'),
     path('admin/api/dashboard/', views.dashboard_api, name='dashboard_api'),
+    path('admin/api/metrics/', views.request_metrics, name='request_metrics'),
+    path('admin/api/simulate/', views.simulate_allocation, name='simulate_allocation'),
+    path('api/seats/', views.seat_availability_api, name='seat_availability_api'),
+    path('api/predict/', views.rank_predictor_api, name='rank_predictor_api'),
     
     # Student Dashboard
     path('student/', views.student_dashboard, name='student_dashboard'),
     path('student/payment/', views.make_payment, name='make_payment'),
+    path('payments/callback/', views.payment_callback, name='payment_callback'),
 ]
@@ -0,0 +1,81 @@
+"""
+Version stamps for data kept outside the database.
+
+A Stamp is a value in the cache that is replaced whenever the data behind
+it changes, so anything built under the old stamp is known to be stale.
+
+A Memo keeps a value built from the database in this process and rebuilds
+it when its stamp is replaced. A replaced stamp only reaches other
+processes through a cache they share; with the default LocMemCache each
+process has its own. A Memo therefore also compares a cheap stamp read
+from the database (its db_stamp query) once it is MEMO_RECHECK_SECONDS
+old, so a change made in any other process is picked up within that time.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import db
+
+
+class Stamp:
+    """Version stamp shared through the cache under key"""
+
+    def __init__(self, key):
+        self.key = key
+
+    def current(self):
+        stamp = cache.get(self.key)
+        if stamp is None:
+            # A clock value rather than a counter, so a cleared cache never reuses an old stamp
+            cache.add(self.key, time.time_ns(), None)
+            stamp = cache.get(self.key)
+        return stamp
+
+    def replace(self):
+        """Start a new stamp once the current write transaction commits"""
+        db.on_commit(lambda: cache.set(self.key, time.time_ns(), None))
+
+
+class Memo:
+    """
+    The value build() returns, memoised in this process under a Stamp and
+    the db_stamp() it was built at. With memoise_in_transactions off, a
+    value built inside a transaction is returned but not kept, since the
+    transaction may still be rolled back.
+    """
+
+    def __init__(self, key, build, db_stamp, memoise_in_transactions=True):
+        self.stamp = Stamp(key)
+        self.build = build
+        self.db_stamp = db_stamp
+        self.memoise_in_transactions = memoise_in_transactions
+        # (stamp, db_stamp, checked_at, value) as last built
+        self._current = None
+
+    def get(self):
+        """(value, version); the version is the same in every process holding the same value"""
+        stamp = self.stamp.current()
+        current = self._current
+        now = time.monotonic()
+        if current is not None and current[0] == stamp and now - current[2] < settings.MEMO_RECHECK_SECONDS:
+            return current[3], f'{stamp}-{current[1]}'
+
+        db_stamp = self.db_stamp()
+        if current is not None and current[:2] == (stamp, db_stamp):
+            self._current = (stamp, db_stamp, now, current[3])
+            return current[3], f'{stamp}-{db_stamp}'
+
+        value = self.build()
+        if self.memoise_in_transactions or not db.get_connection().in_atomic_block:
+            self._current = (stamp, db_stamp, now, value)
+        return value, f'{stamp}-{db_stamp}'
+
+    def changed(self):
+        """Drop the value here at once and in processes sharing the cache when the change commits"""
+        self._current = None
+        self.stamp.replace()
+
+    def clear(self):
+        self._current = None
@@ -1,3 +1,4 @@
+from django.conf import settings as django_settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
@@ -5,18 +6,32 @@ from django.http import JsonResponse, HttpResponse
 from django.db import transaction
 from django.db.models import Count, Sum
 from django.utils import timezone
-import csv
+from django.utils.cache import patch_cache_control
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_GET, require_POST
 import json
+import uuid
 
 from .models import (
     CounsellingSettings, 
     Payment, 
     Allocation, 
-    AllocationStatistics
+    AllocationJob,
+    AllocationStatistics,
+    CounsellingRound
 )
+from .allocation import (
+    CATEGORIES, MATCHERS, AllocationError, SimulationError, get_snapshot, run_allocation_round, simulate,
+)
+from .instrumentation import metrics
+from .jobs import JobAlreadyActive, enqueue_allocation, job_status
+from .payments import PaymentError, complete_payment, get_gateway, request_idempotency_key, start_payment
+from .predictor import rank_index
+from .seats import bulk_seat_changes, fast_delete, seat_availability
 from accounts.models import StudentProfile
 from colleges.models import Course
 from students.models import StudentPreference
+from reports.exports import allocation_rows, export_response
 
 
 def is_super_admin(user):
@@ -34,7 +49,7 @@ def is_student(user):
 def admin_dashboard(request):
     """Simplified admin dashboard with real-time stats"""
     settings = CounsellingSettings.get_settings()
-    stats = AllocationStatistics.calculate_stats()
+    stats = AllocationStatistics.get_cached()
     
     # Recent payments
     recent_payments = Payment.objects.filter(status='completed').order_by('-payment_date')[:10]
@@ -46,9 +61,14 @@ def admin_dashboard(request):
         'course_name', 'college__college_name', 'total_seats', 'allocated_seats'
     )
     
+    latest_round = CounsellingRound.latest()
+    
     context = {
         'settings': settings,
         'stats': stats,
+        'latest_round': latest_round,
+        'next_round': latest_round.number + 1 if latest_round else 1,
+        'latest_job': AllocationJob.objects.first(),
         'recent_payments': recent_payments,
         'course_stats': course_stats,
         'utilization_percentage': (stats.seats_filled / stats.total_seats * 100) if stats.total_seats > 0 else 0,
@@ -63,55 +83,22 @@ def admin_dashboard(request):
 def run_allocation(request):
     """Run the seat allocation algorithm"""
     if request.method == 'POST':
-        settings = CounsellingSettings.get_settings()
-        
-        if settings.allocation_completed:
-            messages.error(request, "Allocation has already been completed!")
+        if django_settings.ALLOCATION_RUN_IN_BACKGROUND:
+            try:
+                job = enqueue_allocation(request.user)
+                messages.success(request, f"Allocation job #{job.pk} queued. Progress is shown below.")
+            except JobAlreadyActive as e:
+                messages.error(request, str(e))
             return redirect('counselling:admin_dashboard')
         
         try:
-            with transaction.atomic():
-                # Clear existing allocations
-                Allocation.objects.all().delete()
-                
-                # Get all students with completed payments and preferences
-                eligible_students = StudentProfile.objects.filter(
-                    payment__status='completed',
-                    preferences__isnull=False
-                ).distinct().order_by('rank')
-                
-                allocated_count = 0
-                
-                for student in eligible_students:
-                    # Get student's preferences in order
-                    preferences = StudentPreference.objects.filter(
-                        student=student
-                    ).order_by('preference_order')
-                    
-                    for pref in preferences:
-                        course = pref.course
-                        # Check if seats available
-                        current_allocations = Allocation.objects.filter(course=course).count()
-                        
-                        if current_allocations < course.total_seats:
-                            # Allocate seat
-                            Allocation.objects.create(
-                                student=student,
-                                course=course,
-                                preference_number=pref.preference_order
-                            )
-                            allocated_count += 1
-                            break  # Student allocated, move to next student
-                
-                # Mark allocation as completed
-                settings.allocation_completed = True
-                settings.save()
-                
-                # Update statistics
-                AllocationStatistics.calculate_stats()
-                
-                messages.success(request, f"Allocation completed successfully! {allocated_count} students allocated.")
-                
+            result = run_allocation_round()
+            messages.success(
+                request,
+                f"Round {result.round_number} completed successfully! {result.allocated_count} students allocated."
+            )
+        except AllocationError as e:
+            messages.error(request, str(e))
         except Exception as e:
             messages.error(request, f"Error during allocation: {str(e)}")
     
@@ -124,10 +111,11 @@ def reset_system(request):
     """Reset the entire system for demo purposes"""
     if request.method == 'POST':
         try:
-            with transaction.atomic():
-                # Clear allocations and payments
-                Allocation.objects.all().delete()
-                Payment.objects.all().delete()
+            with transaction.atomic(), bulk_seat_changes():
+                # Clear allocations, rounds and payments
+                fast_delete(Allocation.objects.all())
+                CounsellingRound.objects.all().delete()
+                fast_delete(Payment.objects.all())
                 
                 # Reset settings
                 settings = CounsellingSettings.get_settings()
@@ -150,27 +138,13 @@ def reset_system(request):
 @login_required
 @user_passes_test(is_super_admin)
 def export_results(request):
-    """Export allocation results as CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="allocation_results.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Student Name', 'Email', 'Rank', 'Allocated College', 'Allocated Course', 'Preference Number', 'Allocation Date'])
-    
-    allocations = Allocation.objects.select_related('student__user', 'course__college').order_by('student__rank')
-    
-    for allocation in allocations:
-        writer.writerow([
-            allocation.student.user.get_full_name(),
-            allocation.student.user.email,
-            allocation.student.rank,
-            allocation.course.college.name,
-            allocation.course.name,
-            allocation.preference_number,
-            allocation.allocated_at.strftime('%Y-%m-%d %H:%M:%S')
-        ])
-    
-    return response
+    """Export allocation results as CSV (optionally gzipped) or XLSX, streamed"""
+    header = ['Student Name', 'Email', 'Rank', 'Allocated College', 'Allocated Course', 'Preference Number', 'Allocation Date']
+    rows = allocation_rows([
+        'student_name', 'student__user__email', 'student__rank', 'course__college__college_name',
+        'course__course_name', 'preference_number', 'allocated_at',
+    ])
+    return export_response(request, 'allocation_results', header, rows)
 
 
 @login_required
@@ -181,10 +155,7 @@ def student_dashboard(request):
     settings = CounsellingSettings.get_settings()
     
     # Get payment status
-    try:
-        payment = Payment.objects.get(student=student)
-    except Payment.DoesNotExist:
-        payment = None
+    payment = Payment.objects.filter(student=student, purpose=Payment.FEE).first()
     
     # Get preferences
     preferences = StudentPreference.objects.filter(student=student).order_by('preference_order')
@@ -202,7 +173,7 @@ def student_dashboard(request):
         'preferences': preferences,
         'allocation': allocation,
         'can_submit_preferences': settings.preference_submission_open and payment and payment.status == 'completed',
-        'can_make_payment': settings.payment_required and (not payment or payment.status != 'completed'),
+        'can_make_payment': settings.payment_required and (not payment or payment.status in ('pending', 'failed')),
     }
     return render(request, 'counselling/student_dashboard.html', context)
 
@@ -215,32 +186,25 @@ def make_payment(request):
     settings = CounsellingSettings.get_settings()
     
     # Check if payment already exists
-    try:
-        payment = Payment.objects.get(student=student)
-        if payment.status == 'completed':
-            messages.info(request, "Payment already completed!")
-            return redirect('counselling:student_dashboard')
-    except Payment.DoesNotExist:
-        payment = None
+    payment = Payment.objects.filter(student=student, purpose=Payment.FEE).first()
+    if payment and payment.status == 'completed':
+        messages.info(request, "Payment already completed!")
+        return redirect('counselling:student_dashboard')
     
     if request.method == 'POST':
         payment_method = request.POST.get('payment_method')
+        if payment_method not in dict(Payment.PAYMENT_METHOD_CHOICES):
+            messages.error(request, "Please select a payment method.")
+            return redirect('counselling:make_payment')
         
-        if not payment:
-            # Create new payment
-            payment = Payment.objects.create(
-                student=student,
-                amount=settings.counselling_fee,
-                payment_method=payment_method
-            )
-        
-        # Process payment (mock)
-        success = payment.process_payment()
+        payment = start_payment(student, settings.counselling_fee, payment_method, request_idempotency_key(request))
         
-        if success:
+        if payment.status == 'completed':
             messages.success(request, f"Payment of ₹{payment.amount} completed successfully! Transaction ID: {payment.transaction_id}")
-        else:
+        elif payment.status == 'failed':
             messages.error(request, f"Payment failed: {payment.failure_reason}")
+        else:
+            messages.info(request, f"Payment of ₹{payment.amount} submitted and awaiting confirmation. Transaction ID: {payment.transaction_id}")
         
         return redirect('counselling:student_dashboard')
     
@@ -248,15 +212,29 @@ def make_payment(request):
         'student': student,
         'settings': settings,
         'payment': payment,
+        'idempotency_key': uuid.uuid4(),
     }
     return render(request, 'counselling/make_payment.html', context)
 
 
+@csrf_exempt
+@require_POST
+def payment_callback(request):
+    """Completion callback from the payment gateway"""
+    try:
+        payment = complete_payment(*get_gateway().parse_callback(request))
+    except PaymentError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if payment is None:
+        return JsonResponse({'error': 'Unknown payment reference.'}, status=404)
+    return JsonResponse({'transaction_id': payment.transaction_id, 'status': payment.status})
+
+
 @login_required
 @user_passes_test(is_super_admin)
 def dashboard_api(request):
     """API endpoint for real-time dashboard updates"""
-    stats = AllocationStatistics.calculate_stats()
+    stats = AllocationStatistics.get_cached()
     settings = CounsellingSettings.get_settings()
     
     data = {
@@ -270,7 +248,96 @@ def dashboard_api(request):
         'payment_percentage': round((stats.students_paid / stats.total_students * 100) if stats.total_students > 0 else 0, 2),
         'preference_percentage': round((stats.students_with_preferences / stats.total_students * 100) if stats.total_students > 0 else 0, 2),
         'allocation_completed': settings.allocation_completed,
+        'allocation_job': job_status(AllocationJob.objects.first()),
         'last_updated': timezone.now().strftime('%Y-%m-%d %H:%M:%S'),
     }
     
     return JsonResponse(data)
+
+
+@login_required
+@user_passes_test(is_super_admin)
+def request_metrics(request):
+    """Per-view request histograms collected by this worker process"""
+    return JsonResponse({'views': metrics.snapshot()})
+
+
+def _college_may_simulate(user, capacity, preferences):
+    """College admins may only change the seats of their own courses"""
+    if preferences:
+        return False
+    own = {str(course_id) for course_id in Course.objects.filter(college__user=user).values_list('id', flat=True)}
+    return all(isinstance(delta, dict) and str(delta.get('course_id')) in own for delta in capacity)
+
+
+@login_required
+@require_POST
+def simulate_allocation(request):
+    """What-if allocation with seat or preference changes applied in memory; nothing is written"""
+    if request.user.user_type not in ('super_admin', 'college_admin'):
+        return JsonResponse({'error': 'Only administrators can run simulations.'}, status=403)
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Request body must be JSON.'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'Request body must be a JSON object.'}, status=400)
+    capacity = payload.get('capacity') or []
+    preferences = payload.get('preferences') or []
+    if not isinstance(capacity, list) or not isinstance(preferences, list):
+        return JsonResponse({'error': 'capacity and preferences must be lists.'}, status=400)
+    if request.user.user_type == 'college_admin' and not _college_may_simulate(request.user, capacity, preferences):
+        return JsonResponse({'error': "College admins can only change their own courses' seats."}, status=403)
+    method = payload.get('method') or CounsellingSettings.get_settings().allocation_method
+    if method not in MATCHERS:
+        return JsonResponse({'error': f"Unknown allocation method '{method}'."}, status=400)
+    
+    snapshot = get_snapshot(method, refresh=bool(payload.get('refresh')))
+    try:
+        result = simulate(capacity, preferences, snapshot=snapshot)
+    except SimulationError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(result.as_dict())
+
+
+def _seat_availability_etag(request):
+    return seat_availability()['etag']
+
+
+@login_required
+@condition(etag_func=_seat_availability_etag)
+def seat_availability_api(request):
+    """Vacancies per active course, served from cache; supports If-None-Match"""
+    response = HttpResponse(seat_availability()['body'], content_type='application/json')
+    patch_cache_control(response, private=True, max_age=django_settings.SEAT_AVAILABILITY_CACHE_SECONDS)
+    return response
+
+
+def _rank_prediction_etag(request):
+    index, version = rank_index()
+    return f'{version}:{request.GET.urlencode()}'
+
+
+@require_GET
+@condition(etag_func=_rank_prediction_etag)
+def rank_predictor_api(request):
+    """Courses whose historical closing rank covers ?rank= for ?category=, from the in-memory cut-off index"""
+    try:
+        rank = int(request.GET.get('rank', ''))
+        limit = int(request.GET['limit']) if request.GET.get('limit') else None
+    except ValueError:
+        return JsonResponse({'error': 'rank and limit must be integers.'}, status=400)
+    category = request.GET.get('category', 'GENERAL')
+    if rank < 1 or (limit is not None and limit < 1):
+        return JsonResponse({'error': 'rank and limit must be positive.'}, status=400)
+    if category not in CATEGORIES:
+        return JsonResponse({'error': f"Unknown category '{category}'."}, status=400)
+    
+    index, version = rank_index()
+    response = JsonResponse({
+        'rank': rank,
+        'category': category,
+        'courses': index.predict(rank, category, limit),
+    })
+    patch_cache_control(response, public=True, max_age=django_settings.RANK_PREDICTOR_CACHE_SECONDS)
+    return response
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 from decouple import config
 
+from .database import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -49,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack
+    'counselling.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -63,7 +67,8 @@ ROOT_URLCONF = 'counselling_system.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, with render times reported to RequestMetricsMiddleware
+        'BACKEND': 'counselling.instrumentation.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -83,13 +88,49 @@ WSGI_APPLICATION = 'counselling_system.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+#
+# DATABASE_URL selects the backend (see counselling_system/database.py);
+# the default is the SQLite file next to manage.py. Connections are kept
+# for DB_CONN_MAX_AGE seconds and checked before reuse.
+
+DATABASE_URL = config('DATABASE_URL', default='sqlite:///db.sqlite3')
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=60, cast=int)
+DB_CONN_HEALTH_CHECKS = config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool)
+
+# SQLite only: journal mode set on every new connection (WAL lets readers
+# continue while one writer commits), the matching synchronous level, and
+# the seconds a writer waits for the lock before "database is locked".
+# IMMEDIATE transactions take the write lock at BEGIN, where that wait
+# applies; DEFERRED ones can fail at once when a read turns into a write.
+SQLITE_JOURNAL_MODE = config('SQLITE_JOURNAL_MODE', default='WAL')
+SQLITE_SYNCHRONOUS = config('SQLITE_SYNCHRONOUS', default='NORMAL')
+SQLITE_BUSY_TIMEOUT = config('SQLITE_BUSY_TIMEOUT', default=20, cast=float)
+SQLITE_TRANSACTION_MODE = config('SQLITE_TRANSACTION_MODE', default='IMMEDIATE')
+
+_connection_settings = {
+    'base_dir': BASE_DIR,
+    'conn_max_age': DB_CONN_MAX_AGE,
+    'conn_health_checks': DB_CONN_HEALTH_CHECKS,
+    'sqlite_timeout': SQLITE_BUSY_TIMEOUT,
+    'sqlite_transaction_mode': SQLITE_TRANSACTION_MODE,
+}
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(DATABASE_URL, **_connection_settings),
 }
 
+# The allocation write phase runs on the connection named here (see
+# counselling.db). Setting ALLOCATION_DATABASE_URL gives it a connection
+# of its own, e.g. to the primary when DATABASE_URL points at a replica.
+ALLOCATION_DATABASE_URL = config('ALLOCATION_DATABASE_URL', default='')
+ALLOCATION_DB_ALIAS = 'default'
+if ALLOCATION_DATABASE_URL:
+    ALLOCATION_DB_ALIAS = 'allocation'
+    DATABASES['allocation'] = database_config(ALLOCATION_DATABASE_URL, **_connection_settings)
+    DATABASES['allocation']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['counselling.db.AllocationRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -151,6 +192,110 @@ LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/'
 
+# Allocation rounds are queued for `manage.py allocation_worker` instead of
+# running inside the admin's request. Set to False to run them inline. The
+# reports of a round are built by the worker either way.
+ALLOCATION_RUN_IN_BACKGROUND = config('ALLOCATION_RUN_IN_BACKGROUND', default=True, cast=bool)
+
+# A running job stamps a heartbeat every ALLOCATION_JOB_HEARTBEAT_SECONDS.
+# One whose heartbeat is older than ALLOCATION_JOB_TIMEOUT_SECONDS is taken
+# to have died: it is marked failed and a new round can be queued. On
+# SQLite the stamps wait for the round's write transaction, so keep the
+# timeout above the longest write phase.
+ALLOCATION_JOB_HEARTBEAT_SECONDS = config('ALLOCATION_JOB_HEARTBEAT_SECONDS', default=10, cast=float)
+ALLOCATION_JOB_TIMEOUT_SECONDS = config('ALLOCATION_JOB_TIMEOUT_SECONDS', default=900, cast=int)
+
+# Dashboard statistics are maintained incrementally and cached per process
+# for this many seconds; run `manage.py reconcile_stats` periodically to
+# recount them from scratch.
+ALLOCATION_STATS_CACHE_SECONDS = config('ALLOCATION_STATS_CACHE_SECONDS', default=5, cast=int)
+
+# A first round with at least ALLOCATION_PARALLEL_MIN_PREFERENCES
+# preferences is split into course partitions that share no applicants and
+# matched in ALLOCATION_WORKERS processes (0 means one per CPU core).
+ALLOCATION_WORKERS = config('ALLOCATION_WORKERS', default=0, cast=int)
+ALLOCATION_PARALLEL_MIN_PREFERENCES = config('ALLOCATION_PARALLEL_MIN_PREFERENCES', default=200000, cast=int)
+
+# What-if simulations start from an in-memory snapshot of the preferences,
+# seats and their match, kept per process for this many seconds or until
+# the next committed round.
+SIMULATION_SNAPSHOT_SECONDS = config('SIMULATION_SNAPSHOT_SECONDS', default=300, cast=int)
+
+# Values memoised per process, such as the counselling settings and the
+# rank predictor's cut-off index, follow a stamp in the cache, which reaches
+# other processes only if they share the cache. Every MEMO_RECHECK_SECONDS
+# they are also checked against the database, which bounds how stale they
+# get with a per-process cache.
+MEMO_RECHECK_SECONDS = config('MEMO_RECHECK_SECONDS', default=5, cast=int)
+
+# Seconds the public seat-availability list is cached; it is also dropped
+# whenever a course's seat counter changes in this process.
+SEAT_AVAILABILITY_CACHE_SECONDS = config('SEAT_AVAILABILITY_CACHE_SECONDS', default=10, cast=int)
+
+# Seconds clients may reuse a rank prediction. The cut-off index behind it
+# is rebuilt in every process once a round commits (see MEMO_RECHECK_SECONDS).
+RANK_PREDICTOR_CACHE_SECONDS = config('RANK_PREDICTOR_CACHE_SECONDS', default=60, cast=int)
+
+# Seconds a serialized course catalogue is kept. Course and college changes
+# start a new catalogue version at once; this bounds how long other
+# processes sharing no cache with the writer can serve the old one.
+COURSE_CATALOGUE_CACHE_SECONDS = config('COURSE_CATALOGUE_CACHE_SECONDS', default=300, cast=int)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'counselling',
+    }
+}
+
+# Payments go through the gateway class named here (see counselling.payments).
+# The mock gateway finishes each charge after PAYMENT_MOCK_LATENCY seconds,
+# failing PAYMENT_MOCK_FAILURE_RATE of them, and reports the outcome from a
+# background thread unless PAYMENT_MOCK_CALLBACKS is off. Run
+# `manage.py settle_payments` periodically for callbacks that never arrive.
+PAYMENT_GATEWAY = config('PAYMENT_GATEWAY', default='counselling.payments.MockGateway')
+PAYMENT_MOCK_LATENCY = config('PAYMENT_MOCK_LATENCY', default=0.5, cast=float)
+PAYMENT_MOCK_FAILURE_RATE = config('PAYMENT_MOCK_FAILURE_RATE', default=0.1, cast=float)
+PAYMENT_MOCK_CALLBACKS = config('PAYMENT_MOCK_CALLBACKS', default=True, cast=bool)
+PAYMENT_CALLBACK_SECRET = config('PAYMENT_CALLBACK_SECRET', default=SECRET_KEY)
+
+# Report artifacts written after each allocation round: 'csv' or 'parquet'
+# (Parquet needs pyarrow or fastparquet and falls back to CSV without one).
+REPORT_FILE_FORMAT = config('REPORT_FILE_FORMAT', default='csv')
+
+# Request instrumentation (counselling.instrumentation). A request running
+# one SQL statement N_PLUS_ONE_THRESHOLD or more times, or taking longer
+# than SLOW_REQUEST_MS, is logged as a warning; per-view histograms are
+# served at /counselling/admin/api/metrics/.
+N_PLUS_ONE_THRESHOLD = config('N_PLUS_ONE_THRESHOLD', default=10, cast=int)
+SLOW_REQUEST_MS = config('SLOW_REQUEST_MS', default=1000, cast=int)
+
+# Logging. Set LOG_LEVEL=DEBUG for one line per request with its query
+# count and timings; REQUEST_LOG_FILE also writes the counselling logs to
+# that file.
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+REQUEST_LOG_FILE = config('REQUEST_LOG_FILE', default='')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '{asctime} {levelname} {name}: {message}', 'style': '{'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'counselling': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+        'reports': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
+if REQUEST_LOG_FILE:
+    LOGGING['handlers']['file'] = {
+        'class': 'logging.handlers.WatchedFileHandler', 'filename': REQUEST_LOG_FILE, 'formatter': 'simple',
+    }
+    LOGGING['loggers']['counselling']['handlers'].append('file')
+
 # Messages
 from django.contrib.messages import constants as messages
 
@@ -0,0 +1,28 @@
+"""
+SQLite backend that can begin transactions IMMEDIATE.
+
+A deferred transaction that reads and then writes has to upgrade its lock
+part way through; when another writer got there first SQLite fails at once
+with "database is locked" instead of waiting out the busy timeout. With
+OPTIONS {'transaction_mode': 'IMMEDIATE'} the write lock is taken at BEGIN,
+where the timeout applies. Django 5.1 accepts the same option natively.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    transaction_modes = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        mode = params.pop('transaction_mode', None)
+        if mode is not None and mode.upper() not in self.transaction_modes:
+            raise ValueError(f"transaction_mode must be one of {', '.join(self.transaction_modes)}")
+        self.transaction_mode = mode.upper() if mode else None
+        return params
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        else:
+            super()._start_transaction_under_autocommit()
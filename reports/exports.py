@@ -0,0 +1,131 @@
+"""
+Streaming exports of allocation results.
+
+Rows come from a values_list() iterator that fetches EXPORT_CHUNK_SIZE rows
+at a time, so memory stays flat however many allocations there are. CSV is
+streamed as it is generated, optionally gzipped. XLSX is written with
+openpyxl's write-only mode to a temporary file and streamed from there,
+because the zip container can only be finished once every row is known.
+"""
+import csv
+import io
+import tempfile
+import zlib
+
+from django.db.models import Value
+from django.db.models.functions import Concat, Trim
+from django.http import FileResponse, HttpResponseBadRequest, StreamingHttpResponse
+from openpyxl import Workbook
+
+from counselling.models import Allocation
+
+
+EXPORT_CHUNK_SIZE = 5000
+
+# Excel's row limit per sheet; longer exports continue on another sheet
+XLSX_MAX_ROWS = 1048576
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+
+def allocation_rows(fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield one row per allocation in rank order. fields are values_list()
+    lookups, plus 'student_name' for the student's full name.
+    """
+    allocations = Allocation.objects.annotate(
+        student_name=Trim(Concat('student__user__first_name', Value(' '), 'student__user__last_name')),
+    ).order_by('student__rank').values_list(*fields)
+    date_columns = [i for i, field in enumerate(fields) if field == 'allocated_at']
+    for values in allocations.iterator(chunk_size=chunk_size):
+        if date_columns:
+            values = list(values)
+            for i in date_columns:
+                values[i] = values[i].strftime('%Y-%m-%d %H:%M:%S')
+        yield values
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_csv(header, rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """Encoded CSV: the header straight away, then one bytes block per chunk of rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def drain():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writerow(header)
+    yield drain()
+    for chunk in _chunks(rows, chunk_size):
+        writer.writerows(chunk)
+        yield drain()
+
+
+def gzip_stream(blocks):
+    """Gzip an iterable of bytes blocks without buffering the whole output"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def write_xlsx(header, rows, file, title='Allocations'):
+    """Write rows to file as an XLSX workbook in openpyxl's write-only mode"""
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = XLSX_MAX_ROWS
+    for row in rows:
+        if sheet_rows >= XLSX_MAX_ROWS:
+            sheet = workbook.create_sheet(title if sheet is None else f"{title} {len(workbook.worksheets) + 1}")
+            sheet.append(header)
+            sheet_rows = 1
+        sheet.append(row)
+        sheet_rows += 1
+    if sheet is None:
+        workbook.create_sheet(title).append(header)
+    workbook.save(file)
+
+
+def export_response(request, filename, header, rows):
+    """
+    Stream rows in the format requested by ?format=csv|xlsx (default csv);
+    ?gzip=1 compresses CSV output.
+    """
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(f"Unknown export format: {export_format}")
+
+    if export_format == 'xlsx':
+        file = tempfile.TemporaryFile()
+        write_xlsx(header, rows, file)
+        file.seek(0)
+        return FileResponse(
+            file,
+            as_attachment=True,
+            filename=f'{filename}.xlsx',
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+
+    content = iter_csv(header, rows)
+    if request.GET.get('gzip') in ('1', 'true'):
+        response = StreamingHttpResponse(gzip_stream(content), content_type='application/gzip')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv.gz"'
+    else:
+        response = StreamingHttpResponse(content, content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
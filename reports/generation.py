@@ -0,0 +1,230 @@
+"""
+Report artifacts built after each allocation round.
+
+Each report is a pandas DataFrame assembled from a handful of values()
+querysets, most of them aggregated in the database, and written under
+MEDIA_ROOT/reports. A Report row records where the file is, so downloads
+serve the stored file instead of querying the database again. The reports
+of a round are built by `manage.py allocation_worker` once it has no job
+waiting, never inside a request.
+"""
+import logging
+import os
+
+import pandas as pd
+from django.conf import settings
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+
+from accounts.models import StudentProfile
+from colleges.models import Course
+from counselling.allocation import CATEGORIES, SeatMatrix
+from counselling.models import Allocation, CounsellingRound, Payment
+from counselling.seats import HELD_STATUSES
+from students.models import StudentPreference
+from .models import Report
+
+logger = logging.getLogger(__name__)
+
+REPORTS_DIR = 'reports'
+
+# Rows fetched per round trip when reading per-student data
+CHUNK_SIZE = 5000
+
+
+def _frame(queryset, columns):
+    """DataFrame from a values_list() queryset, read in chunks"""
+    return pd.DataFrame.from_records(queryset.values_list(*columns).iterator(chunk_size=CHUNK_SIZE), columns=columns)
+
+
+def _courses():
+    frame = _frame(
+        Course.objects.order_by('id'),
+        ['id', 'college__college_code', 'college__college_name', 'course_code', 'course_name',
+         'department', 'degree_type', 'total_seats'],
+    )
+    return frame.rename(columns={
+        'id': 'course_id', 'college__college_code': 'college_code', 'college__college_name': 'college_name',
+    })
+
+
+def student_analytics():
+    """One row per student: payment, preferences, first choice and allocation"""
+    students = _frame(
+        StudentProfile.objects.order_by('rank'), ['id', 'roll_number', 'rank', 'category', 'token_paid']
+    ).rename(columns={'id': 'student_id'})
+    payments = _frame(Payment.objects.filter(purpose=Payment.FEE), ['student_id', 'status']).rename(
+        columns={'status': 'payment_status'}
+    )
+    preferences = pd.DataFrame.from_records(
+        StudentPreference.objects.values('student_id').annotate(preferences=Count('id')).values_list(
+            'student_id', 'preferences'
+        ).iterator(chunk_size=CHUNK_SIZE),
+        columns=['student_id', 'preferences'],
+    )
+    courses = _courses()[['course_id', 'course_code', 'course_name', 'college_name']]
+    first_choices = _frame(
+        StudentPreference.objects.filter(preference_order=1), ['student_id', 'course_id']
+    ).merge(courses[['course_id', 'course_code']], on='course_id').rename(columns={'course_code': 'first_choice'})
+    allocations = _frame(
+        Allocation.objects.all(),
+        ['student_id', 'course_id', 'preference_number', 'seat_category', 'status', 'round_number'],
+    ).merge(courses, on='course_id').rename(columns={
+        'course_code': 'allocated_course_code', 'course_name': 'allocated_course',
+        'college_name': 'allocated_college', 'status': 'allocation_status',
+    })
+
+    frame = (
+        students
+        .merge(payments, on='student_id', how='left')
+        .merge(preferences, on='student_id', how='left')
+        .merge(first_choices[['student_id', 'first_choice']], on='student_id', how='left')
+        .merge(allocations.drop(columns='course_id'), on='student_id', how='left')
+    )
+    frame['preferences'] = frame['preferences'].fillna(0).astype(int)
+    return frame.drop(columns='student_id')
+
+
+def college_analytics():
+    """One row per course: demand, seats filled and the rank range admitted"""
+    courses = _courses()
+    demand = pd.DataFrame.from_records(
+        StudentPreference.objects.values('course_id').annotate(
+            applicants=Count('id'), first_choice_demand=Count('id', filter=Q(preference_order=1)),
+        ).values_list('course_id', 'applicants', 'first_choice_demand'),
+        columns=['course_id', 'applicants', 'first_choice_demand'],
+    )
+    filled = pd.DataFrame.from_records(
+        Allocation.objects.exclude(status='WITHDRAWN').values('course_id').annotate(
+            allocated=Count('id'),
+            confirmed=Count('id', filter=Q(status='CONFIRMED')),
+            opening_rank=Min('student__rank'),
+            closing_rank=Max('student__rank'),
+        ).values_list('course_id', 'allocated', 'confirmed', 'opening_rank', 'closing_rank'),
+        columns=['course_id', 'allocated', 'confirmed', 'opening_rank', 'closing_rank'],
+    )
+
+    frame = courses.merge(demand, on='course_id', how='left').merge(filled, on='course_id', how='left')
+    counts = ['applicants', 'first_choice_demand', 'allocated', 'confirmed']
+    frame[counts] = frame[counts].fillna(0).astype(int)
+    frame['vacant'] = (frame['total_seats'] - frame['allocated']).clip(lower=0)
+    frame['utilization_percentage'] = (
+        frame['allocated'] / frame['total_seats'].where(frame['total_seats'] > 0)
+    ).fillna(0).mul(100).round(2)
+    return frame.drop(columns='course_id')
+
+
+def round_summary():
+    """One row per counselling round, with the seats it made still held by category"""
+    rounds = _frame(
+        CounsellingRound.objects.order_by('number'),
+        ['number', 'started_at', 'completed_at', 'students_processed', 'new_allocations', 'upgrades'],
+    ).rename(columns={'number': 'round_number'})
+    held = pd.DataFrame.from_records(
+        Allocation.objects.exclude(status='WITHDRAWN').values('round_number', 'seat_category').annotate(
+            seats=Count('id')
+        ).values_list('round_number', 'seat_category', 'seats'),
+        columns=['round_number', 'seat_category', 'seats'],
+    )
+    by_category = held.pivot_table(
+        index='round_number', columns='seat_category', values='seats', aggfunc='sum', fill_value=0
+    ).reindex(columns=CATEGORIES, fill_value=0).add_prefix('held_').reset_index()
+
+    frame = rounds.merge(by_category, on='round_number', how='left')
+    held_columns = [f'held_{category}' for category in CATEGORIES]
+    frame[held_columns] = frame[held_columns].fillna(0).astype(int)
+    frame['seats_held'] = frame[held_columns].sum(axis=1)
+    for column in ('started_at', 'completed_at'):
+        frame[column] = frame[column].astype(str)
+    return frame
+
+
+def seat_matrix():
+    """One row per course and quota category: seats, filled and vacant"""
+    matrix = SeatMatrix.load()
+    held = pd.DataFrame.from_records(
+        Allocation.objects.filter(status__in=HELD_STATUSES).values('course_id', 'seat_category').annotate(
+            filled=Count('id')
+        ).values_list('course_id', 'seat_category', 'filled'),
+        columns=['course_id', 'category', 'filled'],
+    )
+    filled = held.pivot_table(
+        index='course_id', columns='category', values='filled', aggfunc='sum', fill_value=0
+    ).reindex(index=matrix.course_ids, columns=CATEGORIES, fill_value=0)
+    # Open seats held beyond the open pool leave the released quotas they came from without vacancies
+    vacant = matrix.vacancies(filled.to_numpy(dtype='int64'))
+
+    def melt(values, name):
+        frame = pd.DataFrame(values, columns=CATEGORIES)
+        frame['course_id'] = matrix.course_ids
+        return frame.melt(id_vars='course_id', var_name='category', value_name=name)
+
+    courses = _courses()[['course_id', 'college_code', 'college_name', 'course_code', 'course_name']]
+    frame = courses.merge(melt(matrix.seats, 'seats'), on='course_id')
+    for values, name in ((filled.to_numpy(), 'filled'), (vacant, 'vacant')):
+        frame = frame.merge(melt(values, name), on=['course_id', 'category'])
+    return frame.drop(columns='course_id')
+
+
+REPORT_BUILDERS = {
+    'student_analytics': student_analytics,
+    'college_analytics': college_analytics,
+    'round_summary': round_summary,
+    'seat_matrix': seat_matrix,
+}
+
+
+def write_frame(frame, path_without_extension):
+    """
+    Write frame as Parquet when REPORT_FILE_FORMAT asks for it and a Parquet
+    engine is installed, otherwise as CSV. Returns the path written.
+    """
+    if settings.REPORT_FILE_FORMAT == 'parquet':
+        path = path_without_extension + '.parquet'
+        try:
+            frame.to_parquet(path, index=False)
+            return path
+        except ImportError:
+            logger.warning("No Parquet engine installed; writing %s as CSV", os.path.basename(path))
+    path = path_without_extension + '.csv'
+    frame.to_csv(path, index=False)
+    return path
+
+
+def generate_reports(user=None, report_types=None):
+    """Build and store the given report types (default: all); returns the Report rows"""
+    latest_round = CounsellingRound.latest()
+    stamp = timezone.now().strftime('%Y%m%d-%H%M%S-%f')
+    folder = f"round_{latest_round.number}_{stamp}" if latest_round else stamp
+    directory = os.path.join(settings.MEDIA_ROOT, REPORTS_DIR, folder)
+    os.makedirs(directory, exist_ok=True)
+
+    labels = dict(Report.REPORT_TYPES)
+    reports = []
+    for report_type in report_types or REPORT_BUILDERS:
+        frame = REPORT_BUILDERS[report_type]()
+        path = write_frame(frame, os.path.join(directory, report_type))
+        name = labels[report_type]
+        if latest_round:
+            name = f"{name} - Round {latest_round.number}"
+        reports.append(Report.objects.create(
+            name=name,
+            report_type=report_type,
+            file_path=os.path.relpath(path, settings.MEDIA_ROOT),
+            generated_by=user,
+        ))
+    return reports
+
+
+def generate_round_reports():
+    """Build every report older than the latest round, whether it ran in a job or inline; returns the Report rows"""
+    latest_round = CounsellingRound.latest()
+    if latest_round is None or latest_round.completed_at is None:
+        return []
+    stale = [
+        report_type for report_type in REPORT_BUILDERS
+        if not Report.objects.filter(report_type=report_type, generated_at__gte=latest_round.completed_at).exists()
+    ]
+    if not stale:
+        return []
+    return generate_reports(report_types=stale)
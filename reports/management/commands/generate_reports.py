@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.generation import REPORT_BUILDERS, generate_reports
+
+
+class Command(BaseCommand):
+    help = "Rebuild the report artifacts from the current allocation data"
+
+    def add_arguments(self, parser):
+        parser.add_argument('report_types', nargs='*', help=f"Any of {', '.join(REPORT_BUILDERS)} (default: all)")
+
+    def handle(self, *args, **options):
+        unknown = set(options['report_types']) - set(REPORT_BUILDERS)
+        if unknown:
+            raise CommandError(f"Unknown report types: {', '.join(sorted(unknown))}")
+
+        for report in generate_reports(report_types=options['report_types'] or None):
+            self.stdout.write(f"{report.name}: {report.file_path}")
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 09:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0003_report_generated_by_optional'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['report_type', 'generated_at'], name='report_type_generated_idx'),
+        ),
+    ]
@@ -1,3 +1,6 @@
+import os
+
+from django.conf import settings
 from django.db import models
 
 class Report(models.Model):
@@ -12,12 +15,20 @@ class Report(models.Model):
     
     name = models.CharField(max_length=200)
     report_type = models.CharField(max_length=30, choices=REPORT_TYPES)
-    file_path = models.CharField(max_length=500, blank=True)
-    generated_by = models.ForeignKey('accounts.User', on_delete=models.CASCADE)
+    file_path = models.CharField(max_length=500, blank=True)  # Relative to MEDIA_ROOT
+    generated_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True, blank=True)  # Empty when generated after a round
     generated_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-generated_at']
+        indexes = [
+            # Latest report of each type
+            models.Index(fields=['report_type', 'generated_at'], name='report_type_generated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.get_report_type_display()}"
+    
+    @property
+    def absolute_path(self):
+        return os.path.join(settings.MEDIA_ROOT, self.file_path)
@@ -1,11 +1,15 @@
-from django.shortcuts import render, redirect
-from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
+from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.http import FileResponse, Http404, HttpResponse
 from django.contrib import messages
+from django.db.models import Subquery
+from .exports import allocation_rows, export_response
+from .generation import generate_reports
 from .models import Report
 from accounts.models import StudentProfile
 from colleges.models import Course
-from counselling.models import Allocation
+from counselling.models import Allocation, CounsellingRound, CourseRoundSummary
+from counselling.views import is_super_admin
 from students.models import StudentPreference
 import pandas as pd
 from django.conf import settings
@@ -27,42 +31,79 @@ def reports_dashboard(request):
         'total_students': StudentProfile.objects.count(),
         'total_allocations': Allocation.objects.count(),
         'total_courses': Course.objects.count(),
+        'reports': latest_reports(),
     }
     return render(request, 'reports/dashboard.html', context)
 
 @login_required  
 def export_allocations(request):
-    """Export allocation results to CSV"""
-    # Create CSV response
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="allocations.csv"'
-    
-    # Write CSV data
-    import csv
-    writer = csv.writer(response)
-    writer.writerow(['Student', 'Course', 'College', 'Preference Number', 'Allocated Date'])
-    
-    allocations = Allocation.objects.select_related('student__user', 'course__college')
-    for allocation in allocations:
-        writer.writerow([
-            allocation.student.user.get_full_name(),
-            allocation.course.name,
-            allocation.course.college.name,
-            allocation.preference_number,
-            allocation.allocated_at.strftime('%Y-%m-%d %H:%M:%S')
-        ])
+    """Export allocation results as CSV (optionally gzipped) or XLSX, streamed"""
+    header = ['Student', 'Course', 'College', 'Preference Number', 'Allocated Date']
+    rows = allocation_rows([
+        'student_name', 'course__course_name', 'course__college__college_name', 'preference_number', 'allocated_at',
+    ])
+    return export_response(request, 'allocations', header, rows)
+
+@login_required
+def cutoff_ranks(request):
+    """Opening and closing ranks and fill per course and category for a round (?round=N, default latest)"""
+    rounds = CounsellingRound.objects.order_by('-number')
+    if request.GET.get('round', '').isdigit():
+        rounds = rounds.filter(number=int(request.GET['round']))
+    summaries = CourseRoundSummary.objects.filter(round=Subquery(rounds.values('pk')[:1])).order_by(
+        'course__college__college_name', 'course__course_name', 'category'
+    )
+    if 'format' in request.GET:
+        header = ['Round', 'College', 'Course Code', 'Course', 'Category', 'Seats', 'Opening Rank', 'Closing Rank',
+                  'Filled', 'Vacant']
+        rows = summaries.values_list(
+            'round__number', 'course__college__college_name', 'course__course_code', 'course__course_name',
+            'category', 'seats', 'opening_rank', 'closing_rank', 'filled', 'vacant',
+        ).iterator(chunk_size=2000)
+        return export_response(request, 'cutoff_ranks', header, rows)
     
-    return response
+    summaries = list(summaries.select_related('round', 'course__college'))
+    return render(request, 'reports/cutoffs.html', {
+        'summaries': summaries,
+        'counselling_round': summaries[0].round if summaries else None,
+    })
+
+def latest_reports():
+    """Most recent Report of each type, in REPORT_TYPES order; one index lookup per type"""
+    latest = (Report.objects.filter(report_type=report_type).first() for report_type, label in Report.REPORT_TYPES)
+    return [report for report in latest if report is not None]
 
-# Simplified views - complex reporting disabled for now
+@login_required
+@user_passes_test(is_super_admin)
+def download_report(request, report_id):
+    """Serve a stored report file without touching the data it was built from"""
+    report = get_object_or_404(Report, pk=report_id)
+    if not report.file_path or not os.path.exists(report.absolute_path):
+        raise Http404("Report file is missing")
+    return FileResponse(open(report.absolute_path, 'rb'), as_attachment=True,
+                        filename=os.path.basename(report.file_path))
+
+def serve_latest_report(request, report_type):
+    """Download the latest report of a type, building it first if none exists yet"""
+    report = Report.objects.filter(report_type=report_type).first()
+    if report is None or not os.path.exists(report.absolute_path):
+        report = generate_reports(user=request.user, report_types=[report_type])[0]
+    return redirect('reports:download_report', report_id=report.pk)
+
+@login_required
+@user_passes_test(is_super_admin)
 def generate_allocation_report(request):
-    """Simplified allocation report"""
-    return redirect('reports:dashboard')
+    """Student analytics: payment, preferences and allocation per student"""
+    return serve_latest_report(request, 'student_analytics')
 
+@login_required
+@user_passes_test(is_super_admin)
 def generate_preference_report(request):
-    """Simplified preference report"""  
-    return redirect('reports:dashboard')
+    """Student analytics, which lists each student's preference count and first choice"""
+    return serve_latest_report(request, 'student_analytics')
 
+@login_required
+@user_passes_test(is_super_admin)
 def generate_college_report(request):
-    """Simplified college report"""
-    return redirect('reports:dashboard')
+    """College analytics: demand and seats filled per course"""
+    return serve_latest_report(request, 'college_analytics')
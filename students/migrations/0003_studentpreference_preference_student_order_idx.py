@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0002_alter_studentchoice_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studentpreference',
+            index=models.Index(fields=['student', 'preference_order'], name='preference_student_order_idx'),
+        ),
+    ]
@@ -14,6 +14,10 @@ class StudentPreference(models.Model):
     class Meta:
         unique_together = ['student', 'course']
         ordering = ['student', 'preference_order']
+        indexes = [
+            # A student's list in order, without a sort
+            models.Index(fields=['student', 'preference_order'], name='preference_student_order_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.roll_number} - {self.preference_order}. {self.course.course_name}"
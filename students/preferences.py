@@ -0,0 +1,101 @@
+"""
+Validated, transactional preference submission.
+
+A submission is the full ordered list of course ids. It is checked against
+one query for the active courses it names and then applied as a diff:
+rows for dropped courses are deleted, moved courses are re-numbered with
+bulk_update and new courses are added with bulk_create, all in one
+transaction. The number of queries does not depend on the list length.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import StudentProfile
+from colleges.models import Course
+from counselling import stats
+from .models import StudentPreference
+
+
+MAX_PREFERENCES = 100
+
+
+class PreferenceError(Exception):
+    """Raised when a submitted preference list is invalid"""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def validate_course_ids(raw_ids):
+    """Return the submitted course ids as ints, or raise PreferenceError"""
+    if not isinstance(raw_ids, (list, tuple)):
+        raise PreferenceError(["course_ids must be a list."])
+
+    errors = []
+    course_ids = []
+    for position, raw_id in enumerate(raw_ids, start=1):
+        if raw_id in ('', None):
+            continue
+        try:
+            course_ids.append(int(raw_id))
+        except (TypeError, ValueError):
+            errors.append(f"Preference {position}: '{raw_id}' is not a course id.")
+
+    if len(course_ids) > MAX_PREFERENCES:
+        errors.append(f"At most {MAX_PREFERENCES} preferences are allowed.")
+    seen = set()
+    duplicates = {course_id for course_id in course_ids if course_id in seen or seen.add(course_id)}
+    if duplicates:
+        errors.append(f"Courses listed more than once: {', '.join(map(str, sorted(duplicates)))}.")
+    if errors:
+        raise PreferenceError(errors)
+
+    available = set(Course.objects.filter(id__in=course_ids, is_active=True).values_list('id', flat=True))
+    unknown = [course_id for course_id in course_ids if course_id not in available]
+    if unknown:
+        raise PreferenceError([f"Unknown or inactive courses: {', '.join(map(str, unknown))}."])
+    return course_ids
+
+
+def save_preferences(student, course_ids):
+    """
+    Replace the student's preferences with course_ids (already validated),
+    in order. Returns counts of created, updated, deleted and unchanged rows.
+    """
+    wanted = {course_id: order for order, course_id in enumerate(course_ids, start=1)}
+    with transaction.atomic():
+        # Locks the student even before a first submission, when there are no preference rows to lock
+        StudentProfile.objects.select_for_update().only('pk').get(pk=student.pk)
+        existing = list(StudentPreference.objects.filter(student=student))
+        # Bulk writes skip the signals that keep the dashboard statistics current
+        stats.record_preference_change(student.pk, bool(existing))
+
+        now = timezone.now()
+        stale = [preference.pk for preference in existing if preference.course_id not in wanted]
+        moved = []
+        for preference in existing:
+            order = wanted.get(preference.course_id)
+            if order is not None and preference.preference_order != order:
+                preference.preference_order = order
+                preference.updated_at = now
+                moved.append(preference)
+        kept = {preference.course_id for preference in existing}
+        new = [
+            StudentPreference(student=student, course_id=course_id, preference_order=order)
+            for course_id, order in wanted.items() if course_id not in kept
+        ]
+
+        if stale:
+            StudentPreference.objects.filter(pk__in=stale).delete()
+        if moved:
+            StudentPreference.objects.bulk_update(moved, ['preference_order', 'updated_at'])
+        if new:
+            StudentPreference.objects.bulk_create(new)
+
+    return {
+        'created': len(new),
+        'updated': len(moved),
+        'deleted': len(stale),
+        'unchanged': len(existing) - len(stale) - len(moved),
+    }
@@ -0,0 +1,151 @@
+import json
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User, StudentProfile, CollegeProfile
+from colleges.models import Course
+from counselling.models import AllocationStatistics
+from .models import StudentPreference
+
+
+class PreferenceApiTests(TestCase):
+
+    def setUp(self):
+        college_user = User.objects.create(username='college', user_type='college_admin')
+        college = CollegeProfile.objects.create(
+            user=college_user, college_name='College', college_code='C1',
+            address='Somewhere', established_year=1990,
+        )
+        self.course_ids = [
+            Course.objects.create(
+                college=college, course_name=f'Course {i}', course_code=f'K{i}',
+                department='CSE', degree_type='B.Tech', total_seats=10, fee_per_year=1000,
+            ).pk
+            for i in range(120)
+        ]
+        user = User.objects.create(username='student', user_type='student')
+        self.student = StudentProfile.objects.create(user=user, roll_number='R1', rank=1)
+        self.client.force_login(user)
+        self.url = reverse('students:preferences_api')
+
+    def submit(self, course_ids):
+        return self.client.post(self.url, json.dumps({'course_ids': course_ids}), content_type='application/json')
+
+    def saved(self):
+        return list(self.student.preferences.order_by('preference_order').values_list('course_id', flat=True))
+
+    def test_submission_is_applied_as_a_diff(self):
+        a, b, c, d = self.course_ids[:4]
+        self.submit([a, b, c])
+        original = {p.course_id: p.pk for p in self.student.preferences.all()}
+
+        response = self.submit([c, a, d])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['changes'], {'created': 1, 'updated': 2, 'deleted': 1, 'unchanged': 0})
+        self.assertEqual(self.saved(), [c, a, d])
+        # Kept courses keep their rows
+        self.assertEqual(StudentPreference.objects.get(student=self.student, course_id=a).pk, original[a])
+        self.assertEqual(self.client.get(self.url).json(), {'course_ids': [c, a, d]})
+
+    def test_query_count_does_not_grow_with_the_list(self):
+        self.submit(self.course_ids[100:105])  # creates the settings row
+        counts = []
+        for course_ids in (self.course_ids[:5], self.course_ids[5:100]):
+            with self.captureOnCommitCallbacks(execute=True):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.submit(course_ids)
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_invalid_list_changes_nothing(self):
+        a, b = self.course_ids[:2]
+        self.submit([a])
+        Course.objects.filter(pk=b).update(is_active=False)
+
+        for course_ids, error in (([a, a], 'more than once'), ([b], 'inactive'), (['x'], 'not a course id'),
+                                  (self.course_ids[:101], 'At most')):
+            response = self.submit(course_ids)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(error, ' '.join(response.json()['errors']))
+        self.assertEqual(self.saved(), [a])
+
+    def test_statistics_follow_bulk_writes(self):
+        AllocationStatistics.calculate_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.submit(self.course_ids[:3])
+        self.assertEqual(AllocationStatistics.objects.get(pk=1).students_with_preferences, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.submit([])
+        self.assertEqual(AllocationStatistics.objects.get(pk=1).students_with_preferences, 0)
+
+    def test_form_view_uses_the_same_validation(self):
+        a, b = self.course_ids[:2]
+        response = self.client.post(reverse('students:fill_preferences'), {'courses': [b, a]})
+        self.assertRedirects(response, reverse('students:student_dashboard'), fetch_redirect_response=False)
+        self.assertEqual(self.saved(), [b, a])
+
+        self.client.post(reverse('students:fill_preferences'), {'courses': [a, a]})
+        self.assertEqual(self.saved(), [b, a])
+
+
+class CourseCatalogueTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        college_user = User.objects.create(username='college', user_type='college_admin')
+        self.college = CollegeProfile.objects.create(
+            user=college_user, college_name='College', college_code='C1',
+            address='Somewhere', established_year=1990,
+        )
+        for i, (department, degree_type) in enumerate([('CSE', 'B.Tech'), ('CSE', 'M.Tech'), ('Civil', 'B.Tech')]):
+            Course.objects.create(
+                college=self.college, course_name=f'{department} {degree_type}', course_code=f'K{i}',
+                department=department, degree_type=degree_type, total_seats=10, fee_per_year=1000,
+            )
+        user = User.objects.create(username='student', user_type='student')
+        StudentProfile.objects.create(user=user, roll_number='R1', rank=1)
+        self.client.force_login(user)
+
+    def course_names(self, **filters):
+        response = self.client.get(reverse('students:course_catalogue_api'), filters)
+        return [course['course_name'] for course in response.json()['courses']]
+
+    def test_filters_are_applied_on_the_server(self):
+        self.assertEqual(len(self.course_names()), 3)
+        self.assertEqual(self.course_names(department='CSE', degree_type='B.Tech'), ['CSE B.Tech'])
+        self.assertEqual(self.course_names(q='civil'), ['Civil B.Tech'])
+        self.assertEqual(self.course_names(college='OTHER'), [])
+
+        response = self.client.get(reverse('students:course_catalogue'), {'degree_type': 'M.Tech'})
+        self.assertContains(response, 'CSE M.Tech')
+        self.assertContains(response, '10 of 10 available')
+        self.assertNotContains(response, 'CSE B.Tech')
+
+        response = self.client.get(reverse('students:fill_preferences'))
+        self.assertContains(response, '<option value="C1">College</option>', html=True)
+
+    def test_cached_list_is_served_without_course_queries(self):
+        url = reverse('students:course_catalogue')
+        first = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse([q for q in queries if 'colleges_course' in q['sql']])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_course_changes_start_a_new_version(self):
+        url = reverse('students:course_catalogue_api')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.get(course_code='K0').delete()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('CSE B.Tech', [course['course_name'] for course in response.json()['courses']])
@@ -6,5 +6,8 @@ app_name = 'students'
 urlpatterns = [
     path('dashboard/', views.student_dashboard, name='student_dashboard'),
     path('preferences/', views.fill_preferences, name='fill_preferences'),
+    path('preferences/courses/', views.course_catalogue, name='course_catalogue'),
+    path('api/courses/', views.course_catalogue_api, name='course_catalogue_api'),
+    path('api/preferences/', views.preferences_api, name='preferences_api'),
     path('payment/', views.make_payment, name='make_payment'),
 ]
@@ -1,13 +1,26 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_GET, require_http_methods
 from .models import StudentPreference
-from colleges.models import Course
+from .preferences import PreferenceError, save_preferences, validate_course_ids
+from colleges.catalogue import catalogue_filters, filter_courses, filters_etag, get_catalogue
 from accounts.models import StudentProfile
 from counselling.models import Allocation, CounsellingSettings, Payment
+from counselling.payments import request_idempotency_key, start_payment
+from counselling.seats import seat_availability
+from decimal import Decimal
+import json
 import uuid
 
+# Token amount charged once a seat is allocated
+TOKEN_AMOUNT = Decimal('5000.00')
+
 @login_required
 def student_dashboard(request):
     """Student dashboard"""
@@ -42,36 +55,31 @@ def fill_preferences(request):
     student = get_object_or_404(StudentProfile, user=request.user)
     
     if request.method == 'POST':
-        # Clear existing preferences
-        StudentPreference.objects.filter(student=student).delete()
-        
-        # Get selected courses and their order
-        course_ids = request.POST.getlist('courses')
-        for index, course_id in enumerate(course_ids):
-            if course_id:
-                course = Course.objects.get(id=course_id)
-                StudentPreference.objects.create(
-                    student=student,
-                    course=course,
-                    preference_order=index + 1
-                )
+        try:
+            course_ids = validate_course_ids(request.POST.getlist('courses'))
+        except PreferenceError as e:
+            for error in e.errors:
+                messages.error(request, error)
+            return redirect('students:fill_preferences')
+        save_preferences(student, course_ids)
         
         messages.success(request, 'Preferences saved successfully!')
         return redirect('students:student_dashboard')
     
-    # Get all available courses
-    courses = Course.objects.filter(is_active=True).select_related('college')
-    existing_preferences = StudentPreference.objects.filter(student=student).order_by('preference_order')
+    # The course list itself is loaded from course_catalogue with the chosen filters
+    existing_preferences = StudentPreference.objects.filter(student=student).select_related(
+        'course__college'
+    ).order_by('preference_order')
     
     context = {
-        'courses': courses,
+        'catalogue': get_catalogue(),
         'existing_preferences': existing_preferences,
     }
     return render(request, 'students/fill_preferences.html', context)
 
 @login_required
 def make_payment(request):
-    """Mock payment for allocated course"""
+    """Token payment for allocated course"""
     if request.user.user_type != 'student':
         return redirect('home')
     
@@ -88,24 +96,99 @@ def make_payment(request):
         return redirect('students:student_dashboard')
     
     if request.method == 'POST':
-        # Mock payment processing
-        payment = Payment.objects.create(
-            student=student,
-            amount=5000.00,  # Mock payment amount
-            payment_method=request.POST.get('payment_method', 'credit_card'),
-            status='COMPLETED',
-            transaction_id=str(uuid.uuid4()),
-        )
+        payment_method = request.POST.get('payment_method')
+        if payment_method not in dict(Payment.PAYMENT_METHOD_CHOICES):
+            messages.error(request, 'Please select a payment method.')
+            return redirect('students:make_payment')
         
-        # Update student profile
-        student.token_paid = True
-        student.save()
+        payment = start_payment(
+            student,
+            TOKEN_AMOUNT,
+            payment_method,
+            request_idempotency_key(request),
+            purpose=Payment.TOKEN,
+        )
         
-        messages.success(request, f'Payment successful! Transaction ID: {payment.transaction_id}')
+        if payment.status == 'completed':
+            messages.success(request, f'Payment successful! Transaction ID: {payment.transaction_id}')
+        elif payment.status == 'failed':
+            messages.error(request, f'Payment failed: {payment.failure_reason}')
+        else:
+            messages.info(request, f'Payment submitted and awaiting confirmation. Transaction ID: {payment.transaction_id}')
         return redirect('students:student_dashboard')
     
     context = {
         'allocation': allocation,
-        'amount': 5000.00,
+        'amount': TOKEN_AMOUNT,
+        'idempotency_key': uuid.uuid4(),
     }
     return render(request, 'students/payment.html', context)
+
+@login_required
+@require_http_methods(['GET', 'POST'])
+def preferences_api(request):
+    """Read or replace the student's ordered preference list as JSON"""
+    if request.user.user_type != 'student':
+        return JsonResponse({'errors': ['Only students have preferences.']}, status=403)
+    
+    student = get_object_or_404(StudentProfile, user=request.user)
+    
+    if request.method == 'POST':
+        if not CounsellingSettings.get_settings().preference_submission_open:
+            return JsonResponse({'errors': ['Preference submission is closed.']}, status=403)
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'errors': ['Request body must be JSON.']}, status=400)
+        try:
+            course_ids = validate_course_ids(payload.get('course_ids') if isinstance(payload, dict) else None)
+        except PreferenceError as e:
+            return JsonResponse({'errors': e.errors}, status=400)
+        changes = save_preferences(student, course_ids)
+        return JsonResponse({'course_ids': course_ids, 'changes': changes})
+    
+    course_ids = list(
+        StudentPreference.objects.filter(student=student).order_by('preference_order').values_list('course_id', flat=True)
+    )
+    return JsonResponse({'course_ids': course_ids})
+
+def _course_catalogue_etag(request):
+    # Vacancies are shown too, so the seat list's version is part of the tag
+    return filters_etag(get_catalogue(), catalogue_filters(request.GET), seat_availability()['etag'])
+
+@login_required
+@require_GET
+@condition(etag_func=_course_catalogue_etag)
+def course_catalogue(request):
+    """Rendered course list for the preference form, filtered on the server; supports If-None-Match"""
+    key = 'students:course_catalogue:' + _course_catalogue_etag(request).strip('"')
+    
+    def render_courses():
+        available = seat_availability()['available']
+        courses = filter_courses(get_catalogue()['courses'], **catalogue_filters(request.GET))
+        return render_to_string('students/course_catalogue.html', {'courses': [
+            dict(course, available_seats=available.get(course['id'], course['total_seats'])) for course in courses
+        ]})
+    
+    response = HttpResponse(cache.get_or_set(key, render_courses, settings.COURSE_CATALOGUE_CACHE_SECONDS))
+    # Revalidate every time; an unchanged list costs a 304
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+def _course_catalogue_api_etag(request):
+    return filters_etag(get_catalogue(), catalogue_filters(request.GET))
+
+@login_required
+@require_GET
+@condition(etag_func=_course_catalogue_api_etag)
+def course_catalogue_api(request):
+    """Active courses as JSON, filtered by college, degree_type, department and q"""
+    catalogue = get_catalogue()
+    response = JsonResponse({
+        'courses': filter_courses(catalogue['courses'], **catalogue_filters(request.GET)),
+        'colleges': [{'code': code, 'name': name} for code, name in catalogue['colleges']],
+        'degree_types': catalogue['degree_types'],
+        'departments': catalogue['departments'],
+    })
+    patch_cache_control(response, private=True, no_cache=True)
+    return response